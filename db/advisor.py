@@ -0,0 +1,293 @@
+# ===== Base =====
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Boolean, Table, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ===== Files =====
+from db.config import PROFILE_BULK
+from db.filters import FilterSpec
+from db.profiles import with_profile
+
+
+
+# -------------------------------
+# Использование столбцов в фильтрах
+# -------------------------------
+WHERE, JOIN, ORDER_BY, GROUP_BY = "WHERE", "JOIN", "ORDER BY", "GROUP BY"
+
+
+@dataclass
+class ColumnUsage:
+    """Сколько раз столбец встречался в частях запросов фильтрации и сколько они шли"""
+    table: str
+    column: str
+    counts: Dict[str, int] = field(default_factory=dict)
+    runs: int = 0
+    # Время запросов с этим столбцом; запросы из result_cache не учитываются
+    timed_runs: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    @property
+    def avg_ms(self) -> Optional[float]:
+        return self.total_ms / self.timed_runs if self.timed_runs else None
+
+
+def filter_usage(spec: FilterSpec, tables: Dict[str, Table]) -> Set[Tuple[str, str, str]]:
+    """(таблица, столбец, часть запроса) для фильтра SQLFilterDialog"""
+    if spec.table not in tables:
+        return set()
+    joined = [tables[join[1]] for join in spec.joins if join[1] in tables]
+
+    def owner(column: str, candidates: List[Table]) -> Optional[str]:
+        # Как _Compiler.column: сначала основная таблица, затем присоединенные
+        for t in candidates:
+            if column in t.c:
+                return t.name
+        return None
+
+    search = [tables[spec.table]] + joined
+    usage = set()
+
+    def add(column: str, clause: str, candidates: List[Table] = search):
+        name = owner(column, candidates)
+        if name is not None:
+            usage.add((name, column, clause))
+
+    for column, _, _ in spec.where:
+        add(column, WHERE)
+    for column, op, sub_table, sub_column, _ in spec.subqueries:
+        if op not in ("EXISTS", "NOT EXISTS"):
+            add(column, WHERE)
+        # Столбец подзапроса IN / ANY ищется в своей таблице так же, как при JOIN
+        if sub_table in tables:
+            add(sub_column, JOIN, [tables[sub_table]])
+    for _, table_name, main_column, foreign_column, left_table in spec.joins:
+        if left_table in tables:
+            add(main_column, JOIN, [tables[left_table]])
+        if table_name in tables:
+            add(foreign_column, JOIN, [tables[table_name]])
+    for column, _ in spec.order_by:
+        add(column, ORDER_BY)
+    for column in spec.group_by:
+        add(column, GROUP_BY)
+    return usage
+
+
+class UsageLog:
+    """Накопленная статистика filter_usage за сеанс работы приложения"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns: Dict[Tuple[str, str], ColumnUsage] = {}
+
+    def record(self, usage: Iterable[Tuple[str, str, str]], elapsed_ms: Optional[float]):
+        """Учитывает один запуск фильтра; elapsed_ms — None, если время неизвестно"""
+        with self._lock:
+            seen = set()
+            for table, column, clause in usage:
+                item = self._columns.get((table, column))
+                if item is None:
+                    item = self._columns[(table, column)] = ColumnUsage(table, column)
+                item.counts[clause] = item.counts.get(clause, 0) + 1
+                if (table, column) in seen:
+                    continue
+                seen.add((table, column))
+                item.runs += 1
+                if elapsed_ms is not None:
+                    item.timed_runs += 1
+                    item.total_ms += elapsed_ms
+                    item.max_ms = max(item.max_ms, elapsed_ms)
+
+    def snapshot(self) -> List[ColumnUsage]:
+        with self._lock:
+            return [
+                ColumnUsage(u.table, u.column, dict(u.counts), u.runs, u.timed_runs, u.total_ms, u.max_ms)
+                for u in self._columns.values()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._columns.clear()
+
+
+usage_log = UsageLog()
+
+
+# -------------------------------
+# Советы по индексам
+# -------------------------------
+# Столбец без внешнего ключа предлагается, если встречался в фильтрах
+# хотя бы MIN_USES раз или запросы с ним шли в сумме дольше SLOW_TOTAL_MS
+MIN_USES = 2
+SLOW_TOTAL_MS = 500
+
+# Таблицы меньше этого числа строк читаются целиком быстрее, чем по индексу
+SMALL_TABLE_ROWS = 1_000
+
+# Вес частей запроса в оценке столбца
+_CLAUSE_WEIGHT = {WHERE: 10, JOIN: 10, ORDER_BY: 3, GROUP_BY: 3}
+_FK_SCORE = 50
+
+
+@dataclass
+class TableStats:
+    """Строка pg_stat_user_tables"""
+    seq_scan: int = 0
+    seq_tup_read: int = 0
+    idx_scan: int = 0
+    n_live_tup: int = 0
+
+
+@dataclass
+class IndexSuggestion:
+    table: str
+    column: str
+    score: float
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return f"ix_{self.table}_{self.column}"
+
+    @property
+    def sql(self) -> str:
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({self.column})"
+
+
+def table_stats(engine: Engine) -> Dict[str, TableStats]:
+    """Счетчики последовательных и индексных чтений; только PostgreSQL"""
+    if engine.dialect.name != 'postgresql':
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0) AS idx_scan, n_live_tup "
+            "FROM pg_stat_user_tables WHERE schemaname = current_schema()"
+        ))
+        return {
+            row.relname: TableStats(row.seq_scan, row.seq_tup_read, row.idx_scan, row.n_live_tup)
+            for row in rows
+        }
+
+
+def _leading_columns(inspector, table: str) -> Set[str]:
+    """Столбцы, с которых начинается какой-либо индекс таблицы (включая PK и UNIQUE)"""
+    leading = set()
+    pk = inspector.get_pk_constraint(table).get("constrained_columns") or []
+    if pk:
+        leading.add(pk[0])
+    for uq in inspector.get_unique_constraints(table):
+        if uq["column_names"]:
+            leading.add(uq["column_names"][0])
+    for ix in inspector.get_indexes(table):
+        # У индексов по выражению первый элемент — None
+        if ix["column_names"] and ix["column_names"][0]:
+            leading.add(ix["column_names"][0])
+    return leading
+
+
+def suggest_indexes(engine: Engine, tables: Dict[str, Table],
+                    usage: Optional[List[ColumnUsage]] = None) -> List[IndexSuggestion]:
+    """Предлагает btree-индексы по одному столбцу, самые полезные — первыми
+
+    Кандидаты — внешние ключи без индекса (JOIN и каскадное удаление
+    родителя) и столбцы из usage_log. Статистика pg_stat_user_tables
+    отсеивает маленькие таблицы и поднимает те, что читаются целиком.
+    """
+    if usage is None:
+        usage = usage_log.snapshot()
+    stats = table_stats(engine)
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+
+    by_table: Dict[str, List[ColumnUsage]] = {}
+    for item in usage:
+        by_table.setdefault(item.table, []).append(item)
+
+    suggestions = []
+    for name, table in tables.items():
+        if name not in existing:
+            continue
+        indexed = _leading_columns(inspector, name)
+        table_stat = stats.get(name)
+        candidates: Dict[str, IndexSuggestion] = {}
+
+        for fk in table.foreign_keys:
+            column = fk.parent.name
+            if column not in indexed:
+                candidates[column] = IndexSuggestion(
+                    name, column, _FK_SCORE,
+                    [f"внешний ключ на {fk.column.table.name} без индекса"],
+                )
+
+        # Маленькую таблицу планировщик все равно прочитает целиком
+        small = table_stat is not None and table_stat.n_live_tup < SMALL_TABLE_ROWS
+        for item in by_table.get(name, []):
+            column = item.column
+            if column in indexed or column not in table.c or small:
+                continue
+            # У логического столбца два значения — индекс не отбирает строки
+            if isinstance(table.c[column].type, Boolean):
+                continue
+            if item.runs < MIN_USES and item.total_ms < SLOW_TOTAL_MS:
+                continue
+            score = sum(_CLAUSE_WEIGHT.get(clause, 1) * n for clause, n in item.counts.items())
+            score += item.total_ms / 100
+            clauses = ", ".join(f"{clause} ×{n}" for clause, n in sorted(item.counts.items()))
+            reason = f"в фильтрах: {clauses}"
+            if item.avg_ms is not None:
+                reason += f", в среднем {item.avg_ms:.0f} мс (макс. {item.max_ms:.0f})"
+            suggestion = candidates.setdefault(column, IndexSuggestion(name, column, 0))
+            suggestion.score += score
+            suggestion.reasons.append(reason)
+
+        if table_stat is not None and candidates and table_stat.seq_scan > table_stat.idx_scan:
+            note = (f"таблица (~{table_stat.n_live_tup} строк) прочитана целиком {table_stat.seq_scan} раз, "
+                    f"по индексу — {table_stat.idx_scan}")
+            for suggestion in candidates.values():
+                suggestion.score *= 2
+                suggestion.reasons.append(note)
+
+        suggestions.extend(candidates.values())
+
+    suggestions.sort(key=lambda s: -s.score)
+    return suggestions
+
+
+def build_index(engine: Engine, name: str, sql: str) -> bool:
+    """Выполняет CREATE INDEX CONCURRENTLY sql; False — ошибка (см. консоль)
+
+    CREATE INDEX CONCURRENTLY нельзя выполнить в транзакции — нужен
+    AUTOCOMMIT, по одной команде на соединение. Прерванное построение
+    оставляет индекс INVALID, такой индекс удаляется, чтобы IF NOT EXISTS
+    не пропустил повторную попытку. Кроме PostgreSQL — обычный CREATE INDEX.
+    Построение идет в профиле bulk — без тайм-аута запроса.
+    """
+    postgres = engine.dialect.name == 'postgresql'
+    if not postgres:
+        sql = sql.replace(" CONCURRENTLY", "")
+    try:
+        with with_profile(engine, PROFILE_BULK).connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(sql))
+        return True
+    except SQLAlchemyError as e:
+        print("Create index error:", e)
+        if postgres:
+            try:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            except SQLAlchemyError as drop_error:
+                print("Drop index error:", drop_error)
+        return False
+
+
+def create_index(engine: Engine, suggestion: IndexSuggestion) -> bool:
+    """Создает индекс, не блокируя запись в таблицу; False — ошибка (см. консоль)"""
+    return build_index(engine, suggestion.name, suggestion.sql)
@@ -0,0 +1,156 @@
+# ===== Base =====
+import asyncio
+import concurrent.futures
+import threading
+from typing import Callable, Optional
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import greenlet_spawn
+
+
+# ===== Files =====
+from db.config import PgConfig
+from db.session import make_async_engine
+
+
+
+# -------------------------------
+# Асинхронные запросы (asyncio в отдельном потоке)
+# -------------------------------
+class AsyncBridge:
+    """Цикл asyncio в отдельном потоке и AsyncEngine — двойник engine приложения.
+
+    run() выполняет синхронную функцию задачи в greenlet на цикле
+    (sqlalchemy greenlet_spawn): запросы QueryGuard внутри нее идут
+    через асинхронный драйвер и ждут ответа сервера, не занимая поток,
+    поэтому все задачи выполняются одновременно в одном потоке. Итог
+    возвращается concurrent Future — TaskRunner доставляет его в
+    GUI-поток сигналом, как и для задач пула потоков.
+    """
+
+    def __init__(self, engine: Engine, async_engine: AsyncEngine):
+        self.engine = engine
+        self.async_engine = async_engine
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="db-asyncio", daemon=True)
+        self._in_flight = 0
+
+    @property
+    def sync_engine(self) -> Engine:
+        """Engine поверх асинхронного драйвера; работает только в run()"""
+        return self.async_engine.sync_engine
+
+    def start(self, timeout: float):
+        """Запускает цикл и проверяет соединение; ошибка — исключение, цикл остановлен"""
+        self._thread.start()
+
+        async def ping():
+            async with self.async_engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+
+        try:
+            asyncio.run_coroutine_threadsafe(ping(), self._loop).result(timeout)
+        except BaseException:
+            self.stop()
+            raise
+
+    def on_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def in_flight(self) -> int:
+        """Число выполняемых задач"""
+        return self._in_flight
+
+    def run(self, fn: Callable, *args) -> concurrent.futures.Future:
+        async def call():
+            self._in_flight += 1
+            try:
+                return await greenlet_spawn(fn, *args)
+            finally:
+                self._in_flight -= 1
+
+        return asyncio.run_coroutine_threadsafe(call(), self._loop)
+
+    def close(self, *resources):
+        """Закрывает результаты и соединения двойника на цикле, не дожидаясь"""
+        def close_all():
+            for resource in resources:
+                try:
+                    resource.close()
+                except Exception as e:
+                    print("Async close error:", e)
+
+        self.run(close_all)
+
+    def stop(self, timeout: float = 5.0):
+        """Прерывает задачи, закрывает пул двойника и останавливает цикл"""
+        if not self._thread.is_alive():
+            return
+
+        async def shutdown():
+            current = asyncio.current_task()
+            tasks = [t for t in asyncio.all_tasks() if t is not current]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.async_engine.dispose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout)
+        except Exception as e:
+            print("Async shutdown error:", e)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+
+_bridge: Optional[AsyncBridge] = None
+
+
+def async_bridge() -> Optional[AsyncBridge]:
+    """Работающий мост или None — фоновые задачи идут в пул потоков"""
+    return _bridge
+
+
+def start_async_bridge(engine: Engine, cfg: PgConfig) -> AsyncBridge:
+    """Включает асинхронный режим для engine (драйвер cfg.async_driver)"""
+    global _bridge
+    stop_async_bridge()
+    bridge = AsyncBridge(engine, make_async_engine(cfg))
+    bridge.start(cfg.connect_timeout + 1)
+    _bridge = bridge
+    return bridge
+
+
+def stop_async_bridge():
+    global _bridge
+    bridge, _bridge = _bridge, None
+    if bridge is not None:
+        bridge.stop()
+
+
+def route(engine: Engine) -> Engine:
+    """Engine для запроса из текущего потока: в задаче моста — его двойник"""
+    bridge = _bridge
+    if bridge is not None and bridge.engine is engine and bridge.on_loop_thread():
+        return bridge.sync_engine
+    return engine
+
+
+def close_connection(conn: Connection, *results):
+    """Закрывает результаты и соединение, открытые в задаче моста или обычным образом"""
+    bridge = _bridge
+    if bridge is not None and conn.engine is bridge.sync_engine:
+        bridge.close(*results, conn)
+        return
+    for result in results:
+        try:
+            result.close()
+        except Exception:
+            # Курсор прерванной транзакции закрыть нельзя — хватит закрыть соединение
+            pass
+    conn.close()
@@ -1,7 +1,42 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 
 
+# -------------------------------
+# Профили параметров сеанса (см. db/profiles.py)
+# -------------------------------
+PROFILE_INTERACTIVE = "interactive"  # таблицы вкладок, списки, правка строк
+PROFILE_REPORTING = "reporting"      # фильтры, отчеты GROUP BY, EXPLAIN, мат. представления
+PROFILE_BULK = "bulk"                # массовая загрузка данных
+
+
+@dataclass
+class SessionProfile:
+    """Параметры сервера для соединений профиля; 0 — без ограничения,
+    "" и None — не менять (как в профиле по умолчанию, а в нем — как на сервере)"""
+    statement_timeout: Optional[int] = None  # секунды на запрос
+    lock_timeout: Optional[int] = None  # секунды ожидания блокировки
+    idle_in_transaction_timeout: Optional[int] = None  # секунды простоя открытой транзакции
+    work_mem: str = ""  # память на сортировку и хэш, например "64MB"
+    synchronous_commit: str = ""  # on | off | local | remote_write | remote_apply
+    jit: Optional[bool] = None
+
+
+def default_profiles() -> Dict[str, SessionProfile]:
+    return {
+        # Короткие запросы: JIT-компиляция дольше самого запроса. Остальное — как
+        # на сервере; statement_timeout задает QueryGuard в своих транзакциях
+        PROFILE_INTERACTIVE: SessionProfile(statement_timeout=30, jit=False),
+        # JIT включается сервером только для дорогих планов (jit_above_cost)
+        PROFILE_REPORTING: SessionProfile(statement_timeout=300, work_mem="64MB", jit=True),
+        # Потеря последних транзакций при сбое сервера допустима: загрузку можно повторить.
+        # Без тайм-аута запроса — им же строятся индексы и меняется схема
+        PROFILE_BULK: SessionProfile(statement_timeout=0, lock_timeout=30, idle_in_transaction_timeout=60,
+                                     work_mem="256MB", synchronous_commit="off", jit=False),
+    }
+
+
 # -------------------------------
 # Конфигурация подключения
 # -------------------------------
@@ -14,4 +49,16 @@ class PgConfig:
     password: str = "root"
     sslmode: str = "prefer"  # для psycopg2/psycopg
     connect_timeout: int = 5  # секунды
-    driver: str = "psycopg2"  # psycopg2 | psycopg | pg8000
\ No newline at end of file
+    driver: str = "psycopg2"  # psycopg2 | psycopg | pg8000
+    listen_changes: bool = False  # LISTEN/NOTIFY: обновлять данные по изменениям других клиентов
+    # Профили сеанса по имени; profile — для соединений без явного профиля
+    profiles: Dict[str, SessionProfile] = field(default_factory=default_profiles)
+    profile: str = PROFILE_INTERACTIVE
+    replica_dsn: str = ""  # postgresql://host:port/db реплики для чтения (db/replica.py), "" — без реплики
+    async_driver: str = ""  # asyncpg | psycopg — фоновые запросы через asyncio (db/aio.py), "" — пул потоков
+    # Пул соединений SQLAlchemy (см. db/pool.py)
+    pool_size: int = 5  # постоянных соединений; фоновых потоков БД — DB_THREADS
+    max_overflow: int = 5  # дополнительных соединений при пиковой нагрузке
+    pool_recycle: int = 1800  # секунды до пересоздания соединения, 0 — не пересоздавать
+    pre_ping: str = "idle"  # always | idle | never — проверка соединения перед выдачей
+    pool_timeout: int = 10  # секунды ожидания свободного соединения
@@ -0,0 +1,184 @@
+# ===== Base =====
+import threading
+import weakref
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ===== Files =====
+from db.aio import route
+from db.profiles import PROFILE_OPTION, session_profile
+from db.replica import parse_lsn, replica_router
+
+
+
+# -------------------------------
+# Тайм-аут и отмена запросов
+# -------------------------------
+# Тайм-аут по умолчанию (мс), если engine создан без statement_timeout_ms
+DEFAULT_STATEMENT_TIMEOUT_MS = 30_000
+
+# set_config(..., true) действует до конца транзакции, как SET LOCAL:
+# после ROLLBACK при возврате в пул у соединения снова настройки сервера
+# now() — начало транзакции, оно же pg_stat_activity.xact_start
+_PREPARE_SQL = text("SELECT pg_backend_pid(), now() FROM set_config('statement_timeout', :ms, true)")
+_PREPARE_REPLICA_SQL = text("SELECT pg_backend_pid(), now(), pg_last_wal_replay_lsn()::text "
+                            "FROM set_config('statement_timeout', :ms, true)")
+# Отмена только той транзакции, что была начата guard: соединение могло
+# вернуться в пул и выполнять чужой запрос
+_CANCEL_SQL = text("SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+                   "WHERE pid = :pid AND xact_start = :started")
+
+# Выданные соединения: id DBAPI-соединения -> (guard, PID серверного процесса,
+# начало транзакции, engine сервера, на котором выполнять отмену).
+# Запись снимается при возврате соединения в пул
+_running: Dict[int, Tuple["QueryGuard", int, datetime, Engine]] = {}
+_lock = threading.RLock()
+_watched_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def _watch_pool(engine: Engine):
+    if engine in _watched_engines:
+        return
+    _watched_engines.add(engine)
+
+    def _forget(dbapi_connection, *args):
+        if dbapi_connection is None:
+            return
+        with _lock:
+            _running.pop(id(dbapi_connection), None)
+
+    event.listen(engine, "checkin", _forget)
+    event.listen(engine, "invalidate", _forget)
+
+
+class QueryGuard:
+    """Соединения владельца (модели, вкладки) с тайм-аутом и возможностью отмены.
+
+    connect() выдает соединение, в транзакции которого задан
+    statement_timeout, и запоминает PID его серверного процесса;
+    cancel() вызывает pg_cancel_backend для всех соединений guard,
+    еще не возвращенных в пул. Кроме PostgreSQL — обычное соединение.
+    profile — профиль сеанса соединений (db/profiles.py), его
+    statement_timeout — тайм-аут по умолчанию.
+    """
+
+    def __init__(self, engine: Engine, timeout_ms: Optional[int] = None, profile: Optional[str] = None):
+        self.engine = engine
+        self.profile = profile
+        if timeout_ms is None:
+            settings = session_profile(engine, profile)
+            if settings is not None and settings.statement_timeout is not None:
+                timeout_ms = settings.statement_timeout * 1000
+            else:
+                timeout_ms = engine.get_execution_options().get("statement_timeout_ms", DEFAULT_STATEMENT_TIMEOUT_MS)
+        self.timeout_ms = timeout_ms
+        self._postgres = engine.dialect.name == 'postgresql'
+        if self._postgres:
+            _watch_pool(engine)
+
+    def connect(self, reads: Optional[Iterable[str]] = None, **execution_options) -> Connection:
+        """Соединение с начатой транзакцией; закрывается как обычно (close или with)
+
+        execution_options применяются до начала транзакции
+        (например, postgresql_readonly=True). reads — таблицы запроса,
+        который только читает: при включенной реплике (db/replica.py)
+        соединение берется с нее, если она уже видит записи приложения в них.
+        """
+        if self.profile is not None:
+            execution_options.setdefault(PROFILE_OPTION, self.profile)
+        # В задаче асинхронного режима — соединение AsyncEngine-двойника
+        engine = route(self.engine)
+        router = replica_router()
+        if reads is not None and router is not None and self._postgres \
+                and engine is self.engine and router.primary is self.engine:
+            conn = self._connect_replica(router, reads, execution_options)
+            if conn is not None:
+                return conn
+
+        conn, row = self._open(engine, execution_options, _PREPARE_SQL)
+        if row is not None:
+            # Двойник работает с тем же сервером — отмена через основной engine
+            self._register(conn, engine, row[0], row[1], self.engine)
+        return conn
+
+    def _open(self, engine: Engine, execution_options: dict, prepare) -> Tuple[Connection, Optional[tuple]]:
+        conn = engine.connect()
+        if execution_options:
+            conn = conn.execution_options(**execution_options)
+        if not self._postgres:
+            return conn, None
+        try:
+            row = conn.execute(prepare, {"ms": str(int(self.timeout_ms))}).one()
+        except SQLAlchemyError:
+            conn.close()
+            raise
+        return conn, tuple(row)
+
+    def _register(self, conn: Connection, engine: Engine, pid: int, started: datetime, cancel_engine: Engine):
+        if engine is not self.engine:
+            _watch_pool(engine)
+        with _lock:
+            _running[id(conn.connection.dbapi_connection)] = (self, pid, started, cancel_engine)
+
+    def _connect_replica(self, router, reads: Iterable[str], execution_options: dict) -> Optional[Connection]:
+        """Соединение с репликой или None — читать с основного сервера"""
+        if not router.available():
+            return None
+        try:
+            conn, row = self._open(router.replica, execution_options, _PREPARE_REPLICA_SQL)
+        except SQLAlchemyError as e:
+            print("Replica error:", e)
+            router.failed()
+            return None
+        pid, started, replayed = row[0], row[1], parse_lsn(row[2])
+        required = router.required_lsn(reads)
+        if required and (replayed is None or replayed < required):
+            conn.close()
+            router.count("lagging_reads")
+            return None
+        router.count("replica_reads")
+        self._register(conn, router.replica, pid, started, router.replica)
+        return conn
+
+    def running(self) -> int:
+        with _lock:
+            return sum(1 for guard, _, _, _ in _running.values() if guard is self)
+
+    def cancel(self) -> int:
+        """Прерывает выполняемые запросы guard; возвращает число отмененных
+
+        Блокировка держится только на время выборки PID: соединение для
+        отмены может ждать свободного места в пуле, а возврат соединений
+        в пул (_forget) ждал бы ее — как раз когда пул исчерпан.
+        """
+        with _lock:
+            by_engine: Dict[Engine, list] = {}
+            for guard, pid, started, engine in _running.values():
+                if guard is self:
+                    by_engine.setdefault(engine, []).append((pid, started))
+        cancelled = 0
+        try:
+            for engine, targets in by_engine.items():
+                with engine.connect() as conn:
+                    for pid, started in targets:
+                        if conn.execute(_CANCEL_SQL, {"pid": pid, "started": started}).scalar():
+                            cancelled += 1
+        except SQLAlchemyError as e:
+            print("Cancel error:", e)
+        return cancelled
+
+
+def is_cancelled(error: BaseException) -> bool:
+    """Запрос прерван отменой или тайм-аутом (SQLSTATE 57014)"""
+    orig = getattr(error, "orig", error)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code is None and orig.args and isinstance(orig.args[0], dict):
+        code = orig.args[0].get("C")  # pg8000
+    return code == "57014"
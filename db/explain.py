@@ -0,0 +1,168 @@
+# ===== Base =====
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+# ===== Files =====
+from db.execution import QueryGuard
+
+
+
+# -------------------------------
+# План запроса (EXPLAIN FORMAT JSON)
+# -------------------------------
+# Последовательное чтение таблицы больше этого числа строк подсвечивается
+LARGE_TABLE_ROWS = 10_000
+
+# Оценка планировщика считается плохой, если отличается от факта во
+# столько раз и больше (и хотя бы на BAD_ESTIMATE_MIN_ROWS строк)
+BAD_ESTIMATE_RATIO = 10
+BAD_ESTIMATE_MIN_ROWS = 100
+
+
+@dataclass
+class PlanNode:
+    """Узел плана; время — суммарное по всем циклам, в миллисекундах"""
+    node_type: str
+    relation: str = ""
+    index: str = ""
+    plan_rows: float = 0
+    actual_rows: Optional[float] = None  # в среднем за цикл, как в EXPLAIN
+    loops: int = 1
+    total_ms: Optional[float] = None
+    shared_hit: int = 0
+    shared_read: int = 0
+    children: List["PlanNode"] = field(default_factory=list)
+    # Замечания: чтение большой таблицы целиком и промах оценки числа строк
+    large_seq_scan: bool = False
+    bad_estimate: bool = False
+    warnings: List[str] = field(default_factory=list)
+    details: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def self_ms(self) -> Optional[float]:
+        """Время узла без дочерних"""
+        if self.total_ms is None:
+            return None
+        return max(0.0, self.total_ms - sum(c.total_ms or 0 for c in self.children))
+
+    def walk(self) -> Iterable["PlanNode"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass
+class ExplainResult:
+    root: PlanNode
+    analyzed: bool
+    planning_ms: Optional[float] = None
+    execution_ms: Optional[float] = None
+
+    @property
+    def warnings(self) -> List[str]:
+        return [w for node in self.root.walk() for w in node.warnings]
+
+
+# Поля, вынесенные в атрибуты PlanNode или в дочерние узлы
+_KNOWN_KEYS = {
+    "Node Type", "Relation Name", "Index Name", "Plan Rows", "Actual Rows", "Actual Loops",
+    "Actual Total Time", "Shared Hit Blocks", "Shared Read Blocks", "Plans",
+}
+
+
+def _parse_node(raw: dict, table_rows: Dict[str, float]) -> PlanNode:
+    loops = int(raw.get("Actual Loops", 1)) or 1
+    node = PlanNode(
+        node_type=raw["Node Type"],
+        relation=raw.get("Relation Name", ""),
+        index=raw.get("Index Name", ""),
+        plan_rows=raw.get("Plan Rows", 0),
+        actual_rows=raw.get("Actual Rows"),
+        loops=loops,
+        total_ms=raw["Actual Total Time"] * loops if "Actual Total Time" in raw else None,
+        shared_hit=raw.get("Shared Hit Blocks", 0),
+        shared_read=raw.get("Shared Read Blocks", 0),
+        children=[_parse_node(child, table_rows) for child in raw.get("Plans", [])],
+        details={k: v for k, v in raw.items() if k not in _KNOWN_KEYS},
+    )
+
+    if node.node_type == "Seq Scan" and node.relation:
+        size = table_rows.get(node.relation, 0)
+        if size >= LARGE_TABLE_ROWS:
+            node.large_seq_scan = True
+            node.warnings.append(
+                f"Последовательное чтение {node.relation} (~{int(size)} строк)"
+                + (f", фильтр: {raw['Filter']}" if "Filter" in raw else "")
+            )
+
+    if node.actual_rows is not None:
+        actual, planned = node.actual_rows, node.plan_rows
+        ratio = max(actual, 1) / max(planned, 1)
+        if abs(actual - planned) >= BAD_ESTIMATE_MIN_ROWS and \
+                (ratio >= BAD_ESTIMATE_RATIO or ratio <= 1 / BAD_ESTIMATE_RATIO):
+            node.bad_estimate = True
+            node.warnings.append(
+                f"{node.node_type}{' ' + node.relation if node.relation else ''}: "
+                f"план {int(planned)} строк, факт {int(actual)}"
+            )
+    return node
+
+
+def parse_plan(document, table_rows: Optional[Dict[str, float]] = None) -> ExplainResult:
+    """Разбирает результат EXPLAIN (FORMAT JSON); table_rows — размеры таблиц (pg_class.reltuples)"""
+    if isinstance(document, str):
+        document = json.loads(document)
+    top = document[0]
+    root = _parse_node(top["Plan"], table_rows or {})
+    return ExplainResult(
+        root=root,
+        analyzed="Execution Time" in top,
+        planning_ms=top.get("Planning Time"),
+        execution_ms=top.get("Execution Time"),
+    )
+
+
+def _relations(raw: dict) -> set:
+    names = {raw["Relation Name"]} if "Relation Name" in raw else set()
+    for child in raw.get("Plans", []):
+        names |= _relations(child)
+    return names
+
+
+def explain_sql(engine: Engine, stmt) -> str:
+    """Текст запроса для EXPLAIN: значения параметров подставляются литералами"""
+    if isinstance(stmt, str):
+        return stmt
+    return str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+
+
+def run_explain(guard: QueryGuard, stmt, analyze: bool = True) -> ExplainResult:
+    """Выполняет EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON); только PostgreSQL
+
+    С analyze запрос действительно выполняется — в транзакции только для
+    чтения, которая затем откатывается, и с тайм-аутом guard.
+    """
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    sql = explain_sql(guard.engine, stmt)
+    with guard.connect(postgresql_readonly=True) as conn:
+        document = conn.exec_driver_sql(f"EXPLAIN ({options}) {sql}").scalar()
+        if isinstance(document, str):
+            document = json.loads(document)
+        names = sorted(_relations(document[0]["Plan"]))
+        table_rows = {}
+        if names:
+            table_rows = {
+                row.relname: row.reltuples
+                for row in conn.execute(
+                    text("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:names)"),
+                    {"names": names},
+                )
+            }
+    return parse_plan(document, table_rows)
@@ -0,0 +1,263 @@
+# ===== Base =====
+import operator
+import re
+from dataclasses import dataclass, field
+from datetime import date, time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Table, all_, any_, case, exists, func, select
+from sqlalchemy.sql import Select
+
+
+# ===== Files =====
+from db.storage import column_kind
+
+
+
+# -------------------------------
+# Структура фильтра SQLFilterDialog -> SQLAlchemy Core
+# -------------------------------
+@dataclass
+class FilterSpec:
+    """Состояние SQLFilterDialog без SQL-текста.
+
+    Значения хранятся так, как их ввел пользователь; compile_filter
+    превращает их в параметры запроса, поэтому фильтры одной формы с
+    разными значениями дают один и тот же скомпилированный запрос.
+    """
+    table: str
+    columns: List[str] = field(default_factory=list)
+    # (функция, колонка, строковый параметр, колонка 2, псевдоним)
+    functions: List[Tuple[str, str, str, str, str]] = field(default_factory=list)
+    # (колонка, оператор, значение)
+    where: List[Tuple[str, str, str]] = field(default_factory=list)
+    # (колонка, ASC | DESC)
+    order_by: List[Tuple[str, str]] = field(default_factory=list)
+    group_by: List[str] = field(default_factory=list)
+    # (агрегат, колонка, оператор, значение)
+    having: List[Tuple[str, str, str, str]] = field(default_factory=list)
+    # (тип JOIN, таблица, колонка левой таблицы, колонка присоединяемой,
+    # левая таблица — текущая или присоединенная раньше)
+    joins: List[Tuple[str, str, str, str, str]] = field(default_factory=list)
+    # (колонка, оператор, таблица подзапроса, колонка подзапроса, условие подзапроса)
+    subqueries: List[Tuple[str, str, str, str, str]] = field(default_factory=list)
+    # (COALESCE | NULLIF, значения, псевдоним)
+    null_functions: List[Tuple[str, List[str], str]] = field(default_factory=list)
+    # (условие WHEN, THEN, ELSE, псевдоним)
+    case: Optional[Tuple[str, str, str, str]] = None
+
+
+class FilterCompileError(ValueError):
+    """Фильтр нельзя выразить через Core — выполняется старым текстовым способом"""
+
+
+_COMPARE = {
+    "=": operator.eq, "!=": operator.ne, "<>": operator.ne,
+    ">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le,
+}
+
+# Операторы PostgreSQL без отдельного метода в Core
+_CUSTOM_OPS = {"~", "~*", "!~", "!~*", "SIMILAR TO", "NOT SIMILAR TO"}
+
+_SIMPLE_CONDITION = re.compile(r"^\s*([A-Za-z_]\w*)\s*(>=|<=|!=|<>|=|>|<|LIKE)\s*(.+?)\s*$", re.IGNORECASE)
+_LIST_ITEM = re.compile(r"\s*('(?:[^']|'')*'|[^,]+)\s*(?:,|$)")
+_INT = re.compile(r"^-?\d+$")
+_FLOAT = re.compile(r"^-?\d+\.\d*$")
+
+
+class _Compiler:
+    def __init__(self, spec: FilterSpec, tables: Dict[str, Table]):
+        self.spec = spec
+        self.tables = tables
+        if spec.table not in tables:
+            raise FilterCompileError(f"неизвестная таблица {spec.table}")
+        self.table = tables[spec.table]
+        self.joined: List[Table] = []
+
+    # ----- Ссылки и значения -----
+    def column(self, name: str, table: Optional[Table] = None):
+        """Колонка текущей (или указанной) таблицы, иначе — присоединенных"""
+        for t in [table] if table is not None else [self.table] + self.joined:
+            if name in t.c:
+                return t.c[name]
+        raise FilterCompileError(f"неизвестная колонка {name}")
+
+    def value(self, raw: str, like=None, table: Optional[Table] = None) -> Any:
+        """Значение из поля ввода: литерал становится параметром, имя колонки — колонкой
+
+        like — колонка, к типу которой приводится строка (даты и время).
+        """
+        raw = raw.strip()
+        if len(raw) >= 2 and raw[0] == raw[-1] == "'":
+            result: Any = raw[1:-1].replace("''", "'")
+        elif raw.upper() in ("TRUE", "FALSE"):
+            return raw.upper() == "TRUE"
+        elif raw.upper() == "NULL":
+            return None
+        elif _INT.match(raw):
+            return int(raw)
+        elif _FLOAT.match(raw):
+            return float(raw)
+        elif raw and all(c.isalnum() or c == '_' for c in raw):
+            try:
+                return self.column(raw, table)
+            except FilterCompileError:
+                result = raw
+        else:
+            # Выражения SQL (скобки, операторы) передаются только текстом
+            raise FilterCompileError(f"не литерал: {raw}")
+
+        kind = column_kind(like.type) if like is not None else "obj"
+        try:
+            if kind == "date":
+                return date.fromisoformat(result)
+            if kind == "time":
+                return time.fromisoformat(result)
+        except ValueError:
+            raise FilterCompileError(f"некорректное значение {raw} для {like.name}")
+        return result
+
+    def values(self, raw: str, like=None) -> list:
+        raw = raw.strip()
+        if raw.startswith("(") and raw.endswith(")"):
+            raw = raw[1:-1]
+        return [self.value(m.group(1), like) for m in _LIST_ITEM.finditer(raw) if m.group(1).strip()]
+
+    def compare(self, col, op: str, raw: str, table: Optional[Table] = None):
+        op = op.upper()
+        if op in _COMPARE:
+            return _COMPARE[op](col, self.value(raw, col, table))
+        if op == "LIKE":
+            return col.like(self.value(raw, col, table))
+        if op == "IN":
+            # Список раскрывается при выполнении: длина не меняет кэшируемый запрос
+            return col.in_(self.values(raw, col))
+        if op in _CUSTOM_OPS:
+            return col.op(op, is_comparison=True)(self.value(raw, col, table))
+        raise FilterCompileError(f"неизвестный оператор {op}")
+
+    def simple_condition(self, text: str, table: Optional[Table] = None):
+        """Условие вида «колонка оператор значение» из свободного поля ввода"""
+        m = _SIMPLE_CONDITION.match(text)
+        if m is None:
+            raise FilterCompileError(f"сложное условие: {text}")
+        name, op, raw = m.groups()
+        return self.compare(self.column(name, table), op, raw, table)
+
+    # ----- Части запроса -----
+    def function(self, name: str, column: str, param: str, column2: str, alias: str):
+        col = self.column(column)
+        name = name.upper()
+        if name in ("UPPER", "LOWER", "TRIM"):
+            expr = getattr(func, name.lower())(col)
+        elif name == "CONCAT":
+            expr = func.concat(col, self.column(column2))
+        elif name in ("SUBSTRING", "LPAD", "RPAD"):
+            # Параметр: «начало[, длина]» для SUBSTRING, «длина[, заполнитель]» для PAD
+            args = [a.strip() for a in param.split(",")]
+            if not args or not _INT.match(args[0]) or len(args) > 2:
+                raise FilterCompileError(f"параметр {name}: {param}")
+            first = int(args[0])
+            if name == "SUBSTRING":
+                rest = [int(args[1])] if len(args) == 2 and _INT.match(args[1]) else []
+                if len(args) == 2 and not rest:
+                    raise FilterCompileError(f"параметр {name}: {param}")
+                expr = func.substr(col, first, *rest)
+            else:
+                rest = [args[1]] if len(args) == 2 else []
+                expr = getattr(func, name.lower())(col, first, *rest)
+        else:
+            raise FilterCompileError(f"неизвестная функция {name}")
+        return expr.label(alias)
+
+    def null_function(self, name: str, raw_values: List[str], alias: str):
+        args = [self.value(v) for v in raw_values]
+        expr = func.coalesce(*args) if name == "COALESCE" else func.nullif(*args)
+        return expr.label(alias) if alias else expr
+
+    def case_expression(self, when: str, then: str, else_: str, alias: str):
+        expr = case((self.simple_condition(when), self.value(then)),
+                    else_=self.value(else_) if else_ else None)
+        return expr.label(alias) if alias else expr
+
+    def subquery_condition(self, column: str, op: str, sub_table: str, sub_column: str, where: str):
+        if sub_table not in self.tables:
+            raise FilterCompileError(f"неизвестная таблица {sub_table}")
+        t = self.tables[sub_table]
+        # Подзапрос не коррелирует с внешним, как и в текстовом варианте
+        sub = select(self.column(sub_column, t)).correlate(None)
+        if where:
+            sub = sub.where(self.simple_condition(where, t))
+
+        if op == "EXISTS":
+            return exists(sub)
+        if op == "NOT EXISTS":
+            return ~exists(sub)
+        col = self.column(column)
+        if op == "IN":
+            return col.in_(sub)
+        if op == "NOT IN":
+            return col.not_in(sub)
+        cmp, quantifier = op.rsplit(" ", 1)
+        wrap = any_ if quantifier == "ANY" else all_
+        return _COMPARE[cmp](col, wrap(sub.scalar_subquery()))
+
+    def join(self, from_, join_type: str, table_name: str, main_column: str, foreign_column: str, left_table: str):
+        if table_name not in self.tables:
+            raise FilterCompileError(f"неизвестная таблица {table_name}")
+        left = self.tables.get(left_table)
+        if left is None or (left is not self.table and left not in self.joined):
+            raise FilterCompileError(f"таблица {left_table} не участвует в запросе")
+        other = self.tables[table_name]
+        on = left.c[main_column] == other.c[foreign_column] \
+            if main_column in left.c and foreign_column in other.c else None
+        if on is None:
+            raise FilterCompileError(f"неизвестные колонки JOIN {main_column}, {foreign_column}")
+        self.joined.append(other)
+        if join_type == "LEFT JOIN":
+            return from_.outerjoin(other, on)
+        if join_type == "FULL JOIN":
+            return from_.outerjoin(other, on, full=True)
+        if join_type == "RIGHT JOIN":
+            # В Core нет RIGHT JOIN: A RIGHT JOIN B == B LEFT JOIN A
+            return other.outerjoin(from_, on)
+        return from_.join(other, on)
+
+    def compile(self) -> Select:
+        spec = self.spec
+
+        from_ = self.table
+        for join in spec.joins:
+            from_ = self.join(from_, *join)
+
+        items = [self.column(name, self.table) for name in spec.columns]
+        items += [self.function(*f) for f in spec.functions]
+        if items:
+            items += [self.null_function(*f) for f in spec.null_functions]
+            if spec.case is not None:
+                items.append(self.case_expression(*spec.case))
+        stmt = select(*items) if items else select(self.table)
+        stmt = stmt.select_from(from_)
+
+        for column, op, raw in spec.where:
+            stmt = stmt.where(self.compare(self.column(column), op, raw))
+        for condition in spec.subqueries:
+            stmt = stmt.where(self.subquery_condition(*condition))
+
+        if spec.group_by:
+            stmt = stmt.group_by(*[self.column(name) for name in spec.group_by])
+        for agg, column, op, raw in spec.having:
+            expr = getattr(func, agg.lower())(self.column(column))
+            stmt = stmt.having(self.compare(expr, op, raw))
+
+        for column, direction in spec.order_by:
+            col = self.column(column)
+            stmt = stmt.order_by(col.desc() if direction == "DESC" else col.asc())
+        return stmt
+
+
+def compile_filter(spec: FilterSpec, tables: Dict[str, Table]) -> Select:
+    """Строит select() с параметрами; FilterCompileError — если это невозможно"""
+    return _Compiler(spec, tables).compile()
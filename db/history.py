@@ -0,0 +1,251 @@
+# ===== Base =====
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy.engine import Engine
+
+
+
+# -------------------------------
+# Нормализация запросов
+# -------------------------------
+# Строковые литералы, параметры драйвера (и списки IN select() до
+# подстановки) и числа вне идентификаторов
+_LITERAL = re.compile(
+    r"'(?:[^']|'')*'"
+    r"|%\(\w+\)s|(?<![:\w]):\w+|\$\d+|\?|__\[POSTCOMPILE_\w+\]"
+    r"|(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])"
+)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> Tuple[str, List[str]]:
+    """Форма запроса (литералы и параметры заменены на ?) и найденные литералы
+
+    Запросы, отличающиеся только значениями, дают одну форму; списки
+    IN (?, ?, ?) сворачиваются в IN (?), чтобы длина списка не плодила формы.
+    """
+    literals = []
+
+    def replace(match):
+        token = match.group(0)
+        if token[0] == "'":
+            literals.append(token[1:-1].replace("''", "'"))
+        elif token[0].isdigit() or token[0] == "-":
+            literals.append(token)
+        return "?"
+
+    shape = _LITERAL.sub(replace, sql)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACES.sub(" ", shape).strip(), literals
+
+
+def statement_text(engine: Engine, stmt) -> Tuple[str, Optional[str], List[Any]]:
+    """(форма, текст для повтора, параметры) запроса — текста или select() Core
+
+    Текст для повтора у select() — с подставленными литералами; None,
+    если значение нельзя записать литералом.
+    """
+    if isinstance(stmt, str):
+        shape, literals = normalize_sql(stmt)
+        return shape, stmt, literals
+
+    compiled = stmt.compile(engine)
+    shape, _ = normalize_sql(str(compiled))
+    params = list(compiled.params.values())
+    try:
+        runnable = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    except Exception:
+        runnable = None
+    return shape, runnable, params
+
+
+# -------------------------------
+# История запросов (локальная SQLite)
+# -------------------------------
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".airport_db", "query_history.sqlite3")
+
+# Старые записи удаляются, когда история вырастает больше этого размера
+MAX_ENTRIES = 20_000
+
+# Откуда запущен запрос
+KIND_FILTER = "filter"  # SQLFilterDialog
+KIND_SQL = "sql"        # BaseTab.execute_sql
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    tab TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    sql TEXT,
+    params TEXT NOT NULL,
+    duration_ms REAL,
+    rows INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_queries_shape ON queries (shape);
+"""
+
+
+@dataclass
+class HistoryEntry:
+    id: int
+    ts: float
+    tab: str
+    kind: str
+    shape: str
+    sql: Optional[str]
+    params: List[Any]
+    duration_ms: Optional[float]  # None — результат из кэша
+    rows: Optional[int]
+    error: Optional[str]
+
+
+@dataclass
+class ShapeStats:
+    """Задержки одной формы запроса; время только у выполненных на сервере"""
+    shape: str
+    runs: int
+    errors: int
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    max_ms: Optional[float]
+    avg_rows: Optional[float]
+    last_ts: float
+    tabs: str
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Процентиль по ближайшему рангу; values отсортированы"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * q // 100))  # ceil
+    return values[int(rank) - 1]
+
+
+class QueryHistory:
+    """Журнал запросов приложения в файле SQLite рядом с профилем пользователя.
+
+    Пишется из GUI-потока и потоков пула, поэтому одно соединение
+    защищено блокировкой. Ошибки журнала не мешают работе с БД —
+    они печатаются в консоль.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserted = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Файл создается при первой записи, а не при импорте модуля
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def record(self, tab: str, kind: str, shape: str, sql: Optional[str], params: List[Any],
+               duration_ms: Optional[float], rows: Optional[int], error: Optional[BaseException] = None):
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute(
+                        "INSERT INTO queries (ts, tab, kind, shape, sql, params, duration_ms, rows, error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (time.time(), tab, kind, shape, sql, json.dumps(params, default=str),
+                         duration_ms, rows, None if error is None else str(error)),
+                    )
+                    self._inserted += 1
+                    if self._inserted % 500 == 0:
+                        conn.execute(
+                            "DELETE FROM queries WHERE id <= (SELECT max(id) FROM queries) - ?",
+                            (MAX_ENTRIES,),
+                        )
+        except sqlite3.Error as e:
+            print("Query history error:", e)
+
+    def record_statement(self, engine: Engine, tab: str, kind: str, stmt,
+                         duration_ms: Optional[float], rows: Optional[int],
+                         error: Optional[BaseException] = None):
+        """record для текста SQL или select() Core"""
+        try:
+            shape, sql, params = statement_text(engine, stmt)
+        except Exception as e:
+            print("Query history error:", e)
+            return
+        self.record(tab, kind, shape, sql, params, duration_ms, rows, error)
+
+    def shape_stats(self) -> List[ShapeStats]:
+        """p50/p95 по формам запросов, самые медленные (по p95) — первыми"""
+        with self._lock:
+            try:
+                rows = self._connection().execute(
+                    "SELECT shape, ts, tab, duration_ms, rows, error FROM queries ORDER BY shape"
+                ).fetchall()
+            except sqlite3.Error as e:
+                print("Query history error:", e)
+                return []
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[0], []).append(row)
+
+        stats = []
+        for shape, items in groups.items():
+            durations = sorted(r[3] for r in items if r[3] is not None and r[5] is None)
+            counts = [r[4] for r in items if r[4] is not None]
+            stats.append(ShapeStats(
+                shape=shape,
+                runs=len(items),
+                errors=sum(1 for r in items if r[5] is not None),
+                p50_ms=percentile(durations, 50),
+                p95_ms=percentile(durations, 95),
+                max_ms=durations[-1] if durations else None,
+                avg_rows=sum(counts) / len(counts) if counts else None,
+                last_ts=max(r[1] for r in items),
+                tabs=", ".join(sorted({r[2] for r in items})),
+            ))
+        stats.sort(key=lambda s: (s.p95_ms is None, -(s.p95_ms or 0)))
+        return stats
+
+    def entries(self, shape: Optional[str] = None, limit: int = 200) -> List[HistoryEntry]:
+        """Последние записи (формы shape или все)"""
+        query = "SELECT id, ts, tab, kind, shape, sql, params, duration_ms, rows, error FROM queries"
+        args: tuple = ()
+        if shape is not None:
+            query += " WHERE shape = ?"
+            args = (shape,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            try:
+                rows = self._connection().execute(query, args + (limit,)).fetchall()
+            except sqlite3.Error as e:
+                print("Query history error:", e)
+                return []
+        return [HistoryEntry(*row[:6], json.loads(row[6]), *row[7:]) for row in rows]
+
+    def clear(self):
+        with self._lock:
+            try:
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM queries")
+            except sqlite3.Error as e:
+                print("Query history error:", e)
+
+
+query_history = QueryHistory()
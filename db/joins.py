@@ -0,0 +1,93 @@
+# ===== Base =====
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+
+# ===== Files =====
+from db.reflection import CatalogSnapshot
+
+
+
+# -------------------------------
+# Пути JOIN по графу внешних ключей
+# -------------------------------
+# Пути длиннее редко нужны и быстро множатся
+MAX_JOIN_HOPS = 3
+
+
+@dataclass(frozen=True)
+class JoinStep:
+    """Соединение по одному внешнему ключу: left.left_column = right.right_column"""
+    left_table: str
+    left_column: str
+    right_table: str
+    right_column: str
+
+    @property
+    def condition(self) -> str:
+        return f"{self.left_table}.{self.left_column} = {self.right_table}.{self.right_column}"
+
+
+@dataclass(frozen=True)
+class JoinPath:
+    steps: Tuple[JoinStep, ...]
+
+    @property
+    def target(self) -> str:
+        return self.steps[-1].right_table
+
+    @property
+    def label(self) -> str:
+        return " → ".join([self.steps[0].left_table] + [step.right_table for step in self.steps])
+
+
+def fk_graph(snapshot: CatalogSnapshot) -> Dict[str, List[JoinStep]]:
+    """Смежность таблиц по внешним ключам — в обе стороны
+
+    Каждое ребро соединяет столбец внешнего ключа со столбцом, на
+    который он ссылается (PK или UNIQUE), поэтому обе стороны условия
+    JOIN — ключевые столбцы с индексом.
+    """
+    graph: Dict[str, List[JoinStep]] = {name: [] for name in snapshot.tables}
+    for table_name in snapshot.tables:
+        for column, ref_table, ref_column in snapshot.foreign_keys(table_name):
+            if ref_table not in graph:
+                continue
+            graph[table_name].append(JoinStep(table_name, column, ref_table, ref_column))
+            graph[ref_table].append(JoinStep(ref_table, ref_column, table_name, column))
+    return graph
+
+
+def join_paths(snapshot: CatalogSnapshot, start: str, joined: Iterable[str] = (),
+               max_hops: int = MAX_JOIN_HOPS) -> List[JoinPath]:
+    """Пути от start к таблицам, еще не участвующим в запросе
+
+    joined — уже присоединенные таблицы: путь может проходить через них
+    (они не присоединяются повторно, см. new_steps), но не заканчиваться
+    на них. Пути без повторов таблиц, короткие — первыми.
+    """
+    graph = fk_graph(snapshot)
+    if start not in graph:
+        return []
+    done = set(joined) | {start}
+    paths = []
+
+    def walk(table: str, steps: Tuple[JoinStep, ...], visited: frozenset):
+        for step in graph.get(table, []):
+            if step.right_table in visited:
+                continue
+            path = steps + (step,)
+            if step.right_table not in done:
+                paths.append(JoinPath(path))
+            if len(path) < max_hops:
+                walk(step.right_table, path, visited | {step.right_table})
+
+    walk(start, (), frozenset({start}))
+    paths.sort(key=lambda p: (len(p.steps), p.target, p.label))
+    return paths
+
+
+def new_steps(path: JoinPath, joined: Iterable[str]) -> List[JoinStep]:
+    """Шаги пути, присоединяющие еще не присоединенные таблицы"""
+    joined = set(joined)
+    return [step for step in path.steps if step.right_table not in joined]
@@ -0,0 +1,424 @@
+# ===== Base =====
+import json
+import re
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+
+# ===== PySide6 =====
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Table, event, func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import Select
+
+
+# ===== Files =====
+from db.config import PROFILE_REPORTING
+from db.filters import FilterSpec
+from db.profiles import with_profile
+from db.result_cache import affected_tables, result_cache, written_table
+from db.workers import TaskRunner
+
+
+
+# -------------------------------
+# Материализованные представления отчетов GROUP BY
+# -------------------------------
+# Описание представления хранится в его комментарии (COMMENT ON) — так
+# его находят и другие копии приложения; метка отличает наши представления
+MATVIEW_TAG = "bdiz_matview"
+
+# Столбец с числом строк группы, которого нет в исходном отчете
+GROUP_ROWS_COLUMN = "group_rows"
+
+# Повтор неудачного обновления: пауза удваивается с REFRESH_RETRY_SECONDS,
+# после REFRESH_MAX_FAILURES ошибок подряд — только вручную
+REFRESH_RETRY_SECONDS = 10
+REFRESH_MAX_FAILURES = 6
+
+_NAME = re.compile(r"^[a-z_][a-z0-9_]{0,59}$")
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class RefreshFailure:
+    count: int  # ошибок подряд
+    error: str
+    retry_at: Optional[float]  # monotonic; None — автоматически больше не обновляется
+
+
+@dataclass
+class MatView:
+    name: str
+    # Текст исходного запроса (литералы подставлены) — по нему узнается
+    # повторный запрос того же отчета
+    source: str
+    tables: FrozenSet[str]
+    columns: List[str]
+    order_by: List[str] = field(default_factory=list)
+    # Обновлять после изменения исходных таблиц и/или раз в interval секунд (0 — нет)
+    on_write: bool = True
+    interval: int = 0
+
+    @property
+    def read_sql(self) -> str:
+        """Запрос отчета к представлению: те же столбцы и порядок строк"""
+        sql = f"SELECT {', '.join(_quote(c) for c in self.columns)} FROM {self.name}"
+        if self.order_by:
+            sql += " ORDER BY " + ", ".join(self.order_by)
+        return sql
+
+    def meta(self) -> str:
+        return json.dumps({
+            "tag": MATVIEW_TAG, "source": self.source, "tables": sorted(self.tables),
+            "columns": self.columns, "order_by": self.order_by,
+            "on_write": self.on_write, "interval": self.interval,
+        }, ensure_ascii=False)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def report_key(engine: Engine, stmt) -> Optional[str]:
+    """Текст запроса с литералами без лишних пробелов; None — для текста SQL и ошибок"""
+    if not isinstance(stmt, Select):
+        return None
+    try:
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    except Exception:
+        return None
+    return _SPACES.sub(" ", sql).strip()
+
+
+def _parse_meta(name: str, comment: Optional[str]) -> Optional[MatView]:
+    try:
+        meta = json.loads(comment or "")
+    except ValueError:
+        return None
+    if not isinstance(meta, dict) or meta.get("tag") != MATVIEW_TAG:
+        return None
+    return MatView(
+        name=name, source=meta["source"], tables=frozenset(meta["tables"]),
+        columns=meta["columns"], order_by=meta.get("order_by", []),
+        on_write=meta.get("on_write", True), interval=meta.get("interval", 0),
+    )
+
+
+class MatViewRegistry:
+    """Представления отчетов по engine; общий для вкладок и планировщика.
+
+    Список читается из каталога один раз (load) и обновляется при
+    создании и удалении через registry. Представление с отложенным
+    обновлением после записи считается устаревшим — find() его не
+    возвращает, и отчет читается из исходных таблиц. Загруженные из
+    каталога представления устаревшие до первого обновления. После
+    ошибки обновления due() повторяет его с растущей паузой, а после
+    REFRESH_MAX_FAILURES ошибок — нет (см. failure).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[str, Dict[str, MatView]] = {}
+        # engine -> имя -> время последнего обновления (monotonic)
+        self._refreshed: Dict[str, Dict[str, float]] = {}
+        self._dirty: Dict[str, Set[str]] = {}
+        self._failures: Dict[str, Dict[str, RefreshFailure]] = {}
+
+    @staticmethod
+    def _engine_key(engine: Engine) -> str:
+        return str(engine.url)
+
+    # ----- Каталог -----
+    def load(self, engine: Engine) -> List[MatView]:
+        """Читает представления приложения из текущей схемы (только PostgreSQL)"""
+        views = {}
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as conn:
+                rows = conn.execute(text(
+                    "SELECT c.relname, obj_description(c.oid, 'pg_class') AS comment "
+                    "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE c.relkind = 'm' AND n.nspname = current_schema()"
+                ))
+                for row in rows:
+                    view = _parse_meta(row.relname, row.comment)
+                    if view is not None:
+                        views[view.name] = view
+        key = self._engine_key(engine)
+        with self._lock:
+            known = self._views.get(key, {})
+            self._views[key] = views
+            # Когда обновлялись представления, созданные раньше, неизвестно:
+            # исходные таблицы могли измениться и без приложения. Новые для
+            # registry представления устаревшие (find() их не вернет), а без
+            # времени обновления due() отдаст их планировщику на первой проверке
+            self._dirty.setdefault(key, set()).update(name for name in views if name not in known)
+        return list(views.values())
+
+    def views(self, engine: Engine) -> List[MatView]:
+        with self._lock:
+            return list(self._views.get(self._engine_key(engine), {}).values())
+
+    def find(self, engine: Engine, stmt) -> Optional[MatView]:
+        """Актуальное представление с результатом запроса stmt"""
+        key = self._engine_key(engine)
+        with self._lock:
+            views = self._views.get(key)
+            if not views:
+                return None
+        source = report_key(engine, stmt)
+        if source is None:
+            return None
+        with self._lock:
+            dirty = self._dirty.get(key, set())
+            for view in views.values():
+                if view.source == source and not (view.on_write and view.name in dirty):
+                    return view
+        return None
+
+    def forget(self, engine: Engine):
+        key = self._engine_key(engine)
+        with self._lock:
+            self._views.pop(key, None)
+            self._refreshed.pop(key, None)
+            self._dirty.pop(key, None)
+            self._failures.pop(key, None)
+
+    # ----- Создание и удаление -----
+    def create(self, engine: Engine, name: str, stmt: Select, spec: FilterSpec,
+               on_write: bool = True, interval: int = 0) -> MatView:
+        """Создает представление отчета GROUP BY с уникальным индексом
+
+        ValueError — отчет нельзя сохранить (с объяснением),
+        SQLAlchemyError — ошибка БД.
+        """
+        if engine.dialect.name != 'postgresql':
+            raise ValueError("материализованные представления доступны только в PostgreSQL")
+        if not _NAME.match(name):
+            raise ValueError("имя: латинские строчные буквы, цифры и _, не с цифры")
+        if not spec.group_by:
+            raise ValueError("в отчете нет GROUP BY")
+
+        columns = [c.name for c in stmt.selected_columns]
+        if len(set(columns)) != len(columns):
+            raise ValueError("в отчете повторяются имена столбцов — задайте псевдонимы")
+        # Группа однозначно определяется столбцами GROUP BY — по ним строится
+        # уникальный индекс, без которого нельзя REFRESH ... CONCURRENTLY
+        missing = [c for c in spec.group_by if c not in columns]
+        if missing:
+            raise ValueError(f"столбцы GROUP BY должны быть в SELECT: {', '.join(missing)}")
+
+        source = report_key(engine, stmt)
+        if source is None:
+            raise ValueError("значения фильтра нельзя записать в определение представления")
+        body = stmt.order_by(None).add_columns(func.count().label(GROUP_ROWS_COLUMN))
+        body_sql = str(body.compile(engine, compile_kwargs={"literal_binds": True}))
+
+        order_by = [f"{_quote(c)} {d}" for c, d in spec.order_by if c in columns]
+        tables = result_cache.tables_of(stmt, ())
+        view = MatView(name, source, tables, columns, order_by, on_write, interval)
+
+        with with_profile(engine, PROFILE_REPORTING).begin() as conn:
+            conn.execute(text(f"CREATE MATERIALIZED VIEW {name} AS {body_sql}"))
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX ux_{name} ON {name} "
+                f"({', '.join(_quote(c) for c in spec.group_by)})"
+            ))
+            conn.execute(text(f"COMMENT ON MATERIALIZED VIEW {name} IS :meta"), {"meta": view.meta()})
+
+        key = self._engine_key(engine)
+        with self._lock:
+            self._views.setdefault(key, {})[name] = view
+            self._refreshed.setdefault(key, {})[name] = time.monotonic()
+        return view
+
+    def drop(self, engine: Engine, name: str):
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+        key = self._engine_key(engine)
+        with self._lock:
+            self._views.get(key, {}).pop(name, None)
+            self._refreshed.get(key, {}).pop(name, None)
+            self._dirty.get(key, set()).discard(name)
+            self._failures.get(key, {}).pop(name, None)
+
+    # ----- Обновление -----
+    def mark_dirty(self, engine: Engine, tables: Iterable[str]) -> List[str]:
+        """Отмечает представления, читающие tables; возвращает их имена"""
+        tables = set(tables)
+        key = self._engine_key(engine)
+        with self._lock:
+            names = [
+                view.name for view in self._views.get(key, {}).values()
+                if "*" in tables or not view.tables.isdisjoint(tables)
+            ]
+            self._dirty.setdefault(key, set()).update(names)
+        return names
+
+    def is_dirty(self, engine: Engine, name: str) -> bool:
+        with self._lock:
+            return name in self._dirty.get(self._engine_key(engine), set())
+
+    def refreshed_at(self, engine: Engine, name: str) -> Optional[float]:
+        with self._lock:
+            return self._refreshed.get(self._engine_key(engine), {}).get(name)
+
+    def failure(self, engine: Engine, name: str) -> Optional[RefreshFailure]:
+        """Последние ошибки обновления подряд; None — последнее обновление удалось"""
+        with self._lock:
+            return self._failures.get(self._engine_key(engine), {}).get(name)
+
+    def due(self, engine: Engine) -> List[MatView]:
+        """Представления, которые пора обновить: изменены исходные таблицы или истек интервал
+
+        Представления после ошибки обновления — не раньше назначенного повтора.
+        """
+        key = self._engine_key(engine)
+        now = time.monotonic()
+        with self._lock:
+            dirty = self._dirty.get(key, set())
+            refreshed = self._refreshed.get(key, {})
+            failures = self._failures.get(key, {})
+            views = []
+            for view in self._views.get(key, {}).values():
+                failure = failures.get(view.name)
+                if failure is not None and (failure.retry_at is None or now < failure.retry_at):
+                    continue
+                if (view.on_write and view.name in dirty) \
+                        or (view.interval and now - refreshed.get(view.name, 0) >= view.interval):
+                    views.append(view)
+            return views
+
+    def refresh(self, engine: Engine, name: str):
+        """REFRESH MATERIALIZED VIEW CONCURRENTLY: чтение представления не блокируется
+
+        Отметка об изменениях снимается до начала: записи, сделанные во
+        время обновления, отметят представление снова. Ошибка запоминается
+        (failure) и откладывает следующую попытку due(); ручной вызов
+        выполняется всегда.
+        """
+        key = self._engine_key(engine)
+        with self._lock:
+            self._dirty.get(key, set()).discard(name)
+        try:
+            # Тайм-аут отчетов: обновление читает исходные таблицы целиком
+            with with_profile(engine, PROFILE_REPORTING).begin() as conn:
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        except SQLAlchemyError as e:
+            with self._lock:
+                self._dirty.setdefault(key, set()).add(name)
+                failures = self._failures.setdefault(key, {})
+                previous = failures.get(name)
+                count = previous.count + 1 if previous is not None else 1
+                retry_at = None
+                if count < REFRESH_MAX_FAILURES:
+                    retry_at = time.monotonic() + REFRESH_RETRY_SECONDS * 2 ** (count - 1)
+                failures[name] = RefreshFailure(count, str(getattr(e, "orig", None) or e), retry_at)
+            raise
+        with self._lock:
+            self._refreshed.setdefault(key, {})[name] = time.monotonic()
+            self._failures.get(key, {}).pop(name, None)
+        result_cache.invalidate(engine, {name})
+
+
+matviews = MatViewRegistry()
+
+
+# -------------------------------
+# Отметка об изменениях исходных таблиц
+# -------------------------------
+_watched_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def watch_sources(engine: Engine, tables: Dict[str, Table], registry: MatViewRegistry = matviews):
+    """Отмечает представления устаревшими после COMMIT записи в их таблицы"""
+    if engine in _watched_engines:
+        return
+    _watched_engines.add(engine)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        name = written_table(statement)
+        if name is None:
+            return
+        conn.info.setdefault("matview_dirty", set()).update(affected_tables(name, tables))
+
+    @event.listens_for(engine, "commit")
+    def _after_commit(conn):
+        dirty = conn.info.pop("matview_dirty", None)
+        if dirty:
+            registry.mark_dirty(engine, dirty)
+
+    @event.listens_for(engine, "rollback")
+    def _after_rollback(conn):
+        conn.info.pop("matview_dirty", None)
+
+
+class MatViewScheduler(QObject):
+    """Обновляет представления в пуле потоков: после записей — с задержкой,
+    чтобы серия изменений дала одно обновление, и по их интервалу.
+
+    refreshed(name) — представление обновлено, failed(name, ошибка);
+    повторы после ошибок — по расписанию registry (MatViewRegistry.due).
+    """
+
+    refreshed = Signal(str)
+    failed = Signal(str, object)
+
+    # Период проверки и задержка обновления после записи, мс
+    TICK_MS = 5_000
+
+    def __init__(self, engine: Engine, registry: MatViewRegistry = matviews, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.registry = registry
+        self.runner = TaskRunner(self)
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.TICK_MS)
+        self._timer.timeout.connect(self.tick)
+        # Обновляемые сейчас: одно представление не обновляется дважды одновременно
+        self._refreshing: Set[str] = set()
+
+    def start(self):
+        if self.engine.dialect.name != 'postgresql':
+            return
+        self.runner.submit("load", self.registry.load, self.engine,
+                           on_error=lambda e: print("Materialized views error:", e))
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        self.runner.cancel()
+        self._refreshing.clear()
+
+    def tick(self):
+        for view in self.registry.due(self.engine):
+            self.refresh(view.name)
+
+    def refresh(self, name: str):
+        if name in self._refreshing:
+            return
+        self._refreshing.add(name)
+        self.runner.submit(("refresh", name), self.registry.refresh, self.engine, name,
+                           on_done=lambda _: self._on_refreshed(name),
+                           on_error=lambda e: self._on_failed(name, e))
+
+    def _on_refreshed(self, name: str):
+        self._refreshing.discard(name)
+        self.refreshed.emit(name)
+
+    def _on_failed(self, name: str, error):
+        self._refreshing.discard(name)
+        failure = self.registry.failure(self.engine, name)
+        if failure is not None and failure.retry_at is None:
+            print(f"Refresh {name} error, automatic refresh stopped after {failure.count} failures:", error)
+        else:
+            print(f"Refresh {name} error:", error)
+        self.failed.emit(name, error)
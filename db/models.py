@@ -1,99 +1,1024 @@
 # ===== Base =====
-from typing import List, Dict, Any
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import List, Dict, Optional, Set, Tuple
 
 
 # ===== PySide6 =====
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, QLocale, QDate, QTime
 
 
 # ===== SQLAlchemy =====
 from sqlalchemy import (
     MetaData, Table, Column, Integer, String, Date, Time, Boolean,
-    ForeignKey, UniqueConstraint, CheckConstraint, select, inspect
+    ForeignKey, UniqueConstraint, CheckConstraint, select, func, tuple_, literal
 )
 
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Engine, Connection, Result
 from sqlalchemy.exc import SQLAlchemyError
 
 
+# ===== Files =====
+from db.config import PROFILE_BULK
+from db.execution import QueryGuard
+from db.profiles import with_profile
+from db.reflection import reflection_cache
+from db.search import search_clause
+from db.storage import ColumnStore
+from db.workers import TaskRunner
+
+
 
 # -------------------------------
 # QAbstractTableModel для SQLAlchemy
 # -------------------------------
+def _runs(indices) -> List[Tuple[int, int]]:
+    """Группирует возрастающие номера строк в диапазоны [start, stop)"""
+    runs: List[Tuple[int, int]] = []
+    for i in indices:
+        if runs and runs[-1][1] == i:
+            runs[-1] = (runs[-1][0], i + 1)
+        else:
+            runs.append((i, i + 1))
+    return runs
+
+
+@dataclass
+class _Snapshot:
+    """Прочитанное состояние таблицы; читается в потоке пула, применяется в GUI-потоке"""
+    columns: List[str]
+    pk_col: Column
+    select_columns: list
+    store: ColumnStore
+    # Открытый курсор потокового режима (передается модели вместе со строками)
+    stream_conn: Optional[Connection] = None
+    stream_result: Optional[Result] = None
+    # Инкрементальное обновление потокового режима: прочитаны только
+    # строки до ключа сортировки bound включительно
+    bound: Optional[tuple] = None
+    row_count: int = 0
+    # Постраничный режим: крайние значения первого столбца ключа
+    bounds: Optional[tuple] = None
+
+    def close(self):
+        if self.stream_result is not None:
+            self.stream_result.close()
+            self.stream_result = None
+        if self.stream_conn is not None:
+            self.stream_conn.close()
+            self.stream_conn = None
+
+
+# Роль для сортировки и сравнения: значение ячейки в исходном типе
+SORT_ROLE = Qt.UserRole
+
+
+def format_display(locale: QLocale, kind: str, value) -> str:
+    """Текст ячейки по виду столбца ColumnStore: даты, время и числа — по локали"""
+    if kind == "date":
+        return locale.toString(QDate(value.year, value.month, value.day), QLocale.ShortFormat)
+    if kind == "time":
+        if value.second or value.microsecond:
+            return value.isoformat(timespec="seconds")
+        return locale.toString(QTime(value.hour, value.minute), QLocale.ShortFormat)
+    if kind == "bool":
+        return "Да" if value else "Нет"
+    if kind == "float":
+        return locale.toString(value, 'g', 15)
+    return str(value)
+
+
 class SATableModel(QAbstractTableModel):
-    """Универсальная модель для QTableView (SQLAlchemy)."""
+    """Универсальная модель для QTableView (SQLAlchemy).
+
+    DisplayRole — отформатированный текст (кэшируется в ColumnStore),
+    EditRole и SORT_ROLE — значение в исходном типе (int, date, bool...).
+    """
+
+    # Сколько строк курсора переносится в хранилище за один раз
+    _FILL_CHUNK = 5000
+
+    # Ключи фоновых задач обновления, чтения измененных строк
+    # и открытия курсора после простоя (см. TaskRunner)
+    _REFRESH = "refresh"
+    _CHANGES = "changes"
+    _REOPEN = "reopen"
 
-    def __init__(self, engine: Engine, table: Table, parent=None):
+    # Простой курсора потокового режима (мс), после которого он закрывается
+    _STREAM_IDLE_MS = 10_000
+
+    def __init__(self, engine: Engine, table: Table, parent=None,
+                 streaming: bool = False, fetch_size: int = 500):
         super().__init__(parent)
         self.engine = engine
         self.table = table
         self.columns: List[str] = [c.name for c in self.table.columns]
         self.pk_col = list(self.table.primary_key.columns)[0]
-        self._rows: List[Dict[str, Any]] = []
-        self.refresh()
+        self._store = ColumnStore(self.columns)
 
-    def refresh(self):
-        self.beginResetModel()
+        # Потоковый режим: строки читаются порциями через серверный курсор,
+        # следующая порция запрашивается представлением через fetchMore()
+        self.streaming = streaming
+        self.fetch_size = fetch_size
+        self._stream_conn: Optional[Connection] = None
+        self._stream_result: Optional[Result] = None
+        # Курсор держит транзакцию, а с ней блокировку таблицы (DDL ждет ее)
+        # и старый снимок (мешает VACUUM), поэтому после простоя он закрывается.
+        # Догрузка продолжается новым курсором после ключа последней строки
+        self._stream_columns: list = []
+        self._parked_key: Optional[tuple] = None
+        # Курсор открывается заново в пуле потоков (сортировка может быть долгой)
+        self._reopening = False
+        self._stream_idle = QTimer(self)
+        self._stream_idle.setSingleShot(True)
+        self._stream_idle.setInterval(self._STREAM_IDLE_MS)
+        self._stream_idle.timeout.connect(self.release_stream)
+
+        # Сортировка выполняется сервером (см. sort); None — по первичному ключу
+        self._sort_column: Optional[str] = None
+        self._sort_desc = False
+
+        # Строка быстрого поиска (см. set_search и db/search.py)
+        self._search = ""
+
+        # Даты, время и числа форматируются по локали приложения
+        self._locale = QLocale()
+
+        # Запросы модели ограничены statement_timeout и прерываются cancel();
+        # модель только читает, поэтому может читать с реплики (db/replica.py)
+        self.guard = QueryGuard(engine)
+        self._reads = frozenset([table.name])
+
+        # Ключи из ленты изменений, еще не перечитанные (см. apply_changes)
+        self._changed_keys: Set = set()
+
+        # Загрузка идет в пуле потоков; busy_changed раннера показывает ее ход
+        self.runner = TaskRunner(self)
+        self.refresh_async()
+
+    def refresh(self, incremental: bool = False):
+        """Перечитывает таблицу из БД.
+
+        При incremental=True новый результат сравнивается с текущим по
+        первичному ключу, и представления получают только rowsRemoved,
+        rowsInserted и dataChanged для изменившихся строк — выделение,
+        прокрутка и сортировка сохраняются.
+        """
+        # Синхронное обновление делает незавершенные фоновые неактуальными
+        self.runner.cancel(self._REFRESH)
+        self._drop_changes()
+        incremental = incremental and self._can_diff()
         try:
-            with self.engine.connect() as conn:
-                # Получаем актуальные столбцы из базы данных
-                table_name = self.table.name
-                inspector = inspect(self.engine)
-                actual_columns = inspector.get_columns(table_name)
-                actual_column_names = [col['name'] for col in actual_columns]
-
-                # Обновляем список столбцов модели, если они изменились
-                if self.columns != actual_column_names:
-                    self.columns = actual_column_names
-
-                # Обновляем первичный ключ
-                pk_columns = inspector.get_pk_constraint(table_name)['constrained_columns']
-                if pk_columns:
-                    self.pk_col = self.table.c[pk_columns[0]]
-
-                # Создаем запрос только с существующими столбцами
-                columns_to_select = [getattr(self.table.c, col_name) for col_name in actual_column_names
-                                     if hasattr(self.table.c, col_name)]
-
-                self._rows = []  # Очищаем текущие данные
-
-                if columns_to_select:
-                    res = conn.execute(select(*columns_to_select).order_by(self.pk_col.asc()))
-                    for r in res:
-                        # Безопасно создаем словарь из mapping
-                        row_dict = {}
-                        for key, value in r._mapping.items():
-                            row_dict[key] = value
-                        self._rows.append(row_dict)
-                else:
-                    self._rows = []
+            snapshot = self._read_snapshot(incremental, self._diff_bound(incremental))
         except SQLAlchemyError as e:
             print(f"Ошибка при обновлении данных: {e}")
-            self._rows = []
+            snapshot = None
+        self._install_snapshot(snapshot, incremental)
+
+    def refresh_async(self, incremental: bool = False):
+        """То же, что refresh(), но запрос выполняется в пуле потоков
+
+        Результат применяется, только если после него не запрашивалось
+        другое обновление; устаревший результат отбрасывается.
+        """
+        incremental = incremental and self._can_diff()
+        # Обновление перечитывает и строки, ожидающие apply_changes
+        self._drop_changes()
+        self.runner.submit(
+            self._REFRESH, self._read_snapshot, incremental, self._diff_bound(incremental),
+            on_done=lambda snapshot: self._install_snapshot(snapshot, incremental),
+            on_error=lambda e: print(f"Ошибка при обновлении данных: {e}"),
+            on_discard=_Snapshot.close,
+            # Курсор потокового режима дочитывается в GUI-потоке — только пул потоков
+            loop_safe=not (self.streaming and not incremental),
+        )
+
+    def _can_diff(self) -> bool:
+        if self.rowCount() == 0:
+            return False
+        # Недочитанный курсор можно продолжить только с известного ключа сортировки
+        return not self._partial() or self._keyset_ok(self.pk_col)
+
+    def _diff_bound(self, incremental: bool) -> Optional[tuple]:
+        # В потоковом режиме сравнивается только уже загруженная часть,
+        # остальное придет через fetchMore() из заново открытого курсора
+        if incremental and self._partial():
+            return self._row_key(self._store, len(self._store) - 1, self.pk_col)
+        return None
+
+    def _reflect(self) -> Tuple[List[str], Column, list]:
+        """Столбцы, первичный ключ и столбцы для SELECT (модель не меняется)"""
+        # Актуальные столбцы берутся из общего кэша отражения: каталог БД
+        # читается заново только после DDL (см. reflection_cache.invalidate)
+        info = reflection_cache.get(self.engine, self.table.name)
+        pk_col = self.table.c[info.pk_columns[0]] if info.pk_columns else self.pk_col
+
+        # Создаем запрос только с существующими столбцами
+        select_columns = [getattr(self.table.c, col_name) for col_name in info.columns
+                          if hasattr(self.table.c, col_name)]
+        return list(info.columns), pk_col, select_columns
+
+    def _reflect_columns(self) -> list:
+        """Сверяет столбцы и первичный ключ с БД, возвращает столбцы для SELECT"""
+        columns, self.pk_col, select_columns = self._reflect()
+
+        # Обновляем список столбцов модели, если они изменились
+        if self.columns != columns:
+            self.columns = columns
+        return select_columns
+
+    # -------------------------------
+    # Сортировка на стороне сервера
+    # -------------------------------
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Щелчок по заголовку: запрос перевыполняется с ORDER BY столбца
+
+        Вторым ключом всегда идет первичный ключ, поэтому порядок строк
+        однозначен и позицию в нем можно задать парой (значение, pk) —
+        на этом работают догрузка курсора и постраничный режим.
+        """
+        if not 0 <= column < len(self.columns) or not hasattr(self.table.c, self.columns[column]):
+            return
+        name = self.columns[column]
+        sort_column = None if name == self.pk_col.name else name
+        desc = order == Qt.DescendingOrder
+        if (sort_column, desc) == (self._sort_column, self._sort_desc):
+            return
+        if not self._can_sort_by(sort_column):
+            print(f"Сортировка по столбцу {name} недоступна: в нем допускается NULL")
+            return
+        self._sort_column, self._sort_desc = sort_column, desc
+        self.refresh_async()
+
+    def sort_order(self) -> Tuple[int, Qt.SortOrder]:
+        """Текущая сортировка: номер столбца и направление (для индикатора заголовка)"""
+        name = self._sort_column or self.pk_col.name
+        column = self.columns.index(name) if name in self.columns else 0
+        return column, Qt.DescendingOrder if self._sort_desc else Qt.AscendingOrder
+
+    def _can_sort_by(self, name: Optional[str]) -> bool:
+        # Закрытый после простоя курсор продолжается с ключа сортировки, а NULL не сравнивается
+        return name is None or not self.streaming or not self.table.c[name].nullable
+
+    def _order_columns(self, pk_col) -> list:
+        if self._sort_column is None or self._sort_column == pk_col.name or \
+                not hasattr(self.table.c, self._sort_column):
+            return [pk_col]
+        return [self.table.c[self._sort_column], pk_col]
+
+    def _order_by(self, pk_col) -> list:
+        return [c.desc() if self._sort_desc else c.asc() for c in self._order_columns(pk_col)]
+
+    def _pk_ordered(self) -> bool:
+        """Строки упорядочены по возрастанию первичного ключа"""
+        return len(self._order_columns(self.pk_col)) == 1 and not self._sort_desc
+
+    def _keyset_ok(self, pk_col) -> bool:
+        """Позицию строки можно задать ключом сортировки (NULL в столбце невозможен)"""
+        return all(not c.nullable for c in self._order_columns(pk_col)[:-1])
+
+    def _row_key(self, store: ColumnStore, row: int, pk_col) -> tuple:
+        return tuple(store.value(row, c.name) for c in self._order_columns(pk_col))
+
+    def _keyset_where(self, pk_col, key: tuple, after: bool):
+        """Строки после key (after=True) или до key включительно в текущем порядке"""
+        cols = self._order_columns(pk_col)
+        if len(cols) == 1:
+            lhs, rhs = cols[0], key[0]
+        else:
+            lhs = tuple_(*cols)
+            rhs = tuple_(*[literal(v, c.type) for v, c in zip(key, cols)])
+        if after:
+            return lhs < rhs if self._sort_desc else lhs > rhs
+        return lhs >= rhs if self._sort_desc else lhs <= rhs
+
+    # -------------------------------
+    # Быстрый поиск
+    # -------------------------------
+    def set_search(self, value: str):
+        """Оставляет строки, подходящие под строку поиска (фильтр выполняет сервер)"""
+        value = value.strip()
+        if value == self._search:
+            return
+        self._search = value
+        self.refresh_async()
+
+    def _apply_search(self, stmt):
+        clause = search_clause(self.table.columns, self._search)
+        return stmt if clause is None else stmt.where(clause)
+
+    def _read_snapshot(self, incremental: bool, bound=None) -> _Snapshot:
+        """Читает таблицу; выполняется в потоке пула и не трогает состояние модели"""
+        columns, pk_col, select_columns = self._reflect()
+        snapshot = _Snapshot(columns, pk_col, select_columns, self._new_store(select_columns), bound=bound)
+        if not select_columns:
+            return snapshot
+
+        stmt = self._apply_search(select(*select_columns).order_by(*self._order_by(pk_col)))
+        if bound is not None:
+            stmt = stmt.where(self._keyset_where(pk_col, bound, after=False))
+
+        if self.streaming and not incremental:
+            self._stream_into(snapshot, stmt)
+            return snapshot
+
+        # Кортежи курсора складываются в столбцы пачками,
+        # без промежуточного словаря на каждую строку
+        with self.guard.connect(reads=self._reads) as conn:
+            res = conn.execute(stmt)
+            while True:
+                chunk = res.fetchmany(self._FILL_CHUNK)
+                if not chunk:
+                    break
+                snapshot.store.extend(chunk)
+        return snapshot
+
+    def _install_snapshot(self, snapshot: Optional[_Snapshot], incremental: bool):
+        """Применяет прочитанное состояние; None — ошибка чтения"""
+        if snapshot is not None and incremental and len(self._store) and \
+                [c.name for c in snapshot.select_columns] == self._store.columns:
+            self.pk_col = snapshot.pk_col
+            if self._apply_diff(snapshot.store):
+                if snapshot.bound is not None:
+                    self._close_stream()
+                    self._park(snapshot.select_columns, snapshot.bound)
+                return
+
+        self.beginResetModel()
+        self._close_stream()
+        try:
+            if snapshot is None:
+                self._store = ColumnStore(self.columns)
+                return
+            self.columns = snapshot.columns
+            self.pk_col = snapshot.pk_col
+            self._store = snapshot.store
+            self._stream_conn, self._stream_result = snapshot.stream_conn, snapshot.stream_result
+            self._stream_columns = snapshot.select_columns
+            if self._stream_result is not None:
+                self._stream_idle.start()
+            if snapshot.bound is not None:
+                self._park(snapshot.select_columns, snapshot.bound)
         finally:
             self.endResetModel()
 
+    def _apply_diff(self, new_store: ColumnStore) -> bool:
+        """Переводит модель к new_store точечными сигналами; False — нужен сброс"""
+        pk = self.pk_col.name
+        old_pks = self._store.column_values(pk)
+        new_pks = new_store.column_values(pk)
+        old_set = set(old_pks)
+        new_set = set(new_pks)
+
+        # Оставшиеся строки должны идти в прежнем порядке, иначе
+        # перестановка обойдется дороже полного сброса
+        if [k for k in old_pks if k in new_set] != [k for k in new_pks if k in old_set]:
+            return False
+
+        # Удаления — с конца, чтобы номера строк выше не сдвигались
+        for start, stop in reversed(_runs(i for i, k in enumerate(old_pks) if k not in new_set)):
+            self.beginRemoveRows(QModelIndex(), start, stop - 1)
+            self._store.delete(start, stop)
+            self.endRemoveRows()
+
+        # Вставки — по возрастанию: позиция совпадает с номером в новом результате
+        for start, stop in _runs(j for j, k in enumerate(new_pks) if k not in old_set):
+            self.beginInsertRows(QModelIndex(), start, stop - 1)
+            self._store.insert(start, [new_store.row(j) for j in range(start, stop)])
+            self.endInsertRows()
+
+        changed = self._store.changed_rows(new_store)
+        self._store = new_store
+        last_column = len(self.columns) - 1
+        for start, stop in _runs(changed):
+            self.dataChanged.emit(self.index(start, 0), self.index(stop - 1, last_column))
+        return True
+
+    def _drop_changes(self):
+        self.runner.cancel(self._CHANGES)
+        self._changed_keys.clear()
+
+    def apply_changes(self, pks):
+        """Точечно перечитывает строки с указанными ключами (лента изменений)
+
+        Строки читаются в пуле потоков. Ключи, пришедшие, пока предыдущее
+        чтение еще идет, добавляются к нему: новая задача читает все
+        ожидающие ключи, а результат старой отбрасывается.
+        """
+        columns_to_select = self._reflect_columns()
+        if [c.name for c in columns_to_select] != self._store.columns or \
+                (self._partial() and not len(self._store)):
+            self.refresh_async()
+            return
+        if not self._pk_ordered():
+            # Место строки ищется двоичным поиском по pk — при другой
+            # сортировке проще сравнить результат целиком
+            self.refresh_async(incremental=True)
+            return
+
+        self._changed_keys.update(pks)
+        keys = sorted(self._changed_keys)
+        self.runner.submit(
+            self._CHANGES, self._read_rows, columns_to_select, self.pk_col, keys,
+            on_done=lambda fresh: self._install_rows(columns_to_select, keys, fresh),
+            on_error=lambda e: print(f"Ошибка при обновлении строк: {e}"),
+            loop_safe=True,
+        )
+
+    def _read_rows(self, columns_to_select: list, pk_col, keys: list) -> dict:
+        """Строки с ключами keys по pk; выполняется в потоке пула"""
+        # Строки, переставшие подходить под поиск, не вернутся и будут убраны
+        stmt = self._apply_search(select(*columns_to_select).where(pk_col.in_(keys)))
+        with self.guard.connect(reads=self._reads) as conn:
+            return {r._mapping[pk_col.name]: r for r in conn.execute(stmt)}
+
+    def _install_rows(self, columns_to_select: list, keys: list, fresh: dict):
+        self._changed_keys.difference_update(keys)
+        # Пока строки читались, модель могла перечитать таблицу с другими столбцами
+        if [c.name for c in columns_to_select] != self._store.columns:
+            self.refresh_async()
+            return
+
+        pk = self.pk_col.name
+        # В потоковом режиме строки дальше загруженной части не трогаем:
+        # курсор открыт до изменения, поэтому его придется переоткрыть
+        last_loaded = None
+        if self._partial():
+            last_loaded = self._store.value(len(self._store) - 1, pk)
+
+        reopen = False
+        last_column = len(self.columns) - 1
+        for key in keys:
+            if last_loaded is not None and key > last_loaded:
+                reopen = True
+                continue
+            pos, found = self._store.find_sorted(pk, key)
+            row = fresh.get(key)
+            if found and row is None:
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+                self._store.delete(pos, pos + 1)
+                self.endRemoveRows()
+            elif found:
+                self._store.delete(pos, pos + 1)
+                self._store.insert(pos, [row])
+                self.dataChanged.emit(self.index(pos, 0), self.index(pos, last_column))
+            elif row is not None:
+                self.beginInsertRows(QModelIndex(), pos, pos)
+                self._store.insert(pos, [row])
+                self.endInsertRows()
+
+        if reopen:
+            self._close_stream()
+            self._park(columns_to_select, (last_loaded,))
+
+    @staticmethod
+    def _new_store(columns_to_select: list) -> ColumnStore:
+        return ColumnStore([c.name for c in columns_to_select], [c.type for c in columns_to_select])
+
+    def _stream_into(self, snapshot: _Snapshot, stmt):
+        """Открывает серверный курсор stmt и читает первую порцию в snapshot
+
+        Выполняется в потоке пула. Курсор — всегда на основном сервере:
+        долгая транзакция курсора на реплике задерживает воспроизведение
+        WAL или прерывается конфликтом с ним.
+        """
+        snapshot.stream_conn = self.guard.connect()
+        try:
+            snapshot.stream_result = snapshot.stream_conn.execution_options(
+                stream_results=True, yield_per=self.fetch_size
+            ).execute(stmt)
+            chunk = snapshot.stream_result.fetchmany(self.fetch_size)
+        except SQLAlchemyError:
+            snapshot.close()
+            raise
+        snapshot.store.extend(chunk)
+        if len(chunk) < self.fetch_size:
+            # Строки прочитаны целиком — курсор больше не нужен
+            snapshot.close()
+
+    def _read_stream_after(self, columns_to_select: list, pk_col, key: tuple) -> _Snapshot:
+        """Курсор по строкам после ключа сортировки key; выполняется в потоке пула"""
+        snapshot = _Snapshot([], pk_col, columns_to_select, self._new_store(columns_to_select))
+        self._stream_into(snapshot, self._apply_search(
+            select(*columns_to_select)
+            .where(self._keyset_where(pk_col, key, after=True))
+            .order_by(*self._order_by(pk_col))
+        ))
+        return snapshot
+
+    def _reopen_stream(self):
+        """Открывает курсор с запомненного ключа в фоне; строки добавит _on_stream_reopened"""
+        if self._reopening:
+            return
+        self._reopening = True
+        # Курсор дочитывается в GUI-потоке — только пул потоков (без loop_safe)
+        self.runner.submit(
+            self._REOPEN, self._read_stream_after, self._stream_columns, self.pk_col, self._parked_key,
+            on_done=self._on_stream_reopened,
+            on_error=self._on_reopen_failed,
+            on_discard=_Snapshot.close,
+        )
+
+    def _on_stream_reopened(self, snapshot: _Snapshot):
+        self._reopening = False
+        self._parked_key = None
+        self._stream_conn, self._stream_result = snapshot.stream_conn, snapshot.stream_result
+        if self._stream_result is not None:
+            self._stream_idle.start()
+        store = snapshot.store
+        self._append_rows([store.row(i) for i in range(len(store))])
+
+    def _on_reopen_failed(self, error):
+        print(f"Ошибка при открытии курсора: {error}")
+        self._close_stream()
+
+    def _fetch_chunk(self) -> list:
+        """Читает очередную порцию строк из открытого курсора"""
+        if self._stream_result is None:
+            return []
+        chunk = self._stream_result.fetchmany(self.fetch_size)
+        if len(chunk) < self.fetch_size:
+            # Курсор исчерпан — соединение больше не нужно
+            self._close_stream()
+        else:
+            self._stream_idle.start()
+        return chunk
+
+    def _partial(self) -> bool:
+        """Загружена только часть строк: курсор открыт или закрыт после простоя"""
+        return self._stream_result is not None or self._parked_key is not None
+
+    def _park(self, columns_to_select: list, key: tuple):
+        """Догрузка начнется с ключа key: курсор откроет fetchMore()"""
+        self._stream_columns = columns_to_select
+        self._parked_key = key
+
+    def release_stream(self):
+        """Закрывает курсор потокового режима, запомнив ключ последней строки
+
+        Вызывается после простоя и перед DDL: транзакция курсора держит
+        блокировку таблицы. fetchMore() продолжит чтение новым курсором.
+        """
+        if self._stream_result is None or not len(self._store):
+            return
+        key = self._row_key(self._store, len(self._store) - 1, self.pk_col)
+        self._close_stream()
+        self._park(self._stream_columns, key)
+
+    def _close_stream(self):
+        self._stream_idle.stop()
+        self._parked_key = None
+        # Курсор, открываемый в фоне, больше не нужен
+        if self._reopening:
+            self.runner.cancel(self._REOPEN)
+            self._reopening = False
+        if self._stream_result is not None:
+            self._stream_result.close()
+            self._stream_result = None
+        if self._stream_conn is not None:
+            self._stream_conn.close()
+            self._stream_conn = None
+
+    def close(self):
+        """Освобождает соединение потокового режима (при закрытии вкладки)"""
+        self.runner.cancel()
+        self._close_stream()
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        # Пока курсор открывается в фоне, представление не просит новых порций
+        return not parent.isValid() and self._partial() and not self._reopening
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._partial() or self._reopening:
+            return
+        if self._stream_result is None:
+            self._reopen_stream()
+            return
+        try:
+            chunk = self._fetch_chunk()
+        except SQLAlchemyError as e:
+            print(f"Ошибка при догрузке данных: {e}")
+            self._close_stream()
+            return
+        self._append_rows(chunk)
+
+    def _append_rows(self, chunk: list):
+        if not chunk:
+            return
+        first = len(self._store)
+        self.beginInsertRows(QModelIndex(), first, first + len(chunk) - 1)
+        self._store.extend(chunk)
+        self.endInsertRows()
+
     def rowCount(self, parent=QModelIndex()) -> int:
-        return 0 if parent.isValid() else len(self._rows)
+        return 0 if parent.isValid() else len(self._store)
 
     def columnCount(self, parent=QModelIndex()) -> int:
         return 0 if parent.isValid() else len(self.columns)
 
     def data(self, index: QModelIndex, role=Qt.DisplayRole):
-        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole, SORT_ROLE):
             return None
-        row = self._rows[index.row()]
-        col_name = self.columns[index.column()]
-        val = row.get(col_name)
-        return "" if val is None else str(val)
+        loc = self._locate(index.row())
+        if loc is None:
+            return "" if role == Qt.DisplayRole else None
+        store, i = loc
+        column = self.columns[index.column()]
+        if role == Qt.DisplayRole:
+            return store.display(i, column, self._format_value)
+        return store.value(i, column)
+
+    def _format_value(self, kind: str, value) -> str:
+        """Текст значения для DisplayRole (вызывается один раз на ячейку)"""
+        return format_display(self._locale, kind, value)
 
     def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
         if role != Qt.DisplayRole:
             return None
         return self.columns[section] if orientation == Qt.Horizontal else section + 1
 
+    def _locate(self, row: int) -> Optional[Tuple[ColumnStore, int]]:
+        """Хранилище и номер строки в нем для строки модели"""
+        return (self._store, row) if 0 <= row < len(self._store) else None
+
     def pk_value_at(self, row: int):
-        return self._rows[row].get(self.pk_col.name) if 0 <= row < len(self._rows) else None
+        loc = self._locate(row)
+        return loc[0].value(loc[1], self.pk_col.name) if loc is not None else None
+
+
+# -------------------------------
+# Постраничная модель (keyset) с LRU-кэшем страниц
+# -------------------------------
+# Сколько первых символов строки учитывает интерполяция границ страниц
+_STR_POINT_WIDTH = 4
+
+
+def _str_scale(start: str, end: str) -> Tuple[str, int, int]:
+    """Общее начало строк, наименьший символ и основание для интерполяции строк
+
+    Символы после общего начала считаются цифрами в системе счисления
+    по основанию, равному числу символов между наименьшим и наибольшим
+    символом обеих строк, — так соседние значения (цифры, одна азбука)
+    не разносятся по всей таблице Юникода.
+    """
+    prefix = os.path.commonprefix([start, end])
+    chars = [ord(ch) for ch in start[len(prefix):] + end[len(prefix):]]
+    low = min(chars, default=0)
+    return prefix, low, max(chars, default=0) - low + 2
+
+
+def _to_point(value, scale: Optional[Tuple[str, int, int]] = None) -> Optional[float]:
+    """Значение ключа как число для интерполяции; None — тип не интерполируется"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return float(value.toordinal())
+    if isinstance(value, dt_time):
+        return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+    if isinstance(value, str) and scale is not None:
+        prefix, low, base = scale
+        point = 0.0
+        tail = value[len(prefix):len(prefix) + _STR_POINT_WIDTH]
+        for i in range(_STR_POINT_WIDTH):
+            # Цифра 0 — конец строки, символы вне диапазона прижимаются к краям
+            digit = min(max(ord(tail[i]) - low + 1, 1), base - 1) if i < len(tail) else 0
+            point = point * base + digit
+        return point
+    return None
+
+
+def _from_point(point: float, like, scale: Optional[Tuple[str, int, int]] = None):
+    """Число _to_point обратно в значение типа like"""
+    if isinstance(like, int):
+        return int(point)
+    if isinstance(like, Decimal):
+        return Decimal(repr(point))
+    if isinstance(like, float):
+        return point
+    if isinstance(like, datetime):
+        return datetime.fromtimestamp(point, like.tzinfo)
+    if isinstance(like, date):
+        return date.fromordinal(int(point))
+    if isinstance(like, dt_time):
+        seconds = int(point)
+        return dt_time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    prefix, low, base = scale
+    digits = []
+    for _ in range(_STR_POINT_WIDTH):
+        point, digit = divmod(point, base)
+        digits.append(int(digit))
+    chars = []
+    for digit in reversed(digits):
+        if digit == 0:
+            break
+        chars.append(chr(low + digit - 1))
+    return prefix + "".join(chars)
+
+
+class SAPagedTableModel(SATableModel):
+    """Модель, читающая страницы фиксированного размера по ключу сортировки.
+
+    Страница p запрашивается как WHERE (col, pk) > :after ORDER BY col, pk
+    LIMIT n, где after — ключ последней строки страницы p-1 (без
+    сортировки по столбцу — просто pk). Страницы читаются в пуле потоков:
+    пока страница не прочитана, data() возвращает пустые ячейки, после
+    чтения приходит dataChanged. Для страницы вдали от прочитанных
+    граница оценивается интерполяцией первого столбца ключа между
+    известной границей и крайним значением, а точный ключ берется одним
+    поиском по индексу — без OFFSET. В памяти держится не более
+    max_pages страниц, rowCount берется из оценки планировщика.
+    """
+
+    # Задержка (мс), за которую копятся запросы страниц от перерисовок
+    _PAGE_DELAY_MS = 30
+
+    def __init__(self, engine: Engine, table: Table, parent=None,
+                 page_size: int = 500, max_pages: int = 20):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._pages: "OrderedDict[int, ColumnStore]" = OrderedDict()
+        # Граница страницы: страница p начинается после ключа _page_after[p]
+        self._page_after: Dict[int, Optional[tuple]] = {}
+        self._row_count = 0
+        self._select_columns: list = []
+        # Первое и последнее значения первого столбца ключа в текущем порядке
+        self._bounds: Optional[tuple] = None
+        # Страницы, нужные перерисовке, и страницы, читаемые в пуле
+        self._wanted: Set[int] = set()
+        self._loading: Set[int] = set()
+        # Номер набора страниц: ответы, прочитанные до обновления, отбрасываются
+        self._epoch = 0
+        super().__init__(engine, table, parent)
+        self._page_timer = QTimer(self)
+        self._page_timer.setSingleShot(True)
+        self._page_timer.setInterval(self._PAGE_DELAY_MS)
+        self._page_timer.timeout.connect(self._request_pages)
+
+    def apply_changes(self, pks):
+        # Положение конкретных ключей на страницах неизвестно без чтения,
+        # поэтому обновляется кэш страниц целиком (без сброса модели)
+        self.refresh_async(incremental=True)
+
+    def _can_sort_by(self, name: Optional[str]) -> bool:
+        # Границы страниц задаются сравнением ключей, а NULL не сравнивается
+        return name is None or not self.table.c[name].nullable
+
+    def _read_snapshot(self, incremental: bool, bound=None) -> _Snapshot:
+        columns, pk_col, select_columns = self._reflect()
+        snapshot = _Snapshot(columns, pk_col, select_columns, self._new_store(select_columns))
+        if not select_columns:
+            return snapshot
+
+        snapshot.row_count = self._estimate_row_count(pk_col)
+        # Первая страница читается сразу: для маленьких таблиц
+        # это заодно дает точное число строк
+        snapshot.store = self._read_page(select_columns, pk_col, None)
+        if len(snapshot.store) < self.page_size:
+            snapshot.row_count = len(snapshot.store)
+        else:
+            if snapshot.row_count <= self.page_size:
+                # Оценка занижена, а страница полная — за ней есть еще строки
+                snapshot.row_count = 2 * self.page_size
+            snapshot.bounds = self._key_bounds(pk_col)
+        return snapshot
+
+    def _install_snapshot(self, snapshot: Optional[_Snapshot], incremental: bool):
+        """Применяет первую страницу и оценку числа строк
+
+        При incremental строки целиком не сравниваются — таблица может
+        быть огромной. Границы страниц после вставок и удалений устаревают,
+        поэтому кэш очищается, число строк уточняется, а видимая часть
+        перерисовывается через dataChanged (без сброса модели).
+        """
+        if snapshot is not None and incremental and self._row_count and \
+                [c.name for c in snapshot.select_columns] == [c.name for c in self._select_columns]:
+            self._reset_pages(snapshot)
+            self._set_row_count(snapshot.row_count)
+            if self._row_count:
+                self.dataChanged.emit(self.index(0, 0), self.index(self._row_count - 1, len(self.columns) - 1))
+            return
+
+        self.beginResetModel()
+        self._row_count = 0
+        if snapshot is None:
+            self._reset_pages(None)
+        else:
+            self.columns = snapshot.columns
+            self.pk_col = snapshot.pk_col
+            self._select_columns = snapshot.select_columns
+            self._reset_pages(snapshot)
+            self._row_count = snapshot.row_count
+        self.endResetModel()
+
+    def _reset_pages(self, snapshot: Optional[_Snapshot]):
+        self._epoch += 1
+        self._pages.clear()
+        self._page_after = {0: None}
+        self._wanted.clear()
+        self._loading.clear()
+        self._bounds = None
+        if snapshot is None:
+            return
+        self._bounds = snapshot.bounds
+        if len(snapshot.store) == self.page_size:
+            self._page_after[1] = self._row_key(snapshot.store, self.page_size - 1, snapshot.pk_col)
+        self._pages[0] = snapshot.store
+
+    def _estimate_row_count(self, pk_col) -> int:
+        """Дешевая оценка числа строк (план запроса для PostgreSQL)"""
+        with self.guard.connect(reads=self._reads) as conn:
+            if self.engine.dialect.name == 'postgresql':
+                stmt = self._apply_search(select(pk_col))
+                # Значения поиска подставляются литералами — так запрос не зависит от paramstyle драйвера
+                sql = str(stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+                plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"])
+            return conn.execute(self._apply_search(select(func.count()).select_from(self.table))).scalar() or 0
+
+    def _key_bounds(self, pk_col) -> Optional[tuple]:
+        """Крайние значения первого столбца ключа в порядке сортировки (min/max — по индексу)"""
+        first = self._order_columns(pk_col)[0]
+        with self.guard.connect(reads=self._reads) as conn:
+            low, high = conn.execute(self._apply_search(select(func.min(first), func.max(first)))).one()
+        if low is None:
+            return None
+        return (high, low) if self._sort_desc else (low, high)
+
+    def _read_page(self, select_columns: list, pk_col, after) -> ColumnStore:
+        """Читает одну страницу после ключа after (None — с начала)"""
+        stmt = self._apply_search(select(*select_columns).order_by(*self._order_by(pk_col)).limit(self.page_size))
+        if after is not None:
+            stmt = stmt.where(self._keyset_where(pk_col, after, after=True))
+        rows = self._new_store(select_columns)
+        with self.guard.connect(reads=self._reads) as conn:
+            rows.extend(conn.execute(stmt).fetchall())
+        return rows
+
+    def _seek_page_anchor(self, page: int, known: int, after: Optional[tuple],
+                          bounds: Optional[tuple], row_count: int) -> Optional[tuple]:
+        """Оценивает границу страницы page по известной границе страницы known
+
+        Значение первого столбца ключа интерполируется между ключом
+        after и последним значением по доле строк; границей становится
+        ключ последней строки перед этим значением — один шаг по индексу
+        (для сортировки по столбцу — если на нем есть индекс).
+        Выполняется в пуле потоков.
+        """
+        if bounds is None:
+            return after
+        start = after[0] if after is not None else bounds[0]
+        scale = _str_scale(start, bounds[1]) if isinstance(start, str) else None
+        low, high = _to_point(start, scale), _to_point(bounds[1], scale)
+        if low is None or high is None:
+            return after
+        known_row = known * self.page_size
+        fraction = (page - known) * self.page_size / max(1, row_count - known_row)
+        value = _from_point(low + (high - low) * min(1.0, fraction), start, scale)
+
+        cols = self._order_columns(self.pk_col)
+        first = cols[0]
+        stmt = self._apply_search(
+            select(*cols)
+            .where(first > value if self._sort_desc else first < value)
+            .order_by(*[c.asc() if self._sort_desc else c.desc() for c in cols])
+            .limit(1)
+        )
+        if after is not None:
+            stmt = stmt.where(self._keyset_where(self.pk_col, after, after=True))
+        with self.guard.connect(reads=self._reads) as conn:
+            row = conn.execute(stmt).first()
+        return tuple(row) if row is not None else after
+
+    def _read_pages(self, pages: List[int], after, seek) -> List[Tuple[int, Optional[tuple], ColumnStore]]:
+        """Читает подряд идущие страницы (пул потоков); seek — аргументы _seek_page_anchor
+
+        Первая граница — after или оценка по seek, следующие — ключи
+        последних строк прочитанных страниц.
+        """
+        if seek is not None:
+            after = self._seek_page_anchor(pages[0], *seek)
+        loaded = []
+        for page in pages:
+            rows = self._read_page(self._select_columns, self.pk_col, after)
+            loaded.append((page, after, rows))
+            if len(rows) < self.page_size:
+                break
+            after = self._row_key(rows, len(rows) - 1, self.pk_col)
+        return loaded
+
+    def _want_page(self, page: int):
+        """Запоминает нужную страницу; запросы перерисовок уходят пачкой"""
+        if page in self._loading:
+            return
+        self._wanted.add(page)
+        if not self._page_timer.isActive():
+            self._page_timer.start()
+
+    def _request_pages(self):
+        # Читаются только страницы, нужные последним перерисовкам: при
+        # перетаскивании ползунка промежуточные страницы не запрашиваются
+        wanted = sorted(p for p in self._wanted if p not in self._pages and p not in self._loading)
+        self._wanted.clear()
+        runs: List[List[int]] = []
+        for page in wanted:
+            if runs and runs[-1][-1] == page - 1:
+                runs[-1].append(page)
+            else:
+                runs.append([page])
+
+        for pages in runs:
+            first = pages[0]
+            if first in self._page_after:
+                after, seek = self._page_after[first], None
+            else:
+                known = max(p for p in self._page_after if p < first)
+                after, seek = None, (known, self._page_after[known], self._bounds, self._row_count)
+            self._loading.update(pages)
+            epoch = self._epoch
+            self.runner.submit(
+                ("pages", epoch, first), self._read_pages, pages, after, seek,
+                on_done=lambda loaded, epoch=epoch: self._on_pages_loaded(epoch, loaded),
+                on_error=lambda e, epoch=epoch, pages=pages: self._on_pages_failed(epoch, pages, e),
+                loop_safe=True,
+            )
+
+    def _on_pages_failed(self, epoch: int, pages: List[int], error):
+        if epoch == self._epoch:
+            self._loading.difference_update(pages)
+        print(f"Ошибка при чтении страниц {pages[0]}-{pages[-1]}: {error}")
+
+    def _on_pages_loaded(self, epoch: int, loaded):
+        if epoch != self._epoch:
+            return
+        last_column = len(self.columns) - 1
+        for page, after, rows in loaded:
+            self._loading.discard(page)
+            self._page_after[page] = after
+            if len(rows) == self.page_size:
+                next_after = self._row_key(rows, len(rows) - 1, self.pk_col)
+                # Следующая страница, прочитанная от оценки, не стыкуется с этой — перечитать
+                if self._page_after.get(page + 1, next_after) != next_after:
+                    stale = self._pages.pop(page + 1, None)
+                    if stale is not None:
+                        self._emit_page_changed(page + 1, last_column)
+                self._page_after[page + 1] = next_after
+            self._store_page(page, rows)
+            self._emit_page_changed(page, last_column)
+
+    def _emit_page_changed(self, page: int, last_column: int):
+        first = page * self.page_size
+        last = min(first + self.page_size, self._row_count) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+    def _store_page(self, page: int, rows: ColumnStore):
+        self._pages[page] = rows
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+        # Оценка могла ошибиться: уточняем число строк по фактическим данным
+        if len(rows) < self.page_size:
+            actual = page * self.page_size + len(rows)
+        elif (page + 1) * self.page_size >= self._row_count:
+            actual = (page + 2) * self.page_size
+        else:
+            return
+        self._set_row_count(actual)
+
+    def _set_row_count(self, count: int):
+        if count > self._row_count:
+            self.beginInsertRows(QModelIndex(), self._row_count, count - 1)
+            self._row_count = count
+            self.endInsertRows()
+        elif count < self._row_count:
+            self.beginRemoveRows(QModelIndex(), count, self._row_count - 1)
+            self._row_count = count
+            self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._row_count
+
+    def _locate(self, row: int) -> Optional[Tuple[ColumnStore, int]]:
+        if not 0 <= row < self._row_count:
+            return None
+        page, offset = divmod(row, self.page_size)
+        rows = self._pages.get(page)
+        if rows is None:
+            # Страница придет из пула потоков сигналом dataChanged
+            self._want_page(page)
+            return None
+        self._pages.move_to_end(page)
+        return (rows, offset) if offset < len(rows) else None
 
 
 def build_metadata() -> (MetaData, Dict[str, Table]):
@@ -117,7 +1042,7 @@ def build_metadata() -> (MetaData, Dict[str, Table]):
         "flights", md,
         Column("flight_id", Integer, primary_key=True, autoincrement=True),
         Column("aircraft_id", Integer, ForeignKey("aircraft.aircraft_id",
-                                                  onupdate="CASCADE", ondelete="RESTRICT"), nullable=False),
+                                                  onupdate="CASCADE", ondelete="RESTRICT"), nullable=False, index=True),
         Column("departure_date", Date, nullable=False),
         Column("departure_time", Time, nullable=False),
         Column("departure_airport", String(10), nullable=False),
@@ -137,13 +1062,14 @@ def build_metadata() -> (MetaData, Dict[str, Table]):
     )
 
     # Таблица Tickets
+    # (flight_id уже ведет уникальные ограничения — отдельный индекс не нужен)
     tickets = Table(
         "tickets", md,
         Column("ticket_id", Integer, primary_key=True, autoincrement=True),
         Column("flight_id", Integer, ForeignKey("flights.flight_id",
                                                 onupdate="CASCADE", ondelete="CASCADE"), nullable=False),
         Column("passenger_id", Integer, ForeignKey("passengers.passenger_id",
-                                                   onupdate="CASCADE", ondelete="CASCADE"), nullable=False),
+                                                   onupdate="CASCADE", ondelete="CASCADE"), nullable=False, index=True),
         Column("seat_number", String(4), nullable=False),
         Column("has_baggage", Boolean, nullable=False, default=False),
         UniqueConstraint("flight_id", "seat_number", name="uq_tickets_flight_seat"),
@@ -166,7 +1092,7 @@ def build_metadata() -> (MetaData, Dict[str, Table]):
         Column("member_id", Integer, primary_key=True, autoincrement=True),
         Column("job_position", String(50), nullable=False),
         Column("crew_id", Integer, ForeignKey("crew.crew_id",
-                                              onupdate="CASCADE", ondelete="CASCADE"), nullable=False),
+                                              onupdate="CASCADE", ondelete="CASCADE"), nullable=False, index=True),
         CheckConstraint("char_length(job_position) >= 2", name="chk_crew_member_position")
     )
 
@@ -182,8 +1108,11 @@ def build_metadata() -> (MetaData, Dict[str, Table]):
 
 def drop_and_create_schema_sa(engine: Engine, md: MetaData) -> bool:
     try:
-        md.drop_all(engine)
-        md.create_all(engine)
+        # DDL ждет блокировки таблиц — без тайм-аута запроса (профиль bulk)
+        bulk = with_profile(engine, PROFILE_BULK)
+        md.drop_all(bulk)
+        md.create_all(bulk)
+        reflection_cache.invalidate(engine)
         return True
     except SQLAlchemyError as e:
         print("SA schema error:", e)
@@ -192,7 +1121,8 @@ def drop_and_create_schema_sa(engine: Engine, md: MetaData) -> bool:
 
 def insert_demo_data_sa(engine, t) -> bool:
     try:
-        with engine.begin() as conn:
+        # Массовая вставка: synchronous_commit=off, большая work_mem (профиль bulk)
+        with with_profile(engine, PROFILE_BULK).begin() as conn:
             # Данные для таблицы Aircraft
             conn.execute(t["aircraft"].insert(), [
                 {"model": "Boeing 737-800", "year": 2018, "seats_amount": 189, "baggage_capacity": 2500},
@@ -0,0 +1,155 @@
+# ===== Base =====
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+
+# ===== PySide6 =====
+from PySide6.QtCore import QObject, QSocketNotifier, Signal
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ===== Files =====
+from db.reflection import reflection_cache
+
+
+
+# -------------------------------
+# Лента изменений через LISTEN/NOTIFY
+# -------------------------------
+CHANGE_CHANNEL = "bdiz_changes"
+
+_NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION bdiz_notify_change() RETURNS trigger AS $$
+DECLARE
+    payload jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        payload := jsonb_build_object('pk', to_jsonb(OLD) -> TG_ARGV[0]);
+    ELSIF TG_OP = 'UPDATE' THEN
+        payload := jsonb_build_object('pk', to_jsonb(NEW) -> TG_ARGV[0],
+                                      'old_pk', to_jsonb(OLD) -> TG_ARGV[0]);
+    ELSE
+        payload := jsonb_build_object('pk', to_jsonb(NEW) -> TG_ARGV[0]);
+    END IF;
+    PERFORM pg_notify('{CHANGE_CHANNEL}',
+                      (payload || jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def install_change_triggers(engine: Engine, table_names: Iterable[str]) -> bool:
+    """Создает триггеры, отправляющие в CHANGE_CHANNEL ключи измененных строк"""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(_NOTIFY_FUNCTION_SQL))
+            for table_name in table_names:
+                pk_columns = reflection_cache.get(engine, table_name).pk_columns
+                if not pk_columns:
+                    continue
+                trigger = f"bdiz_notify_{table_name}"
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table_name}"))
+                conn.execute(text(
+                    f"CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE ON {table_name} "
+                    f"FOR EACH ROW EXECUTE FUNCTION bdiz_notify_change('{pk_columns[0]}')"
+                ))
+        return True
+    except SQLAlchemyError as e:
+        print("NOTIFY triggers error:", e)
+        return False
+
+
+class ChangeListener(QObject):
+    """Слушает CHANGE_CHANNEL на отдельном соединении.
+
+    Соединение не возвращается в пул; его сокет отслеживается
+    QSocketNotifier, поэтому уведомления разбираются в цикле событий Qt
+    без опроса. Все ключи, пришедшие за одно чтение, группируются по
+    таблицам и отдаются сигналом changed(table, {pk, ...}).
+    """
+
+    changed = Signal(str, object)
+
+    def __init__(self, engine: Engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self._raw = None
+        self._conn = None
+        self._notifier: Optional[QSocketNotifier] = None
+
+    def start(self) -> bool:
+        driver = self.engine.dialect.driver
+        if driver not in ("psycopg2", "psycopg"):
+            print(f"LISTEN/NOTIFY не поддерживается драйвером {driver}")
+            return False
+        try:
+            self._raw = self.engine.raw_connection()
+            # Отсоединяем от пула: соединение живет столько же, сколько слушатель
+            self._raw.detach()
+            self._conn = self._raw.driver_connection
+            self._conn.autocommit = True
+            cursor = self._conn.cursor()
+            cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+            cursor.close()
+        except Exception as e:
+            print(f"Ошибка запуска LISTEN: {e}")
+            self.stop()
+            return False
+
+        self._notifier = QSocketNotifier(self._conn.fileno(), QSocketNotifier.Type.Read, self)
+        self._notifier.activated.connect(self._on_readable)
+        return True
+
+    def stop(self):
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+            self._notifier.deleteLater()
+            self._notifier = None
+        if self._raw is not None:
+            try:
+                self._raw.close()
+            except Exception:
+                pass
+        self._raw = None
+        self._conn = None
+
+    def _read_payloads(self):
+        if self.engine.dialect.driver == "psycopg2":
+            self._conn.poll()
+            while self._conn.notifies:
+                yield self._conn.notifies.pop(0).payload
+        else:
+            pgconn = self._conn.pgconn
+            pgconn.consume_input()
+            while True:
+                n = pgconn.notifies()
+                if n is None:
+                    break
+                yield n.extra.decode()
+
+    def _on_readable(self):
+        changes: Dict[str, Set] = defaultdict(set)
+        try:
+            for payload in self._read_payloads():
+                try:
+                    event = json.loads(payload)
+                except ValueError:
+                    continue
+                table = event.get("table")
+                for key in ("pk", "old_pk"):
+                    if event.get(key) is not None:
+                        changes[table].add(event[key])
+        except Exception as e:
+            print(f"Соединение LISTEN потеряно: {e}")
+            self.stop()
+            return
+
+        for table, pks in changes.items():
+            self.changed.emit(table, pks)
@@ -0,0 +1,218 @@
+# ===== Base =====
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# ===== Files =====
+from db.config import PgConfig
+from db.history import percentile
+
+
+
+# -------------------------------
+# Параметры пула соединений
+# -------------------------------
+# Когда проверять соединение перед выдачей из пула
+PRE_PING_ALWAYS = "always"  # при каждой выдаче (pool_pre_ping) — лишний запрос на каждый checkout
+PRE_PING_IDLE = "idle"      # только после простоя дольше PING_IDLE_SECONDS
+PRE_PING_NEVER = "never"    # разорванное соединение обнаружит сам запрос
+
+PING_IDLE_SECONDS = 30
+
+# Сколько последних ожиданий соединения хранится для p95
+_WAIT_SAMPLES = 500
+
+
+def pool_options(cfg: PgConfig) -> Dict[str, Any]:
+    """Аргументы create_engine для пула из PgConfig"""
+    return {
+        "poolclass": MeteredQueuePool,
+        "pool_size": cfg.pool_size,
+        "max_overflow": cfg.max_overflow,
+        # -1 — соединения не пересоздаются по возрасту
+        "pool_recycle": cfg.pool_recycle or -1,
+        "pool_timeout": cfg.pool_timeout,
+        "pool_pre_ping": cfg.pre_ping == PRE_PING_ALWAYS,
+    }
+
+
+# -------------------------------
+# Метрики пула
+# -------------------------------
+@dataclass
+class PoolStats:
+    """Снимок состояния пула и счетчики с момента подключения"""
+    size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    peak_checked_out: int
+    checkouts: int
+    connects: int
+    invalidated: int
+    pings: int
+    timeouts: int
+    wait_avg_ms: Optional[float]
+    wait_p95_ms: Optional[float]
+    wait_max_ms: Optional[float]
+
+
+class PoolMetrics:
+    """Счетчики событий пула; пишутся из потоков db_thread_pool()"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.pings = 0
+        self.timeouts = 0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._wait_total = 0.0
+        self._wait_count = 0
+
+    def record_wait(self, ms: float):
+        with self._lock:
+            self._waits.append(ms)
+            self._wait_total += ms
+            self._wait_count += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def checkin(self):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self, pool: QueuePool) -> PoolStats:
+        with self._lock:
+            waits = sorted(self._waits)
+            return PoolStats(
+                size=pool.size(),
+                max_overflow=pool._max_overflow,
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                peak_checked_out=self.peak_checked_out,
+                checkouts=self.checkouts,
+                connects=self.connects,
+                invalidated=self.invalidated,
+                pings=self.pings,
+                timeouts=self.timeouts,
+                wait_avg_ms=self._wait_total / self._wait_count if self._wait_count else None,
+                wait_p95_ms=percentile(waits, 95),
+                wait_max_ms=waits[-1] if waits else None,
+            )
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool, замеряющий ожидание свободного соединения
+
+    Событие checkout приходит уже после выдачи соединения, поэтому время
+    ожидания (и создания нового соединения сверх pool_size) замеряется здесь.
+    """
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait((time.perf_counter() - started) * 1000)
+        return record
+
+    def recreate(self):
+        # engine.dispose() создает новый пул — счетчики переходят в него
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def watch_pool(engine: Engine, pre_ping: str = PRE_PING_ALWAYS) -> Optional[PoolMetrics]:
+    """Подписывает метрики на события пула engine; None — пул без очереди"""
+    if not isinstance(engine.pool, MeteredQueuePool):
+        return None
+    metrics = engine.pool.metrics = PoolMetrics()
+
+    # События на engine переходят и в пул, пересозданный dispose()
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        metrics.count("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        if pre_ping == PRE_PING_IDLE:
+            returned = record.info.get("bdiz_checkin")
+            if returned is not None and time.monotonic() - returned > PING_IDLE_SECONDS:
+                metrics.count("pings")
+                cursor = dbapi_conn.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                except Exception:
+                    # Пул закроет соединение и выдаст новое
+                    raise DisconnectionError()
+                finally:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        pass
+        metrics.checkout()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        record.info["bdiz_checkin"] = time.monotonic()
+        metrics.checkin()
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_conn, record, exception):
+        metrics.count("invalidated")
+
+    return metrics
+
+
+def pool_stats(engine: Engine) -> Optional[PoolStats]:
+    pool = engine.pool
+    if not isinstance(pool, MeteredQueuePool) or pool.metrics is None:
+        return None
+    return pool.metrics.stats(pool)
+
+
+def warm_pool(engine: Engine, count: int) -> int:
+    """Открывает count соединений заранее, чтобы первые запросы вкладок не ждали
+    установки соединения; возвращает число соединений в пуле"""
+    conns = []
+    try:
+        for _ in range(count):
+            conns.append(engine.connect())
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
@@ -0,0 +1,124 @@
+# ===== Base =====
+import weakref
+from typing import Dict, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ===== Files =====
+from db.config import PgConfig, SessionProfile
+
+
+
+# -------------------------------
+# Профили параметров сеанса
+# -------------------------------
+# Опция выполнения: профиль соединения (имя из PgConfig.profiles), например
+# engine.execution_options(session_profile="bulk").begin() или QueryGuard(engine, profile=...)
+PROFILE_OPTION = "session_profile"
+
+# Профили engine и его профиль по умолчанию
+_engines: "weakref.WeakKeyDictionary[Engine, Tuple[Dict[str, SessionProfile], str]]" = weakref.WeakKeyDictionary()
+
+
+def profile_settings(profile: SessionProfile) -> Dict[str, str]:
+    """Параметры сервера профиля; не заданные в профиле не меняются"""
+    settings = {}
+    for name, seconds in (("statement_timeout", profile.statement_timeout),
+                          ("lock_timeout", profile.lock_timeout),
+                          ("idle_in_transaction_session_timeout", profile.idle_in_transaction_timeout)):
+        if seconds is not None:
+            settings[name] = str(seconds * 1000)
+    if profile.work_mem:
+        settings["work_mem"] = profile.work_mem
+    if profile.synchronous_commit:
+        settings["synchronous_commit"] = profile.synchronous_commit
+    if profile.jit is not None:
+        settings["jit"] = "on" if profile.jit else "off"
+    return settings
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _apply(dbapi_conn, settings: Dict[str, str], local: bool, reset: bool = False):
+    # Один запрос на все параметры; значения — литералы: у драйверов разный paramstyle
+    is_local = "true" if local else "false"
+    cursor = dbapi_conn.cursor()
+    try:
+        if reset:
+            cursor.execute("RESET ALL")
+        if settings:
+            cursor.execute("SELECT " + ", ".join(
+                f"set_config({_literal(name)}, {_literal(value)}, {is_local})"
+                for name, value in settings.items()
+            ))
+    finally:
+        cursor.close()
+
+
+def session_profile(engine: Engine, name: Optional[str] = None) -> Optional[SessionProfile]:
+    """Профиль name (None — по умолчанию) engine; None — engine без профилей"""
+    watched = _engines.get(engine)
+    if watched is None:
+        return None
+    profiles, default = watched
+    if name is None:
+        name = default
+    if name not in profiles:
+        raise KeyError(f"Неизвестный профиль сеанса: {name}")
+    return profiles[name]
+
+
+def with_profile(engine: Engine, name: str) -> Engine:
+    """engine, соединения которого работают с профилем name"""
+    return engine.execution_options(**{PROFILE_OPTION: name})
+
+
+def watch_profiles(engine: Engine, cfg: PgConfig):
+    """Применяет профили cfg к соединениям engine.
+
+    Профиль по умолчанию (cfg.profile) задается на уровне сеанса при
+    выдаче соединения из пула — один раз на соединение, пока оно живет;
+    его statement_timeout задает QueryGuard в своих транзакциях, а у
+    сеанса остается тайм-аут сервера. Другой профиль (опция PROFILE_OPTION)
+    задается в начале транзакции через set_config(..., true) и действует
+    до ее конца: соединение возвращается в пул с профилем по умолчанию.
+    В AUTOCOMMIT (CREATE INDEX CONCURRENTLY) транзакция — одна команда,
+    поэтому профиль задается сеансу, а при следующей выдаче из пула
+    параметры сбрасываются (RESET ALL). Кроме PostgreSQL — ничего.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    # Ошибка в имени профиля по умолчанию — при создании engine, а не при первом запросе
+    defaults = profile_settings(cfg.profiles[cfg.profile])
+    defaults.pop("statement_timeout", None)
+    _engines[engine] = (cfg.profiles, cfg.profile)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        applied = record.info.get("bdiz_profile")
+        if applied == cfg.profile:
+            return
+        # Профиль, оставшийся от AUTOCOMMIT, снимается целиком
+        _apply(dbapi_conn, defaults, local=False, reset=applied is not None)
+        # Фиксация: откат при возврате в пул отменил бы и SET
+        dbapi_conn.commit()
+        record.info["bdiz_profile"] = cfg.profile
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        options = conn.get_execution_options()
+        name = options.get(PROFILE_OPTION)
+        if name is None or name == cfg.profile:
+            return
+        settings = profile_settings(session_profile(engine, name))
+        if options.get("isolation_level") == "AUTOCOMMIT":
+            _apply(conn.connection.dbapi_connection, settings, local=False)
+            conn.connection.info["bdiz_profile"] = name
+        else:
+            _apply(conn.connection.dbapi_connection, settings, local=True)
@@ -0,0 +1,223 @@
+# ===== Base =====
+import re
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import MetaData, Table, event, inspect, text
+from sqlalchemy.engine import Engine
+
+
+# ===== Files =====
+from db.aio import route
+
+
+
+# -------------------------------
+# Кэш отражения схемы
+# -------------------------------
+@dataclass
+class TableInfo:
+    columns: List[str] = field(default_factory=list)
+    pk_columns: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ColumnMeta:
+    name: str
+    type: str
+    nullable: bool = True
+    primary_key: bool = False
+    # (таблица, столбец), на которые ссылается внешний ключ
+    foreign: Optional[Tuple[str, str]] = None
+
+
+@dataclass
+class CatalogSnapshot:
+    """Столбцы, типы и внешние ключи всех таблиц схемы на момент чтения"""
+    tables: Dict[str, List[ColumnMeta]] = field(default_factory=dict)
+
+    def columns(self, table_name: str) -> List[str]:
+        return [col.name for col in self.tables.get(table_name, [])]
+
+    def foreign_keys(self, table_name: str) -> List[Tuple[str, str, str]]:
+        """(столбец, таблица, столбец таблицы) внешних ключей table_name"""
+        return [(col.name, *col.foreign) for col in self.tables.get(table_name, []) if col.foreign]
+
+
+# Весь каталог текущей схемы одним запросом: таблицы и представления,
+# столбцы в порядке создания, PK и первая ссылка внешнего ключа столбца
+_CATALOG_SQL = text("""
+SELECT c.relname AS table_name,
+       a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS data_type,
+       NOT a.attnotnull AS nullable,
+       EXISTS (SELECT 1 FROM pg_constraint p
+               WHERE p.conrelid = c.oid AND p.contype = 'p' AND a.attnum = ANY (p.conkey)) AS primary_key,
+       fk.ref_table,
+       fk.ref_column
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+LEFT JOIN LATERAL (
+    SELECT rc.relname AS ref_table, ra.attname AS ref_column
+    FROM pg_constraint con
+    JOIN pg_class rc ON rc.oid = con.confrelid
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(col, ref)
+    JOIN pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.ref
+    WHERE con.conrelid = c.oid AND con.contype = 'f' AND k.col = a.attnum
+    LIMIT 1
+) fk ON true
+WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p', 'v', 'm')
+ORDER BY c.relname, a.attnum
+""")
+
+
+def _read_catalog(engine: Engine) -> CatalogSnapshot:
+    snapshot = CatalogSnapshot()
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            for row in conn.execute(_CATALOG_SQL):
+                foreign = (row.ref_table, row.ref_column) if row.ref_table else None
+                snapshot.tables.setdefault(row.table_name, []).append(
+                    ColumnMeta(row.column_name, row.data_type, row.nullable, row.primary_key, foreign)
+                )
+        return snapshot
+
+    # Остальные СУБД — через инспектор, по запросу на таблицу
+    inspector = inspect(engine)
+    for table_name in inspector.get_table_names():
+        pk = set(inspector.get_pk_constraint(table_name)['constrained_columns'] or [])
+        foreign = {}
+        for fk in inspector.get_foreign_keys(table_name):
+            for col, ref in zip(fk['constrained_columns'], fk['referred_columns']):
+                foreign.setdefault(col, (fk['referred_table'], ref))
+        snapshot.tables[table_name] = [
+            ColumnMeta(col['name'], str(col['type']), col['nullable'], col['name'] in pk, foreign.get(col['name']))
+            for col in inspector.get_columns(table_name)
+        ]
+    return snapshot
+
+
+class ReflectionCache:
+    """Общий для всех вкладок кэш столбцов и первичных ключей таблиц.
+
+    Каталог БД читается только при первом обращении к таблице и после
+    invalidate(), который вызывают DDL-операции приложения (а также
+    watch_ddl для DDL, выполненного через engine). catalog() — снимок
+    всей схемы для диалогов фильтрации, table() — отраженная Table для
+    вкладок (ее можно прочитать заранее в фоне, см. prefetch).
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], TableInfo] = {}
+        self._tables: Dict[Tuple[str, str], Table] = {}
+        self._catalogs: Dict[str, CatalogSnapshot] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _engine_key(engine: Engine) -> str:
+        return str(engine.url)
+
+    def get(self, engine: Engine, table_name: str) -> TableInfo:
+        key = (self._engine_key(engine), table_name)
+        with self._lock:
+            info = self._entries.get(key)
+        if info is not None:
+            return info
+
+        inspector = inspect(route(engine))
+        info = TableInfo(
+            columns=[col['name'] for col in inspector.get_columns(table_name)],
+            pk_columns=inspector.get_pk_constraint(table_name)['constrained_columns'],
+        )
+        with self._lock:
+            self._entries[key] = info
+        return info
+
+    def table(self, engine: Engine, table_name: str) -> Table:
+        """Table, отраженная из БД (autoload) в собственные MetaData"""
+        key = (self._engine_key(engine), table_name)
+        with self._lock:
+            table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        table = Table(table_name, MetaData(), autoload_with=route(engine))
+        with self._lock:
+            self._tables[key] = table
+        return table
+
+    def catalog(self, engine: Engine) -> CatalogSnapshot:
+        """Снимок каталога; читается одним запросом и общий для всех диалогов"""
+        key = self._engine_key(engine)
+        with self._lock:
+            snapshot = self._catalogs.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = _read_catalog(route(engine))
+        with self._lock:
+            self._catalogs[key] = snapshot
+        return snapshot
+
+    def invalidate(self, engine: Optional[Engine] = None, table_name: Optional[str] = None):
+        """Сбрасывает кэш таблицы, всех таблиц engine или весь кэш
+
+        Снимок каталога engine сбрасывается целиком в любом случае.
+        """
+        with self._lock:
+            if engine is None:
+                self._entries.clear()
+                self._tables.clear()
+                self._catalogs.clear()
+                return
+            engine_key = self._engine_key(engine)
+            self._catalogs.pop(engine_key, None)
+            for entries in (self._entries, self._tables):
+                for key in list(entries):
+                    if key[0] == engine_key and (table_name is None or key[1] == table_name):
+                        del entries[key]
+
+
+reflection_cache = ReflectionCache()
+
+
+def prefetch(engine: Engine, table_name: str) -> Table:
+    """Читает в кэш все, что нужно вкладке таблицы; выполняется в потоке пула"""
+    reflection_cache.get(engine, table_name)
+    return reflection_cache.table(engine, table_name)
+
+
+# DDL, меняющий состав таблиц или столбцов
+_DDL = re.compile(
+    r"^\s*(?:CREATE|ALTER|DROP)\s+(?:(?:GLOBAL\s+|LOCAL\s+)?(?:TEMP|TEMPORARY|UNLOGGED)\s+)?"
+    r"(?:TABLE|VIEW|MATERIALIZED\s+VIEW)\b"
+    r"(?:\s+IF\s+(?:NOT\s+)?EXISTS)?\s+(?:ONLY\s+)?\"?(\w+)\"?",
+    re.IGNORECASE,
+)
+
+_watched_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def ddl_table(statement: str) -> Optional[str]:
+    """Таблица, структуру которой меняет statement; None — не DDL таблиц"""
+    match = _DDL.match(statement)
+    return match.group(1) if match else None
+
+
+def watch_ddl(engine: Engine):
+    """Сбрасывает reflection_cache таблицы после DDL, выполненного через engine"""
+    if engine in _watched_engines:
+        return
+    _watched_engines.add(engine)
+
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        table_name = ddl_table(statement)
+        if table_name is not None:
+            reflection_cache.invalidate(engine, table_name)
+
+    event.listen(engine, "after_cursor_execute", _after_execute)
@@ -0,0 +1,274 @@
+# ===== Base =====
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Set
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Table, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.util import find_tables
+
+
+# ===== Files =====
+from db.storage import ColumnStore
+
+
+
+# -------------------------------
+# Кэш результатов запросов фильтрации
+# -------------------------------
+# Запрос, таблицы которого не удалось определить, зависит от всех таблиц
+ANY_TABLE = "*"
+
+_READ_STATEMENT = re.compile(r"^\s*(SELECT|VALUES|TABLE|SHOW|EXPLAIN)\b", re.IGNORECASE)
+_SERVICE_STATEMENT = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|SET|RESET|LISTEN|UNLISTEN)\b",
+                                re.IGNORECASE)
+_NAME = r'(?:"?\w+"?\.)?"?(\w+)"?'
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT\s+INTO|UPDATE(?:\s+ONLY)?|DELETE\s+FROM(?:\s+ONLY)?|TRUNCATE(?:\s+TABLE)?(?:\s+ONLY)?"
+    r"|(?:ALTER|DROP|CREATE)\s+(?:TABLE|MATERIALIZED\s+VIEW)(?:\s+IF(?:\s+NOT)?\s+EXISTS)?(?:\s+ONLY)?"
+    r"|REFRESH\s+MATERIALIZED\s+VIEW(?:\s+CONCURRENTLY)?|COMMENT\s+ON\s+(?:TABLE|MATERIALIZED\s+VIEW)"
+    r"|(?:CREATE(?:\s+UNIQUE)?\s+INDEX.*?\s+ON(?:\s+ONLY)?))\s+" + _NAME,
+    re.IGNORECASE | re.DOTALL
+)
+_WORD = re.compile(r"\w+")
+_SPACES = re.compile(r"\s+")
+# Строковые литералы и имена в кавычках: пробелы внутри них значимы
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+# Разметка, при которой границы литералов регулярным выражением не найти:
+# $$-строки, E'...' с \', комментарии
+_UNSAFE_QUOTING = re.compile(r"[$\\]|--|/\*")
+
+
+def _is_read(sql: str) -> bool:
+    return bool(_READ_STATEMENT.match(sql))
+
+
+def written_table(sql: str) -> Optional[str]:
+    """Таблица, которую меняет оператор; ANY_TABLE — изменение неизвестно чего, None — чтение"""
+    if _is_read(sql) or _SERVICE_STATEMENT.match(sql):
+        return None
+    m = _WRITE_TARGET.match(sql)
+    return m.group(1).lower() if m else ANY_TABLE
+
+
+def _normalize_sql(sql: str) -> str:
+    """Текст запроса без лишних пробелов вне литералов и имен в кавычках
+
+    Если границы литералов определить нельзя, текст не меняется: запросы,
+    отличающиеся только пробелами, получат разные ключи, но не одинаковые.
+    """
+    if _UNSAFE_QUOTING.search(sql):
+        return sql
+    parts = []
+    pos = 0
+    for m in _QUOTED.finditer(sql):
+        parts.append(_SPACES.sub(" ", sql[pos:m.start()]))
+        parts.append(m.group())
+        pos = m.end()
+    parts.append(_SPACES.sub(" ", sql[pos:]))
+    return "".join(parts).strip()
+
+
+def _estimate_size(value: Any) -> int:
+    """Приблизительный объем результата в байтах (строки, списки, ColumnStore)"""
+    if isinstance(value, ColumnStore):
+        return value.nbytes()
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+@dataclass
+class _Entry:
+    value: Any
+    tables: FrozenSet[str]
+    size: int
+    expires: float
+
+
+class ResultCache:
+    """LRU-кэш результатов SELECT с ограничением по объему и времени жизни.
+
+    Ключ — текст скомпилированного запроса и его параметры, поэтому
+    повтор того же фильтра не доходит до сервера. Записи сбрасываются,
+    когда приложение меняет таблицу, которую читает запрос (см. watch_writes),
+    и по уведомлениям об изменениях от других клиентов.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._size = 0
+        # Растет при каждом сбросе: результат, прочитанный до сброса, не сохраняется
+        self._version = 0
+        self._lock = threading.Lock()
+
+    # ----- Ключ и зависимости запроса -----
+    @staticmethod
+    def _engine_key(engine: Engine) -> str:
+        return str(engine.url)
+
+    def key(self, engine: Engine, stmt) -> Optional[Hashable]:
+        """Ключ запроса или None, если его результат кэшировать нельзя"""
+        if isinstance(stmt, str) or isinstance(stmt, TextClause):
+            sql = _normalize_sql(str(stmt))
+            if not _is_read(sql):
+                return None
+            if isinstance(stmt, str):
+                return self._engine_key(engine), sql, ()
+            # У text() могут быть параметры (bindparams)
+            params = self._params(stmt.compile(dialect=engine.dialect))
+            return None if params is None else (self._engine_key(engine), sql, params)
+
+        compiled = stmt.compile(dialect=engine.dialect)
+        params = self._params(compiled)
+        return None if params is None else (self._engine_key(engine), str(compiled), params)
+
+    @staticmethod
+    def _params(compiled) -> Optional[tuple]:
+        """Параметры запроса для ключа; None — значение не хэшируется"""
+        params = []
+        for name, value in sorted(compiled.params.items()):
+            if isinstance(value, list):
+                value = tuple(value)
+            try:
+                hash(value)
+            except TypeError:
+                return None
+            params.append((name, value))
+        return tuple(params)
+
+    @staticmethod
+    def tables_of(stmt, known: Iterable[str]) -> FrozenSet[str]:
+        """Имена таблиц, которые читает запрос"""
+        if isinstance(stmt, str) or isinstance(stmt, TextClause):
+            words = {w.lower() for w in _WORD.findall(str(stmt))}
+            found = frozenset(name for name in known if name.lower() in words)
+            return found or frozenset([ANY_TABLE])
+        names = {t.name for t in find_tables(stmt, include_aliases=True, include_joins=True)
+                 if isinstance(t, Table)}
+        return frozenset(names) or frozenset([ANY_TABLE])
+
+    # ----- Чтение и запись -----
+    def version(self) -> int:
+        """Отметка, которую нужно взять до выполнения запроса и передать в put()"""
+        with self._lock:
+            return self._version
+
+    def get(self, key: Optional[Hashable]) -> Optional[Any]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: Optional[Hashable], value: Any, tables: FrozenSet[str], version: int):
+        if key is None or self.max_bytes <= 0:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Пока запрос выполнялся, данные могли измениться
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, tables, size, time.monotonic() + self.ttl)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+    def invalidate(self, engine: Optional[Engine] = None, tables: Optional[Iterable[str]] = None):
+        """Сбрасывает записи, читающие tables (все записи engine, если tables=None)"""
+        tables = None if tables is None else {name.lower() for name in tables}
+        with self._lock:
+            self._version += 1
+            engine_key = None if engine is None else self._engine_key(engine)
+            for key in list(self._entries):
+                if engine_key is not None and key[0] != engine_key:
+                    continue
+                entry_tables = self._entries[key].tables
+                if (tables is None or ANY_TABLE in tables or ANY_TABLE in entry_tables
+                        or not entry_tables.isdisjoint(tables)):
+                    self._drop(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size}
+
+
+result_cache = ResultCache()
+
+
+# -------------------------------
+# Сброс кэша при записи через Engine
+# -------------------------------
+def affected_tables(table_name: str, tables: Dict[str, Table]) -> Set[str]:
+    """Таблица и все, что ссылается на нее внешними ключами (каскадные изменения)"""
+    if table_name == ANY_TABLE:
+        return {ANY_TABLE}
+    affected = {table_name}
+    pending = [table_name]
+    while pending:
+        target = pending.pop()
+        for name, table in tables.items():
+            if name in affected:
+                continue
+            if any(fk.target_fullname.split(".")[-2] == target for fk in table.foreign_keys):
+                affected.add(name)
+                pending.append(name)
+    return affected
+
+
+_watched_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def watch_writes(engine: Engine, tables: Dict[str, Table], cache: ResultCache = result_cache):
+    """Подписывает кэш на INSERT/UPDATE/DELETE/DDL, выполняемые через engine
+
+    Записи сбрасываются сразу после оператора и еще раз при COMMIT: запрос
+    из другого соединения мог успеть прочитать и сохранить старые данные.
+    """
+    if engine in _watched_engines:
+        return
+    _watched_engines.add(engine)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        name = written_table(statement)
+        if name is None:
+            return
+        affected = affected_tables(name, tables)
+        conn.info.setdefault("result_cache_dirty", set()).update(affected)
+        cache.invalidate(engine, affected)
+
+    @event.listens_for(engine, "commit")
+    def _after_commit(conn):
+        dirty = conn.info.pop("result_cache_dirty", None)
+        if dirty:
+            cache.invalidate(engine, dirty)
+
+    @event.listens_for(engine, "rollback")
+    def _after_rollback(conn):
+        conn.info.pop("result_cache_dirty", None)
@@ -0,0 +1,264 @@
+# ===== Base =====
+import time
+from dataclasses import dataclass, field
+from typing import FrozenSet, Hashable, List, Optional
+
+
+# ===== PySide6 =====
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QLocale, Signal
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Column
+from sqlalchemy.engine import Connection, Engine, Result
+
+
+# ===== Files =====
+from db.aio import close_connection
+from db.config import PROFILE_REPORTING
+from db.execution import QueryGuard
+from db.models import SORT_ROLE, format_display
+from db.result_cache import ANY_TABLE, result_cache
+from db.storage import ColumnStore
+from db.workers import TaskRunner
+
+
+
+# -------------------------------
+# Потоковая модель результата произвольного запроса
+# -------------------------------
+@dataclass
+class _Stream:
+    """Открытый курсор и очередная порция строк; передается из потока пула в модель"""
+    conn: Connection
+    result: Result
+    rows: list
+    done: bool
+    columns: List[str] = field(default_factory=list)
+    # Типы SQLAlchemy для ColumnStore (None — хранить объектами)
+    types: Optional[list] = None
+
+    def close(self):
+        # Курсор, открытый в асинхронном режиме, закрывается на цикле asyncio
+        close_connection(self.conn, self.result)
+
+
+class SAResultModel(QAbstractTableModel):
+    """Результат SELECT (фильтрация, JOIN) только для чтения.
+
+    Запрос выполняется через серверный курсор на отдельном соединении
+    в режиме READ ONLY, порции читаются в пуле потоков и добавляются в
+    конец модели — представление заполняется по мере чтения. Строки
+    лежат в ColumnStore, подписи форматируются при показе.
+    progress сообщает число прочитанных строк, stop() прерывает чтение.
+    После окончания elapsed_ms — время выполнения (None для результата
+    из кэша), error — исключение запроса или None.
+    """
+
+    progress = Signal(int, bool)  # прочитано строк, чтение завершено
+    failed = Signal(object)       # исключение при выполнении запроса
+
+    # Ключ фоновой задачи чтения (см. TaskRunner)
+    _STREAM = "stream"
+
+    def __init__(self, engine: Engine, parent=None, fetch_size: int = 2000):
+        super().__init__(parent)
+        self.engine = engine
+        self.fetch_size = fetch_size
+        self.columns: List[str] = []
+        self._store = ColumnStore([])
+        self._stream: Optional[_Stream] = None
+        self._done = True
+        self._started = 0.0
+        self.elapsed_ms: Optional[float] = None
+        self.error: Optional[BaseException] = None
+
+        # Полностью прочитанный результат попадает в result_cache
+        self._cache_key: Optional[Hashable] = None
+        self._cache_tables: FrozenSet[str] = frozenset()
+        self._cache_version = 0
+
+        # Сортировка по заголовку применяется к прочитанным строкам
+        self._sort: Optional[tuple] = None
+
+        self._locale = QLocale()
+        # Фильтры и отчеты GROUP BY — дольше и с большей work_mem, чем таблицы вкладок
+        self.guard = QueryGuard(engine, profile=PROFILE_REPORTING)
+        self.runner = TaskRunner(self)
+
+    # ----- Выполнение -----
+    def execute(self, stmt, cache_key: Optional[Hashable] = None,
+                cache_tables: FrozenSet[str] = frozenset()):
+        """Запускает чтение stmt; cache_key — ключ result_cache (None — не кэшировать)"""
+        self.stop()
+        self._sort = None
+        self.elapsed_ms = None
+        self.error = None
+
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            columns, store = cached
+            self._reset(columns, store)
+            self.progress.emit(len(store), True)
+            return
+
+        self._reset([], ColumnStore([]))
+
+        self._cache_key = cache_key
+        self._cache_tables = cache_tables
+        self._cache_version = result_cache.version()
+        self._done = False
+        self._started = time.monotonic()
+        self.runner.submit(self._STREAM, self._open, stmt, cache_tables or frozenset([ANY_TABLE]),
+                           on_done=self._on_opened, on_error=self._on_failed,
+                           on_discard=lambda stream: stream.close(), loop_safe=True)
+
+    def _open(self, stmt, tables: FrozenSet[str]) -> _Stream:
+        # Поток пула: только БД, без обращения к Qt
+        conn = self.guard.connect(reads=tables, postgresql_readonly=True)
+        try:
+            result = conn.execution_options(stream_results=True, yield_per=self.fetch_size).execute(stmt)
+            rows = result.fetchmany(self.fetch_size)
+        except Exception:
+            conn.close()
+            raise
+        # Типы известны только для столбцов таблиц; выражения и текстовый SQL
+        # хранятся объектами — так в столбец не попадет значение чужого типа
+        selected = getattr(stmt, "selected_columns", None)
+        types = [c.type if isinstance(c, Column) else None for c in selected] \
+            if selected is not None and len(selected) == len(result.keys()) else None
+        return _Stream(conn, result, rows, len(rows) < self.fetch_size, list(result.keys()), types)
+
+    def _fetch(self, stream: _Stream) -> _Stream:
+        try:
+            stream.rows = stream.result.fetchmany(self.fetch_size)
+        except Exception:
+            # Ошибка отмененной задачи до модели не дойдет — курсор закрываем здесь
+            stream.close()
+            raise
+        stream.done = len(stream.rows) < self.fetch_size
+        return stream
+
+    def _on_opened(self, stream: _Stream):
+        self._reset(stream.columns, ColumnStore(stream.columns, stream.types))
+        self._on_fetched(stream)
+
+    def _on_fetched(self, stream: _Stream):
+        self._stream = stream
+        if stream.rows:
+            first = len(self._store)
+            self.beginInsertRows(QModelIndex(), first, first + len(stream.rows) - 1)
+            self._store.extend(stream.rows)
+            self.endInsertRows()
+        stream.rows = []
+
+        if stream.done:
+            self._finish()
+            return
+        self.progress.emit(len(self._store), False)
+        self.runner.submit(self._STREAM, self._fetch, stream,
+                           on_done=self._on_fetched, on_error=self._on_failed,
+                           on_discard=lambda stream: stream.close(), loop_safe=True)
+
+    def _on_failed(self, error):
+        self._stream = None
+        self._done = True
+        self._cache_key = None
+        self._elapsed()
+        self.error = error
+        self.progress.emit(len(self._store), True)
+        self.failed.emit(error)
+
+    def _elapsed(self):
+        self.elapsed_ms = (time.monotonic() - self._started) * 1000
+
+    def _finish(self):
+        self._close_stream()
+        self._done = True
+        self._elapsed()
+        result_cache.put(self._cache_key, (self.columns, self._store), self._cache_tables, self._cache_version)
+        self._cache_key = None
+        if self._sort is not None:
+            self.sort(*self._sort)
+        self.progress.emit(len(self._store), True)
+
+    def stop(self):
+        """Прерывает чтение; прочитанные строки остаются в модели"""
+        if self._done:
+            return
+        self._done = True
+        # Время прерванного запроса — оценка снизу, но для советов по индексам она важна
+        self._elapsed()
+        # Неполный результат не кэшируется
+        self._cache_key = None
+        # Пока чтение не завершено, в пуле всегда есть задача модели:
+        # выполняемый ею запрос прерывается на сервере, а курсор закроет
+        # on_discard, когда порция вернется
+        self.guard.cancel()
+        self.runner.cancel(self._STREAM)
+        self._stream = None
+        self.progress.emit(len(self._store), True)
+
+    def is_running(self) -> bool:
+        return not self._done
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self.stop()
+
+    def _reset(self, columns: List[str], store: ColumnStore):
+        self.beginResetModel()
+        self.columns = list(columns)
+        self._store = store
+        self.endResetModel()
+
+    # ----- Сортировка -----
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Сортирует прочитанные строки; во время чтения — после его окончания"""
+        self._sort = (column, order)
+        if not self._done or not 0 <= column < len(self.columns):
+            return
+
+        values = self._store.column_values(column)
+        try:
+            rows = sorted(range(len(values)), key=lambda i: (values[i] is None, values[i]))
+        except TypeError:
+            # Значения разных типов (текстовый SQL) — сравниваем как текст
+            rows = sorted(range(len(values)), key=lambda i: (values[i] is None, str(values[i])))
+        if order == Qt.DescendingOrder:
+            rows.reverse()
+
+        # Хранилище могло попасть в result_cache — сортируется копия
+        store = self._store.take(rows)
+        self.layoutAboutToBeChanged.emit()
+        self._store = store
+        self.layoutChanged.emit()
+
+    # ----- QAbstractTableModel -----
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._store)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole, SORT_ROLE):
+            return None
+        if role == Qt.DisplayRole:
+            return self._store.display(index.row(), index.column(), self._format_value)
+        return self._store.value(index.row(), index.column())
+
+    def _format_value(self, kind: str, value) -> str:
+        return format_display(self._locale, kind, value)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            # Заголовок с ResizeToContents спрашивает старые секции и после сброса модели
+            return self.columns[section] if 0 <= section < len(self.columns) else None
+        return section + 1
@@ -0,0 +1,105 @@
+# ===== Base =====
+from datetime import date, time
+from typing import Iterable, List, Optional
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import String, Table, false, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ===== Files =====
+from db.advisor import build_index
+from db.storage import column_kind
+
+
+
+# -------------------------------
+# Быстрый поиск по столбцам таблицы
+# -------------------------------
+# Числа длиннее не помещаются в bigint
+_MAX_INT_DIGITS = 18
+
+
+# Символ экранирования для LIKE; обратная косая черта не подходит — ее
+# запись в литерале зависит от standard_conforming_strings
+_LIKE_ESCAPE = "!"
+
+
+def _like_prefix(value: str) -> str:
+    for ch in (_LIKE_ESCAPE, "%", "_"):
+        value = value.replace(ch, _LIKE_ESCAPE + ch)
+    return value + "%"
+
+
+def search_clause(columns: Iterable, value: str):
+    """Условие WHERE для строки поиска; None — поиск не задан
+
+    Строковые столбцы сравниваются по префиксу без учета регистра
+    (ILIKE 'x%' — его обслуживает trigram-индекс), числовые — на
+    равенство, если введено число, даты и время — если введена дата
+    (ГГГГ-ММ-ДД) или время (ЧЧ:ММ). Значение передается параметром.
+    """
+    value = value.strip()
+    if not value:
+        return None
+
+    conditions = []
+    for col in columns:
+        kind = column_kind(col.type)
+        if kind == "int":
+            if value.isdigit() and len(value) <= _MAX_INT_DIGITS:
+                conditions.append(col == int(value))
+        elif kind == "date":
+            try:
+                conditions.append(col == date.fromisoformat(value))
+            except ValueError:
+                pass
+        elif kind == "time" and ":" in value:
+            try:
+                conditions.append(col == time.fromisoformat(value))
+            except ValueError:
+                pass
+        elif isinstance(col.type, String):
+            conditions.append(col.ilike(_like_prefix(value), escape=_LIKE_ESCAPE))
+
+    return or_(*conditions) if conditions else false()
+
+
+def create_search_indexes(engine: Engine, table: Table) -> Optional[List[str]]:
+    """Создает индексы под search_clause: trigram для строк, btree для чисел и дат
+
+    Индексы строятся CONCURRENTLY (db/advisor.build_index) — запись в
+    таблицу не блокируется; выполняется долго, поэтому — в пуле потоков.
+    Возвращает имена индексов или None при ошибке. Только PostgreSQL.
+    """
+    if engine.dialect.name != 'postgresql':
+        print("Индексы для поиска создаются только в PostgreSQL")
+        return None
+
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except SQLAlchemyError as e:
+        print("Search index error:", e)
+        return None
+
+    names = []
+    for col in table.columns:
+        # Первичный ключ уже проиндексирован
+        if col.primary_key:
+            continue
+        if isinstance(col.type, String):
+            name = f"ix_{table.name}_{col.name}_trgm"
+            sql = (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table.name} "
+                   f"USING gin ({col.name} gin_trgm_ops)")
+        elif column_kind(col.type) in ("int", "date", "time"):
+            name = f"ix_{table.name}_{col.name}"
+            sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table.name} ({col.name})"
+        else:
+            continue
+        if not build_index(engine, name, sql):
+            return None
+        names.append(name)
+    return names
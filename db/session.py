@@ -5,16 +5,43 @@ from sqlalchemy import (
 
 from sqlalchemy.engine import Engine
 from sqlalchemy.engine.url import URL
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 
 # ===== Files =====
 from db.config import PgConfig
+from db.pool import pool_options, watch_pool
+from db.profiles import watch_profiles
 
 
 
 # -------------------------------
 # Создание Engine и схемы
 # -------------------------------
+# Имя приложения в pg_stat_activity
+APP_NAME = "QtEduDemo"
+
+
+def _url(cfg: PgConfig, drivername: str, query: dict) -> URL:
+    return URL.create(
+        drivername=drivername,
+        username=cfg.user,
+        password=cfg.password,
+        host=cfg.host,
+        port=cfg.port,
+        database=cfg.dbname,
+        query=query,
+    )
+
+
+def _execution_options(cfg: PgConfig) -> dict:
+    # statement_timeout_ms читает QueryGuard (db/execution.py) — из профиля по умолчанию
+    timeout = cfg.profiles[cfg.profile].statement_timeout
+    if timeout is None:
+        return {}
+    return {"statement_timeout_ms": timeout * 1000}
+
+
 def make_engine(cfg: PgConfig) -> Engine:
     drivername_map = {
         "psycopg2": "postgresql+psycopg2",
@@ -26,24 +53,48 @@ def make_engine(cfg: PgConfig) -> Engine:
     if cfg.driver in ("psycopg2", "psycopg"):
         query = {
             "sslmode": cfg.sslmode,
-            "application_name": "QtEduDemo",
+            "application_name": APP_NAME,
             "connect_timeout": str(cfg.connect_timeout),
         }
     else:  # pg8000 — только app_name
-        query = {"application_name": "QtEduDemo"}
+        query = {"application_name": APP_NAME}
 
-    url = URL.create(
-        drivername=drivername,
-        username=cfg.user,
-        password=cfg.password,
-        host=cfg.host,
-        port=cfg.port,
-        database=cfg.dbname,
-        query=query,
-    )
+    url = _url(cfg, drivername, query)
 
-    engine = create_engine(url, future=True, pool_pre_ping=True)
+    engine = create_engine(url, future=True, **pool_options(cfg), execution_options=_execution_options(cfg))
+    watch_pool(engine, cfg.pre_ping)
+    # Параметры сеанса профиля по умолчанию применяются уже к проверочному запросу
+    watch_profiles(engine, cfg)
     # sanity ping
     with engine.connect() as conn:
         conn.exec_driver_sql("SELECT 1")
-    return engine
\ No newline at end of file
+    return engine
+
+
+def make_async_engine(cfg: PgConfig) -> AsyncEngine:
+    """AsyncEngine для cfg.async_driver (asyncpg | psycopg); соединение не открывается
+
+    Пул — тех же размеров, что у синхронного engine (AsyncAdaptedQueuePool,
+    без метрик db/pool.py); проверка перед выдачей — только «always».
+    """
+    if cfg.async_driver == "asyncpg":
+        url = _url(cfg, "postgresql+asyncpg", {})
+        connect_args = {
+            "ssl": cfg.sslmode,
+            "timeout": cfg.connect_timeout,
+            "server_settings": {"application_name": APP_NAME},
+        }
+    else:  # psycopg (v3) в асинхронном режиме
+        url = _url(cfg, "postgresql+psycopg", {
+            "sslmode": cfg.sslmode,
+            "application_name": APP_NAME,
+            "connect_timeout": str(cfg.connect_timeout),
+        })
+        connect_args = {}
+
+    options = pool_options(cfg)
+    options.pop("poolclass")
+    async_engine = create_async_engine(url, connect_args=connect_args, **options,
+                                       execution_options=_execution_options(cfg))
+    watch_profiles(async_engine.sync_engine, cfg)
+    return async_engine
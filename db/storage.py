@@ -0,0 +1,222 @@
+# ===== Base =====
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import date, time
+from typing import Callable, List, Sequence, Any, Optional, Tuple
+
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Integer, Boolean, Float, Date, Time
+from sqlalchemy.types import TypeEngine
+
+
+
+# -------------------------------
+# Поколоночное хранилище строк
+# -------------------------------
+def _time_to_int(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def _int_to_time(v: int) -> time:
+    v, us = divmod(v, 1_000_000)
+    v, s = divmod(v, 60)
+    h, m = divmod(v, 60)
+    return time(h, m, s, us)
+
+
+# Вид столбца -> (typecode массива, упаковка, распаковка)
+_KINDS = {
+    "int": ("q", int, int),
+    "bool": ("b", int, bool),
+    "float": ("d", float, float),
+    "date": ("l", date.toordinal, date.fromordinal),
+    "time": ("q", _time_to_int, _int_to_time),
+}
+
+# Короткие строки (коды аэропортов, номера мест, должности) сильно
+# повторяются — интернируем их, чтобы хранить одну копию
+_INTERN_MAX_LEN = 32
+
+
+def column_kind(sa_type: Optional[TypeEngine]) -> str:
+    """Определяет способ хранения столбца по его типу SQLAlchemy"""
+    if isinstance(sa_type, Boolean):
+        return "bool"
+    if isinstance(sa_type, Integer):
+        return "int"
+    if isinstance(sa_type, Float):
+        return "float"
+    if isinstance(sa_type, Date):
+        return "date"
+    if isinstance(sa_type, Time) and not getattr(sa_type, "timezone", False):
+        return "time"
+    return "obj"
+
+
+class ColumnStore:
+    """Строки таблицы в виде столбцов.
+
+    Числа, логические значения, даты и время лежат в array.array,
+    NULL для них отмечается в маске (байт на строку). Остальные типы
+    хранятся списком объектов, где NULL — это просто None.
+
+    Строки для отображения (display) форматируются при первом обращении
+    и кэшируются по ячейкам; кэш столбца заводится, только когда столбец
+    впервые показан.
+    """
+
+    def __init__(self, columns: List[str], types: Optional[List[Optional[TypeEngine]]] = None):
+        self.columns = list(columns)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        types = types or [None] * len(self.columns)
+        self._kinds = [column_kind(t) for t in types]
+        self.clear()
+
+    def clear(self):
+        self._data: List[Any] = []
+        self._nulls: List[Optional[bytearray]] = []
+        for kind in self._kinds:
+            if kind in _KINDS:
+                self._data.append(array(_KINDS[kind][0]))
+                self._nulls.append(bytearray())
+            else:
+                self._data.append([])
+                self._nulls.append(None)
+        self._display: List[Optional[List[Optional[str]]]] = [None] * len(self.columns)
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def column_index(self, name: str) -> Optional[int]:
+        return self._index.get(name)
+
+    def _pack(self, rows: Sequence[Sequence[Any]]) -> List[Tuple[Any, Optional[bytearray]]]:
+        """Раскладывает кортежи строк по столбцам в формате хранилища"""
+        packed = []
+        for ci, kind in enumerate(self._kinds):
+            values = [r[ci] for r in rows]
+            if kind in _KINDS:
+                typecode, pack, _ = _KINDS[kind]
+                nulls = bytearray(v is None for v in values)
+                data = array(typecode, (0 if v is None else pack(v) for v in values))
+            else:
+                nulls = None
+                data = [sys.intern(v) if type(v) is str and len(v) <= _INTERN_MAX_LEN else v
+                        for v in values]
+            packed.append((data, nulls))
+        return packed
+
+    def extend(self, rows: Sequence[Sequence[Any]]):
+        """Добавляет строки (кортежи в порядке columns) в конец хранилища"""
+        self.insert(self._len, rows)
+
+    def insert(self, pos: int, rows: Sequence[Sequence[Any]]):
+        """Вставляет строки перед строкой pos"""
+        if not rows:
+            return
+        for ci, (data, nulls) in enumerate(self._pack(rows)):
+            self._data[ci][pos:pos] = data
+            if nulls is not None:
+                self._nulls[ci][pos:pos] = nulls
+        for cache in self._display:
+            if cache is not None:
+                cache[pos:pos] = [None] * len(rows)
+        self._len += len(rows)
+
+    def delete(self, start: int, stop: int):
+        """Удаляет строки с start по stop (не включая)"""
+        for ci in range(len(self.columns)):
+            del self._data[ci][start:stop]
+            if self._nulls[ci] is not None:
+                del self._nulls[ci][start:stop]
+            if self._display[ci] is not None:
+                del self._display[ci][start:stop]
+        self._len -= stop - start
+
+    def changed_rows(self, other: "ColumnStore") -> List[int]:
+        """Номера строк, отличающихся от other (хранилища той же длины и структуры)"""
+        changed = set()
+        for ci in range(len(self.columns)):
+            mine, theirs = self._data[ci], other._data[ci]
+            # Сравнение массивов целиком выполняется на C — неизмененные
+            # столбцы отсеиваются без цикла по строкам
+            if mine == theirs and self._nulls[ci] == other._nulls[ci]:
+                continue
+            for i in range(self._len):
+                if i not in changed and self.value(i, ci) != other.value(i, ci):
+                    changed.add(i)
+        return sorted(changed)
+
+    def value(self, row: int, column) -> Any:
+        """Значение ячейки; column — имя или номер столбца"""
+        ci = self._index.get(column) if isinstance(column, str) else column
+        if ci is None:
+            return None
+        kind = self._kinds[ci]
+        if kind in _KINDS:
+            if self._nulls[ci][row]:
+                return None
+            return _KINDS[kind][2](self._data[ci][row])
+        return self._data[ci][row]
+
+    def display(self, row: int, column, format_value: Callable[[str, Any], str]) -> str:
+        """Текст ячейки; format_value(вид столбца, значение) вызывается один раз на ячейку"""
+        ci = self._index.get(column) if isinstance(column, str) else column
+        if ci is None:
+            return ""
+        cache = self._display[ci]
+        if cache is None:
+            cache = self._display[ci] = [None] * self._len
+        text = cache[row]
+        if text is None:
+            value = self.value(row, ci)
+            # Подписи сильно повторяются (даты, «Да»/«Нет») — храним одну копию
+            text = "" if value is None else sys.intern(format_value(self._kinds[ci], value))
+            cache[row] = text
+        return text
+
+    def find_sorted(self, column, value) -> Tuple[int, bool]:
+        """Позиция value в столбце, упорядоченном по возрастанию без NULL
+
+        Возвращает (позиция вставки, найдено ли значение). Поиск идет
+        двоичным делением прямо по упакованному массиву.
+        """
+        ci = self._index.get(column) if isinstance(column, str) else column
+        kind = self._kinds[ci]
+        key = _KINDS[kind][1](value) if kind in _KINDS else value
+        data = self._data[ci]
+        pos = bisect_left(data, key)
+        return pos, pos < self._len and data[pos] == key
+
+    def column_values(self, column) -> list:
+        """Все значения столбца в виде списка"""
+        return [self.value(i, column) for i in range(self._len)]
+
+    def take(self, rows: Sequence[int]) -> "ColumnStore":
+        """Новое хранилище из строк rows в указанном порядке (кэш подписей не переносится)"""
+        other = ColumnStore(self.columns)
+        other._kinds = list(self._kinds)
+        other.clear()
+        for ci, (data, nulls) in enumerate(zip(self._data, self._nulls)):
+            picked = [data[i] for i in rows]
+            other._data[ci] = array(data.typecode, picked) if isinstance(data, array) else picked
+            if nulls is not None:
+                other._nulls[ci] = bytearray(nulls[i] for i in rows)
+        other._len = len(rows)
+        return other
+
+    def nbytes(self) -> int:
+        """Приблизительный объем данных в байтах (без кэша подписей)"""
+        total = 0
+        for data, nulls in zip(self._data, self._nulls):
+            if isinstance(data, array):
+                total += data.itemsize * len(data) + len(nulls)
+            else:
+                total += sys.getsizeof(data) + sum(sys.getsizeof(v) for v in data)
+        return total
+
+    def row(self, row: int) -> tuple:
+        return tuple(self.value(row, ci) for ci in range(len(self.columns)))
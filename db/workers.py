@@ -0,0 +1,158 @@
+# ===== Base =====
+from typing import Any, Callable, Dict, Optional, Set
+
+
+# ===== PySide6 =====
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+
+# ===== Files =====
+from db.aio import async_bridge
+
+
+
+# -------------------------------
+# Фоновое выполнение запросов
+# -------------------------------
+# Потоков меньше, чем соединений в пуле SQLAlchemy (PgConfig.pool_size):
+# задачи не ждут свободного соединения, а глобальный пул Qt остается свободным
+DB_THREADS = 4
+
+_db_pool: Optional[QThreadPool] = None
+
+
+def db_thread_pool() -> QThreadPool:
+    """Отдельный пул потоков для работы с БД"""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = QThreadPool()
+        _db_pool.setMaxThreadCount(DB_THREADS)
+    return _db_pool
+
+
+class _TaskSignals(QObject):
+    finished = Signal(object, object)  # задача, результат
+    failed = Signal(object, object)    # задача, исключение
+
+
+class DbTask(QRunnable):
+    """Вызов fn(*args) в потоке пула; итог отправляется сигналом.
+
+    fn не должна обращаться к виджетам и моделям Qt — только к БД
+    (соединения берутся из пула engine) и к своим аргументам.
+    """
+
+    def __init__(self, key, generation: int, fn: Callable, args: tuple,
+                 on_done: Optional[Callable], on_error: Optional[Callable],
+                 on_discard: Optional[Callable]):
+        super().__init__()
+        # Задачей владеет TaskRunner до получения результата
+        self.setAutoDelete(False)
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_discard = on_discard
+        self.signals = _TaskSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(self, e)
+            return
+        self.signals.finished.emit(self, result)
+
+    def deliver(self, future):
+        """Отправляет итог задачи, выполненной AsyncBridge (вызывается в потоке цикла)"""
+        try:
+            if future.cancelled():
+                self.signals.failed.emit(self, RuntimeError("Задача прервана: асинхронный режим остановлен"))
+            elif future.exception() is not None:
+                self.signals.failed.emit(self, future.exception())
+            else:
+                self.signals.finished.emit(self, future.result())
+        except RuntimeError:
+            # Владелец задачи уже удален (отключение от БД)
+            pass
+
+
+class TaskRunner(QObject):
+    """Запускает задачи в db_thread_pool() и доставляет итог в GUI-поток.
+
+    Задачи различаются ключом: новая задача с тем же ключом (или cancel)
+    делает результат предыдущих устаревшим — он не применяется, а
+    передается в on_discard, чтобы освободить захваченные ресурсы.
+    busy_changed сообщает, ждет ли владелец хотя бы одного результата.
+    Задачи с loop_safe=True при включенном асинхронном режиме (db/aio.py)
+    выполняются на цикле asyncio, остальные — в db_thread_pool().
+    """
+
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._generations: Dict[Any, int] = {}
+        self._running: Set[DbTask] = set()
+        self._busy = False
+
+    def submit(self, key, fn: Callable, *args,
+               on_done: Optional[Callable] = None,
+               on_error: Optional[Callable] = None,
+               on_discard: Optional[Callable] = None,
+               loop_safe: bool = False):
+        """loop_safe — fn обращается к БД только через QueryGuard, а соединения,
+        переживающие задачу, закрывает через db.aio.close_connection"""
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+
+        task = DbTask(key, generation, fn, args, on_done, on_error, on_discard)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        self._running.add(task)
+        self._update_busy()
+        bridge = async_bridge() if loop_safe else None
+        if bridge is not None:
+            bridge.run(fn, *args).add_done_callback(task.deliver)
+        else:
+            db_thread_pool().start(task)
+
+    def cancel(self, key=None):
+        """Помечает устаревшими задачи с ключом key (или все задачи)"""
+        keys = list(self._generations) if key is None else [key]
+        for k in keys:
+            self._generations[k] = self._generations.get(k, 0) + 1
+        self._update_busy()
+
+    def is_busy(self) -> bool:
+        return self._busy
+
+    def _is_current(self, task: DbTask) -> bool:
+        return self._generations.get(task.key) == task.generation
+
+    def _update_busy(self):
+        busy = any(self._is_current(task) for task in self._running)
+        if busy != self._busy:
+            self._busy = busy
+            self.busy_changed.emit(busy)
+
+    @Slot(object, object)
+    def _on_finished(self, task: DbTask, result):
+        self._running.discard(task)
+        current = self._is_current(task)
+        self._update_busy()
+        if current:
+            if task.on_done is not None:
+                task.on_done(result)
+        elif task.on_discard is not None:
+            task.on_discard(result)
+
+    @Slot(object, object)
+    def _on_failed(self, task: DbTask, error):
+        self._running.discard(task)
+        current = self._is_current(task)
+        self._update_busy()
+        if current and task.on_error is not None:
+            task.on_error(error)
@@ -1,6 +1,5 @@
 # ===== PySide6 =====
-from PySide6.QtCore import QDate, QSortFilterProxyModel
-from PySide6.QtGui import Qt
+from PySide6.QtCore import QDate
 from PySide6.QtWidgets import (
     QLineEdit, QMessageBox,
     QSpinBox, QTableView, QHeaderView,
@@ -46,6 +45,7 @@ class AircraftTab(BaseTab):
         super().__init__(engine, tables, parent)
         self.table = "aircraft"
         self.model = SATableModel(engine, self.tables["aircraft"], self)
+        self.track_busy(self.model.runner)
         self.update_model()
 
         self.add_record_btn.clicked.connect(self.add_aircraft)
@@ -64,25 +64,13 @@ class AircraftTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку выполняется сервером (ORDER BY), без прокси
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
 
         self.update_ui_for_mode()
 
@@ -127,7 +115,7 @@ class AircraftTab(BaseTab):
                 conn.execute(insert(self.tables[self.table]).values(
                     model=model, year=year, seats_amount=seats, baggage_capacity=baggage
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
         except IntegrityError as e:
             QMessageBox.critical(self, "Ошибка INSERT (CHECK constraint)", str(e.orig))
@@ -148,7 +136,7 @@ class AircraftTab(BaseTab):
                 conn.execute(delete(self.tables["aircraft"]).where(
                     self.tables["aircraft"].c.aircraft_id == aircraft_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))
@@ -4,18 +4,31 @@ from PySide6.QtWidgets import (
     QComboBox, QLineEdit, QDialog,
     QLabel, QTabWidget, QTextEdit,
     QGroupBox, QHBoxLayout, QDialogButtonBox,
-    QMessageBox, QScrollArea
+    QMessageBox, QScrollArea, QProgressBar, QProgressDialog, QInputDialog
 )
 
-from PySide6.QtCore import (Qt)
+from PySide6.QtCore import (Qt, QTimer)
+import time
 from typing import List
 from sqlalchemy import text
 
+from db.advisor import usage_log, filter_usage
+from db.execution import QueryGuard, is_cancelled
+from db.filters import FilterSpec, FilterCompileError, compile_filter
+from db.history import KIND_FILTER, KIND_SQL, query_history
+from db.joins import join_paths, new_steps
+from db.matviews import matviews
+from db.reflection import reflection_cache
+from db.result_cache import result_cache
+from db.results import SAResultModel
+from db.search import create_search_indexes
+from db.workers import TaskRunner
+from templates.ExplainWindow import ExplainWindow
+from templates.IndexAdvisorWindow import IndexAdvisorWindow
+from templates.MatViewsWindow import MatViewsWindow
 from templates.modes import AppMode
 from styles import apply_compact_table_view
 
-from sqlalchemy.exc import SQLAlchemyError
-
 
 class BaseTab(QWidget):
     def __init__(self, engine, tables, table, parent=None):
@@ -39,6 +52,19 @@ class BaseTab(QWidget):
         self.filter_button.clicked.connect(self.open_filter_dialog)
         self.read_layout.addWidget(self.filter_button)
 
+        # Ход чтения результата фильтрации: счетчик строк и остановка
+        self.result_panel = QWidget()
+        self.result_layout = QHBoxLayout(self.result_panel)
+        self.result_layout.setContentsMargins(0, 0, 0, 0)
+        self.result_label = QLabel()
+        self.stop_query_btn = QPushButton("Остановить")
+        self.stop_query_btn.setEnabled(False)
+        self.result_layout.addWidget(self.result_label)
+        self.result_layout.addStretch()
+        self.result_layout.addWidget(self.stop_query_btn)
+        self.result_panel.setVisible(False)
+        self.read_layout.addWidget(self.result_panel)
+
         self.read_table = QTableView()
         self.read_layout.addWidget(self.read_table)
 
@@ -99,23 +125,87 @@ class BaseTab(QWidget):
 
         # Общее
 
+        # Индикатор фоновой загрузки (модель, списки, запросы фильтрации)
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setTextVisible(False)
+        self.busy_bar.setMaximumHeight(4)
+        self._busy_runners = set()
+        # Отмена прерывает запросы вкладки на сервере (pg_cancel_backend)
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.clicked.connect(self.cancel_queries)
+        self.busy_panel = QWidget()
+        self.busy_layout = QHBoxLayout(self.busy_panel)
+        self.busy_layout.setContentsMargins(0, 0, 0, 0)
+        self.busy_layout.addWidget(self.busy_bar, 1)
+        self.busy_layout.addWidget(self.cancel_btn)
+        self.busy_panel.setVisible(False)
+
+        # Быстрый поиск (режимы чтения и добавления): фильтр выполняет сервер
+        self.search_panel = QWidget()
+        self.search_layout = QHBoxLayout(self.search_panel)
+        self.search_layout.setContentsMargins(0, 0, 0, 0)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск: начало строки, id, дата (ГГГГ-ММ-ДД)")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_index_btn = QPushButton("Индексы для поиска")
+        self.search_layout.addWidget(self.search_edit)
+        self.search_layout.addWidget(self.search_index_btn)
+
+        # Запрос уходит после паузы в наборе, а не на каждую букву
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.search_edit.returnPressed.connect(self.apply_search)
+        self.search_index_btn.clicked.connect(self.create_search_indexes)
+
         self.main_layout = QVBoxLayout(self)
+        self.main_layout.addWidget(self.busy_panel)
+        self.main_layout.addWidget(self.search_panel)
         self.main_layout.addWidget(self.tool_panel)
         self.connect_buttons()
 
         self.added_functions_list = ""
 
+        # Выпадающие списки формы, заполняемые из БД (см. register_combo)
+        self.combo_sources = []
+        # id списка -> ключи из ленты изменений, еще не перечитанные
+        self._combo_changes = {}
+
+        # Фоновые задачи вкладки: выпадающие списки, execute_sql
+        self.guard = QueryGuard(self.engine)
+        self.runner = TaskRunner(self)
+        self.track_busy(self.runner)
+
+        # Результат фильтрации читается потоково (см. execute_sql_query)
+        self.result_model = SAResultModel(self.engine, self)
+        self._last_query = None
+        # Запрос, чье завершение еще не записано в query_history
+        self._running_query = None
+        # Столбцы выполняемого фильтра для usage_log (см. db.advisor)
+        self._pending_usage = None
+        self.result_model.progress.connect(self._show_query_progress)
+        self.result_model.failed.connect(self._show_query_error)
+        self.stop_query_btn.clicked.connect(self.result_model.stop)
+        self.track_busy(self.result_model.runner)
+
     def connect_buttons(self):
         # чтение
 
         self.custom_types_btn = QPushButton("Пользовательские типы")
         self.custom_types_btn.clicked.connect(self.open_custom_types_dialog)
 
+        self.index_advisor_btn = QPushButton("Советы по индексам")
+        self.index_advisor_btn.clicked.connect(self.open_index_advisor)
+
         #self.case_expression_btn = QPushButton("CASE выражение")
         #self.case_expression_btn.clicked.connect(self.open_case_expression_dialog)
 
         # Добавить кнопки в tool_layout
         self.edit_layout.addWidget(self.custom_types_btn)
+        self.edit_layout.addWidget(self.index_advisor_btn)
         #self.read_layout.addWidget(self.case_expression_btn)
 
         # редактирование
@@ -126,20 +216,128 @@ class BaseTab(QWidget):
         # добавление
 
     def update_model(self):
-        from sqlalchemy import Table, MetaData
+        # Структура таблицы из БД; при подключении она уже прочитана
+        # в фоне (см. MainWindow.ensure_data_tabs), после DDL — читается заново
+        self.tables[self.table] = reflection_cache.table(self.engine, self.table)
+
+    def update_tables(self):
+        pass
 
-        # Создаем объект метаданных
-        metadata = MetaData()
+    def track_busy(self, runner):
+        """Показывает индикатор загрузки, пока runner ждет результатов"""
+        runner.busy_changed.connect(lambda busy: self._set_busy(runner, busy))
+        self._set_busy(runner, runner.is_busy())
 
-        # Автоматически загружаем структуру таблицы из базы данных
-        self.tables[self.table] = Table(
-            self.table,
-            metadata,
-            autoload_with=self.engine
+    def _set_busy(self, runner, busy):
+        if busy:
+            self._busy_runners.add(runner)
+        else:
+            self._busy_runners.discard(runner)
+        self.busy_panel.setVisible(bool(self._busy_runners))
+
+    def cancel_queries(self):
+        """Прерывает запросы вкладки: фильтрацию, обновление модели, execute_sql"""
+        self.result_model.stop()
+        self.guard.cancel()
+        if getattr(self, 'model', None) is not None:
+            self.model.guard.cancel()
+
+    def enable_server_sort(self, view):
+        """Включает сортировку по заголовку; модель сортирует запросом к БД (SATableModel.sort)"""
+        # Индикатор выставляется до включения: иначе представление сразу
+        # запросит сортировку по убыванию первого столбца и лишнюю перезагрузку
+        column, order = self.model.sort_order()
+        view.horizontalHeader().setSortIndicator(column, order)
+        view.setSortingEnabled(True)
+
+    def register_combo(self, combo, table_name, query, key_col, formatter, error_title):
+        """Регистрирует выпадающий список, заполняемый строками таблицы table_name
+
+        query — упорядоченный select, key_col — столбец-ключ (данные элемента),
+        formatter(row) — подпись элемента.
+        """
+        self.combo_sources.append((combo, table_name, query, key_col, formatter, error_title))
+
+    def load_combo(self, combo):
+        """Полностью перезаполняет список (в фоне), сохраняя выбранный элемент"""
+        for source in self.combo_sources:
+            if source[0] is combo:
+                break
+        else:
+            return
+        _, table_name, query, key_col, formatter, error_title = source
+
+        # Полное чтение заменяет и ожидающие точечные обновления
+        self.runner.cancel(("combo_keys", id(combo)))
+        self._combo_changes.pop(id(combo), None)
+        self.runner.submit(
+            ("combo", id(combo)), self._read_combo_items, table_name, query, key_col, formatter,
+            on_done=lambda items: self._fill_combo(combo, items),
+            on_error=lambda e: QMessageBox.critical(self, error_title, str(e)),
+            loop_safe=True,
         )
 
-    def update_tables(self):
-        pass
+    def _read_combo_items(self, table_name, query, key_col, formatter):
+        # Выполняется в потоке пула: только запрос и подписи, без виджетов
+        with self.guard.connect(reads=[table_name]) as conn:
+            return [(formatter(row), row._mapping[key_col]) for row in conn.execute(query)]
+
+    def _fill_combo(self, combo, items):
+        current = combo.currentData()
+        combo.clear()
+        for label, key in items:
+            combo.addItem(label, key)
+
+        idx = combo.findData(current)
+        if idx != -1:
+            combo.setCurrentIndex(idx)
+
+    def refresh_combos(self, table_name=None):
+        for source in self.combo_sources:
+            if table_name is None or source[1] == table_name:
+                self.load_combo(source[0])
+
+    def update_combo_keys(self, table_name, pks):
+        """Точечно обновляет элементы списков по ключам измененных строк (в фоне)
+
+        Ключи, пришедшие, пока предыдущее чтение еще идет, добавляются к
+        нему: новая задача читает все ожидающие ключи, а результат старой
+        отбрасывается.
+        """
+        for combo, source_table, query, key_col, formatter, _ in self.combo_sources:
+            if source_table != table_name:
+                continue
+            pending = self._combo_changes.setdefault(id(combo), set())
+            pending.update(pks)
+            keys = sorted(pending)
+            self.runner.submit(
+                ("combo_keys", id(combo)), self._read_combo_keys, table_name, query, key_col, formatter, keys,
+                on_done=lambda labels, combo=combo, keys=keys: self._apply_combo_keys(combo, keys, labels),
+                on_error=lambda e, table_name=table_name: print(f"Ошибка при обновлении списка {table_name}: {e}"),
+                loop_safe=True,
+            )
+
+    def _read_combo_keys(self, table_name, query, key_col, formatter, keys):
+        # Выполняется в потоке пула
+        with self.guard.connect(reads=[table_name]) as conn:
+            return {r._mapping[key_col]: formatter(r) for r in conn.execute(query.where(key_col.in_(keys)))}
+
+    def _apply_combo_keys(self, combo, keys, labels):
+        self._combo_changes.get(id(combo), set()).difference_update(keys)
+
+        # Место новой строки определяется сортировкой запроса — проще перечитать список
+        if any(combo.findData(key) == -1 for key in labels):
+            self.load_combo(combo)
+            return
+
+        for key in keys:
+            idx = combo.findData(key)
+            if idx == -1:
+                continue
+            if key in labels:
+                combo.setItemText(idx, labels[key])
+            else:
+                combo.removeItem(idx)
 
     def open_custom_types_dialog(self):
         """Открывает диалог управления пользовательскими типами"""
@@ -147,6 +345,11 @@ class BaseTab(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             dialog.close()
 
+    def open_index_advisor(self):
+        window = IndexAdvisorWindow(self.engine, self.tables, self)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.show()
+
     def load_table_structure(self):
         try:
             from PySide6.QtGui import QStandardItemModel, QStandardItem
@@ -207,7 +410,7 @@ class BaseTab(QWidget):
             self.load_table_structure()
 
             if hasattr(self, 'model') and self.model:
-                self.model.refresh()
+                self.model.refresh_async()
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка обновления", f"Не удалось обновить структуру таблицы: {str(e)}")
@@ -221,6 +424,14 @@ class BaseTab(QWidget):
             self.edit_column_btn.setEnabled(False)
 
     def show_add_column_dialog(self):
+        # Типы читаются в фоне, диалог открывается после их получения
+        sql = """
+                SELECT typname, typtype 
+                FROM pg_type
+                """
+        self.execute_sql(sql, on_done=self._show_add_column_dialog)
+
+    def _show_add_column_dialog(self, types):
         dialog = QDialog(self)
         dialog.setWindowTitle("Добавить столбец")
         layout = QVBoxLayout(dialog)
@@ -231,11 +442,6 @@ class BaseTab(QWidget):
 
         layout.addWidget(QLabel("Тип данных:"))
         type_combo = QComboBox()
-        sql = """
-                SELECT typname, typtype 
-                FROM pg_type
-                """
-        types = self.execute_sql(sql)
         types = [i[0] for i in types if i[1] == 'b']
         type_combo.addItems(types)
         type_combo.addItems([
@@ -305,6 +511,13 @@ class BaseTab(QWidget):
         row = index.row()
         column_name = model.data(model.index(row, 0))  # Название столбца из второго столбца
 
+        sql = """
+                SELECT typname, typtype 
+                FROM pg_type
+                """
+        self.execute_sql(sql, on_done=lambda types: self._show_edit_column_dialog(column_name, types))
+
+    def _show_edit_column_dialog(self, column_name, types):
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактировать столбец")
         layout = QVBoxLayout(dialog)
@@ -317,11 +530,6 @@ class BaseTab(QWidget):
         # Выбор типа данных
         layout.addWidget(QLabel("Тип данных:"))
         type_combo = QComboBox()
-        sql = """
-                SELECT typname, typtype 
-                FROM pg_type
-                """
-        types = self.execute_sql(sql)
         types = [i[0] for i in types if i[1] == 'b']
         type_combo.addItems(types)
         layout.addWidget(type_combo)
@@ -369,18 +577,17 @@ class BaseTab(QWidget):
 
             sql = ' '.join(sql_parts)
 
-            self.execute_sql(sql)
-
-            QMessageBox.information(self, "Успех",
-                                    f"Столбец '{name}' добавлен\n"
-                                    )
-            self.refresh_table_structure()
-        except SQLAlchemyError as e:
-            error = str(e.__dict__['orig'])
-            print(error)
+            self.release_streams()
+            self.execute_sql(sql, on_done=lambda _: self._structure_changed(f"Столбец '{name}' добавлен"))
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось добавить столбец: {str(e)}")
 
+    def _structure_changed(self, message):
+        """DDL выполнен: структура и данные вкладки перечитываются"""
+        reflection_cache.invalidate(self.engine, self.table)
+        QMessageBox.information(self, "Успех", message + "\n")
+        self.refresh_table_structure()
+
     def delete_selected_column(self):
         index = self.structure_table.currentIndex()
         if not index.isValid():
@@ -403,16 +610,18 @@ class BaseTab(QWidget):
 
         sql = f"ALTER TABLE {self.table} DROP COLUMN {column_name}"
 
-        try:
-            self.execute_sql(sql)
+        # Столбец удаляется только после подтверждения
+        msg_box.exec()
+        if msg_box.clickedButton() != yes_button:
+            return
 
-            msg_box.exec()
+        def deleted(_):
+            reflection_cache.invalidate(self.engine, self.table)
+            QMessageBox.information(self, "Удаление", f"Столбец '{column_name}' удален")
+            self.refresh_table_structure()
 
-            if msg_box.clickedButton() == yes_button:
-                QMessageBox.information(self, "Удаление", f"Столбец '{column_name}' удален")
-                self.refresh_table_structure()
-        except Exception as e:
-            QMessageBox.information(self, "Удаление", f"Столбец '{column_name}' не удален. Ошибка\n {e}")
+        self.release_streams()
+        self.execute_sql(sql, on_done=deleted)
 
     def edit_column(self, oldname, name, data_type, not_null):
         if not name:
@@ -420,24 +629,22 @@ class BaseTab(QWidget):
             return
 
         try:
+            self.release_streams()
+            statements = []
             sql = f"ALTER TABLE {self.table} "
             sql_parts = []
             if oldname != name:
-                self.execute_sql(f"ALTER TABLE {self.table} RENAME COLUMN {oldname} TO {name}")
+                statements.append(f"ALTER TABLE {self.table} RENAME COLUMN {oldname} TO {name}")
             sql_parts.append(f"ALTER COLUMN {name} TYPE {data_type}")
             if not_null:
                 sql_parts.append(f"ALTER COLUMN {name} SET NOT NULL")
             else:
                 sql_parts.append(f"ALTER COLUMN {name} DROP NOT NULL")
             sql += ', '.join(sql_parts)
+            statements.append(sql)
 
-            self.execute_sql(sql)
-
-            QMessageBox.information(self, "Успех",
-                                    f"Столбец '{name}' изменен\n"
-                                    )
-
-            self.refresh_table_structure()
+            # Переименование и изменение типа — одной транзакцией
+            self.execute_sql(statements, on_done=lambda _: self._structure_changed(f"Столбец '{name}' изменен"))
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось изменить столбец: {str(e)}")
 
@@ -462,36 +669,124 @@ class BaseTab(QWidget):
             self.tool_layout.addWidget(self.add_widgets)
 
         self.tool_panel.setVisible(self.current_mode in [AppMode.READ, AppMode.EDIT, AppMode.ADD])
+        self.search_panel.setVisible(self.current_mode in [AppMode.READ, AppMode.ADD])
+
+    def apply_search(self):
+        self.search_timer.stop()
+        if hasattr(self, 'model') and self.model:
+            self.model.set_search(self.search_edit.text())
+
+    def release_streams(self):
+        """Закрывает курсоры вкладок перед DDL: их транзакции держат блокировки таблиц"""
+        main = self.window()
+        if hasattr(main, "release_streams"):
+            main.release_streams()
+        elif hasattr(self, 'model') and self.model:
+            self.model.release_stream()
+
+    def create_search_indexes(self):
+        # CREATE INDEX CONCURRENTLY ждет завершения всех транзакций, начатых до него
+        self.release_streams()
+        self.search_index_btn.setEnabled(False)
+        self.runner.submit("search_indexes", create_search_indexes, self.engine, self.tables[self.table],
+                           on_done=self._search_indexes_created,
+                           on_error=lambda e: self._search_indexes_created(None))
+
+    def _search_indexes_created(self, names):
+        self.search_index_btn.setEnabled(True)
+        if names is None:
+            QMessageBox.critical(self, "Индексы", "Не удалось создать индексы. См. консоль.")
+        else:
+            QMessageBox.information(self, "Индексы", "Индексы для поиска:\n" + "\n".join(names))
 
     def open_filter_dialog(self):
         dialog = SQLFilterDialog(self, self.table)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             self.get_filters(dialog)
 
+    def build_filter_query(self, dialog):
+        """Запрос фильтра: select() Core или текст SQL"""
+        # Фильтр, собранный кнопками диалога, выполняется как select() с
+        # параметрами; списки, исправленные вручную, — прежним текстом SQL
+        spec = dialog.structured_spec()
+        if spec is not None:
+            try:
+                return compile_filter(spec, self.tables)
+            except FilterCompileError as e:
+                print(f"Фильтр выполняется как текст SQL: {e}")
+
+        parsed_filters = self.parse_all_filters(dialog)
+        return self.build_sql_from_parsed_filters(parsed_filters)
+
     def get_filters(self, dialog):
         try:
-            parsed_filters = self.parse_all_filters(dialog)
-            sql_query = self.build_sql_from_parsed_filters(parsed_filters)
-
-            self.execute_sql_query(sql_query)
+            query = self.build_filter_query(dialog)
+            spec = dialog.structured_spec()
+            usage = filter_usage(spec, self.tables) if spec is not None else None
+            self.execute_sql_query(query, usage)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при обработке фильтров: {str(e)}")
 
+    def explain_filter(self, dialog):
+        """Показывает план запроса фильтра (EXPLAIN ANALYZE) поверх диалога"""
+        try:
+            query = self.build_filter_query(dialog)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при обработке фильтров: {str(e)}")
+            return
+        window = ExplainWindow(self.engine, query, dialog)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.show()
+
+    def save_matview(self, dialog):
+        """Сохраняет отчет GROUP BY диалога материализованным представлением"""
+        spec = dialog.structured_spec()
+        if spec is None or not spec.group_by:
+            QMessageBox.warning(dialog, "Представление",
+                                "Сохранить можно отчет с GROUP BY, собранный кнопками диалога "
+                                "(без ручной правки списков)")
+            return
+        try:
+            stmt = compile_filter(spec, self.tables)
+        except FilterCompileError as e:
+            QMessageBox.warning(dialog, "Представление", f"Отчет нельзя сохранить: {e}")
+            return
+
+        name, ok = QInputDialog.getText(dialog, "Представление", "Имя представления:",
+                                        text=f"mv_{self.table}_{'_'.join(spec.group_by)}"[:60])
+        if not ok or not name.strip():
+            return
+        modes = ["После изменений данных", "По расписанию", "После изменений и по расписанию"]
+        mode, ok = QInputDialog.getItem(dialog, "Представление", "Обновление данных:", modes, 0, False)
+        if not ok:
+            return
+        interval = 0
+        if mode != modes[0]:
+            minutes, ok = QInputDialog.getInt(dialog, "Представление", "Интервал, мин:", 60, 1, 24 * 60)
+            if not ok:
+                return
+            interval = minutes * 60
+
+        self.runner.submit(
+            ("matview", name), matviews.create, self.engine, name.strip(), stmt, spec,
+            mode != modes[1], interval,
+            on_done=lambda view: QMessageBox.information(
+                self, "Представление",
+                f"Создано {view.name}. Повторный запуск этого отчета читает представление."),
+            on_error=lambda e: QMessageBox.critical(self, "Представление", f"Не удалось создать: {e}"),
+        )
+
+    def open_matviews(self, dialog):
+        window = MatViewsWindow(self.engine, dialog)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.show()
 
     def get_table_columns(self, table_name: str) -> List[str]:
         """Получает список колонок для указанной таблицы из базы данных"""
+        # Снимок каталога общий для всех вкладок и диалогов и читается
+        # одним запросом; сбрасывается при DDL (см. reflection_cache)
         try:
-            with self.engine.connect() as conn:
-                if self.engine.dialect.name == 'postgresql':
-                    query = text(
-                        """SELECT column_name
-                           FROM information_schema.columns
-                           WHERE table_name = :table_name
-                           ORDER BY ordinal_position""")
-                    result = conn.execute(query, {'table_name': table_name})
-
-                columns = [row[0] for row in result]
-                return columns
+            return reflection_cache.catalog(self.engine).columns(table_name)
         except Exception as e:
             print(f"Ошибка при получении колонок таблицы {table_name}: {e}")
 
@@ -589,10 +884,8 @@ class BaseTab(QWidget):
                                                                                           'join_type_combo') else "",
                 'table': getattr(dialog, 'join_table_combo', None).currentText() if hasattr(dialog,
                                                                                             'join_table_combo') else "",
-                'main_column': getattr(dialog, 'join_main_column_combo', None).currentText() if hasattr(dialog,
-                                                                                                        'join_main_column_combo') else "",
-                'foreign_column': getattr(dialog, 'join_foreign_column_combo', None).currentText() if hasattr(dialog,
-                                                                                                              'join_foreign_column_combo') else ""
+                'condition': getattr(dialog, 'join_condition_label', None).text() if hasattr(dialog,
+                                                                                             'join_condition_label') else ""
             }
         }
         return combo_values
@@ -678,31 +971,55 @@ class BaseTab(QWidget):
 
         return " ".join(sql_parts)
 
-    def execute_sql_query(self, sql_query):
-        """Выполняет SQL запрос и отображает результаты"""
-        try:
-            with self.engine.begin() as conn:
-                result = conn.execute(text(sql_query))
-
-                from PySide6.QtGui import QStandardItemModel, QStandardItem
-                model = QStandardItemModel()
-
-                column_names = result.keys()
-                model.setHorizontalHeaderLabels(column_names)
+    def execute_sql_query(self, sql_query, usage=None):
+        """Выполняет SQL запрос (текст или select() Core) и показывает результат по мере чтения
 
-                for row in result:
-                    row_items = []
-                    for value in row:
-                        item = QStandardItem(str(value) if value is not None else "")
-                        row_items.append(item)
-                    model.appendRow(row_items)
-
-                self.read_table.setModel(model)
-
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка запроса\n",
-                                 f"Некорректный запрос! \n\n"
-                                 f"Запрос:\n{sql_query}\n\nЛог ошибки: {str(e)}")
+        usage — столбцы фильтра (filter_usage); по окончании запроса
+        они вместе с его временем попадают в usage_log. Сам запрос
+        записывается в query_history.
+        """
+        stmt = text(sql_query) if isinstance(sql_query, str) else sql_query
+        # Завершение предыдущего запроса учитывается с его собственными данными
+        self.result_model.stop()
+        # Отчет, сохраненный материализованным представлением, читается из него
+        view = matviews.find(self.engine, stmt)
+        if view is not None:
+            sql_query = view.read_sql
+            stmt = text(sql_query)
+        # Повтор того же фильтра берется из кэша, пока его таблицы не менялись
+        key = result_cache.key(self.engine, stmt)
+        tables = frozenset([view.name]) if view is not None else result_cache.tables_of(stmt, self.tables)
+
+        self._last_query = sql_query
+        self._running_query = sql_query
+        self._pending_usage = usage
+        self.read_table.setModel(self.result_model)
+        self.result_panel.setVisible(True)
+        self.result_model.execute(stmt, key, tables)
+
+    def _show_query_error(self, e):
+        if is_cancelled(e):
+            QMessageBox.warning(self, "Запрос прерван",
+                                f"Запрос выполнялся дольше {self.result_model.guard.timeout_ms // 1000} с "
+                                f"и был остановлен сервером (statement_timeout).")
+            return
+        QMessageBox.critical(self, "Ошибка запроса\n",
+                             f"Некорректный запрос! \n\n"
+                             f"Запрос:\n{self._last_query}\n\nЛог ошибки: {str(e)}")
+
+    def _show_query_progress(self, rows, finished):
+        state = "" if finished else " (чтение...)"
+        self.result_label.setText(f"Строк: {rows}{state}")
+        self.stop_query_btn.setEnabled(not finished)
+        if not finished or self._running_query is None:
+            return
+        model = self.result_model
+        query_history.record_statement(self.engine, self.table, KIND_FILTER, self._running_query,
+                                       model.elapsed_ms, rows, model.error)
+        if self._pending_usage is not None and model.error is None:
+            usage_log.record(self._pending_usage, model.elapsed_ms)
+        self._pending_usage = None
+        self._running_query = None
 
     def _update_conditions_with_table(self, conditions, table_name):
         """Добавляет имя таблицы к колонкам в условиях"""
@@ -727,20 +1044,80 @@ class BaseTab(QWidget):
         return found_columns
 
     # Метод произвольного SQL запроса в BaseTab: (на всякий случай, может не пригодиться)
-    def execute_sql(self, sql_query):
-        try:
-            with self.engine.begin() as conn:
-                result = conn.execute(text(sql_query))
-                return result
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка SQL", f"Ошибка выполнения запроса: {str(e)}")
-            return None
+    def execute_sql(self, sql_query, on_done=None):
+        """Выполняет SQL в пуле потоков, не замораживая окно
+
+        sql_query — запрос или список запросов одной транзакции.
+        on_done(rows) вызывается после успеха (rows — строки последнего
+        запроса или None), ошибка показывается сообщением. Пока запрос
+        выполняется, вкладка недоступна, поэтому второй DDL не начнется
+        поверх первого; долгий запрос (например, ALTER TABLE, ждущий
+        блокировку) показывает диалог с кнопкой отмены.
+        """
+        self._sql_running = getattr(self, '_sql_running', 0) + 1
+        self.setEnabled(False)
+        # Диалог создается после отключения вкладки, иначе он тоже будет недоступен
+        progress = QProgressDialog("Выполняется запрос...", "Отмена", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.canceled.connect(self.guard.cancel)
+        state = {"finished": False}
+
+        def finish():
+            state["finished"] = True
+            progress.canceled.disconnect()
+            progress.close()
+            progress.deleteLater()
+            self._sql_running -= 1
+            if not self._sql_running:
+                self.setEnabled(True)
+
+        def done(rows):
+            finish()
+            if on_done is not None:
+                on_done(rows)
+
+        def failed(e):
+            finish()
+            reason = "Запрос отменен или превысил тайм-аут" if is_cancelled(e) else "Ошибка выполнения запроса"
+            QMessageBox.critical(self, "Ошибка SQL", f"{reason}: {str(e)}")
+
+        self.runner.submit(("sql", id(progress)), self._run_sql, sql_query, on_done=done, on_error=failed)
+
+        def show_progress():
+            if not state["finished"]:
+                progress.show()
+
+        QTimer.singleShot(500, show_progress)
+
+    def _run_sql(self, sql_query):
+        # Выполняется в потоке пула
+        statements = [sql_query] if isinstance(sql_query, str) else list(sql_query)
+        rows = None
+        with self.guard.connect() as conn:
+            for statement in statements:
+                started = time.monotonic()
+                try:
+                    result = conn.execute(text(statement))
+                    rows = result.fetchall() if result.returns_rows else None
+                except Exception as e:
+                    query_history.record_statement(self.engine, self.table, KIND_SQL, statement,
+                                                   (time.monotonic() - started) * 1000, None, e)
+                    raise
+                # rowcount -1 — драйвер не знает числа строк (DDL)
+                count = len(rows) if rows is not None else (result.rowcount if result.rowcount >= 0 else None)
+                query_history.record_statement(self.engine, self.table, KIND_SQL, statement,
+                                               (time.monotonic() - started) * 1000, count)
+            conn.commit()
+        return rows
 
 
 class SQLFilterDialog(QDialog):
     def __init__(self, parent=None, current_table=""):
         super().__init__(parent)
         self.current_table = current_table
+        # Структура фильтра, которую ведут кнопки «Добавить ...» (см. structured_spec)
+        self.filter_spec = FilterSpec(current_table)
+        self._generated_text = {}
         self.setWindowTitle("Фильтры SQL")
         self.setMinimumSize(900, 600)
         self.setup_ui()
@@ -783,12 +1160,15 @@ class SQLFilterDialog(QDialog):
         buttons_row = QHBoxLayout()
         self.apply_button = QPushButton("Применить")
         self.apply_button.clicked.connect(self.apply_filter)
+        self.explain_button = QPushButton("Explain")
+        self.explain_button.clicked.connect(self.explain_filter)
         self.reset_button = QPushButton("Сбросить")
         self.reset_button.clicked.connect(self.reset_filters)
         self.close_button = QPushButton("Закрыть")
         self.close_button.clicked.connect(self.close)
 
         buttons_row.addWidget(self.apply_button)
+        buttons_row.addWidget(self.explain_button)
         buttons_row.addWidget(self.reset_button)
         buttons_row.addStretch()
         buttons_row.addWidget(self.close_button)
@@ -798,6 +1178,25 @@ class SQLFilterDialog(QDialog):
         scroll_area.setWidget(main_widget)
         layout.addWidget(scroll_area)
 
+    def _set_generated(self, edit, text):
+        """Записывает в список текст, сформированный диалогом"""
+        edit.setPlainText(text)
+        self._generated_text[edit] = text
+
+    def structured_spec(self):
+        """Структура фильтра или None, если списки редактировали вручную"""
+        edits = [
+            self.added_functions_list, self.where_conditions_list, self.order_columns_list,
+            self.group_columns_list, self.having_conditions_list, self.joins_list,
+            self.adv_conditions_list, self.null_functions_list
+        ]
+        for edit in edits:
+            if edit.toPlainText().strip() != self._generated_text.get(edit, "").strip():
+                return None
+
+        self.filter_spec.columns = [name for name, cb in self.column_checkboxes.items() if cb.isChecked()]
+        return self.filter_spec
+
     def get_all_tables_columns(self) -> dict:
         tables_columns = {}
         for table_name in self.tables.keys():
@@ -990,6 +1389,16 @@ class SQLFilterDialog(QDialog):
         group_layout.addWidget(QLabel("Колонки GROUP BY:"))
         group_layout.addWidget(self.group_columns_list)
 
+        # Отчет с группировкой можно сохранить материализованным представлением
+        matview_row = QHBoxLayout()
+        self.save_matview_button = QPushButton("Сохранить как мат. представление")
+        self.save_matview_button.clicked.connect(self.save_matview)
+        self.matviews_button = QPushButton("Представления...")
+        self.matviews_button.clicked.connect(self.open_matviews)
+        matview_row.addWidget(self.save_matview_button)
+        matview_row.addWidget(self.matviews_button)
+        group_layout.addLayout(matview_row)
+
         having_group = QGroupBox("HAVING - Условия для сгруппированных данных")
         having_layout = QVBoxLayout(having_group)
         self.having_column_combo = QComboBox()
@@ -1039,42 +1448,16 @@ class SQLFilterDialog(QDialog):
         self.join_type_combo.addItems(["INNER JOIN", "LEFT JOIN", "RIGHT JOIN", "FULL JOIN"])
         join_layout.addWidget(self.join_type_combo)
 
-        join_layout.addWidget(QLabel("Таблица для JOIN:"))
+        # Предлагаются только связанные внешними ключами таблицы, в том числе
+        # через промежуточные; условия ON — по столбцам ключей с индексами
+        join_layout.addWidget(QLabel("Путь по внешним ключам:"))
         self.join_table_combo = QComboBox()
-
-        parent = self.parent()
-        if parent and hasattr(parent, 'tables') and parent.tables:
-            for table_name in parent.tables.keys():
-                if table_name != self.current_table:  # Исключаем текущую таблицу
-                    self.join_table_combo.addItem(table_name)
-        else:
-            sample_tables = ["flights", "passengers", "tickets", "crew", "crew_members"]
-            for table in sample_tables:
-                if table != self.current_table:
-                    self.join_table_combo.addItem(table)
-
+        self.join_table_combo.currentIndexChanged.connect(self.update_join_condition)
         join_layout.addWidget(self.join_table_combo)
 
-        join_layout.addWidget(QLabel(f"Колонка из {self.current_table}:"))
-        self.join_main_column_combo = QComboBox()
-
-        if parent and hasattr(parent, 'get_table_columns'):
-            main_columns = parent.get_table_columns(self.current_table)
-            self.join_main_column_combo.addItems(main_columns)
-        else:
-            main_columns = ["aircraft_id", "model", "year", "seats_amount", "baggage_capacity"]
-            self.join_main_column_combo.addItems(main_columns)
-
-        self.join_main_column_combo.addItems(main_columns)
-        join_layout.addWidget(self.join_main_column_combo)
-
-        join_layout.addWidget(QLabel("Колонка из присоединяемой таблицы:"))
-        self.join_foreign_column_combo = QComboBox()
-
-        # Заполняем колонками из присоединяемой таблицы
-        foreign_columns = ["aircraft_id", "flight_id", "passenger_id", "ticket_id", "crew_id"]
-        self.join_foreign_column_combo.addItems(foreign_columns)
-        join_layout.addWidget(self.join_foreign_column_combo)
+        self.join_condition_label = QLabel()
+        self.join_condition_label.setWordWrap(True)
+        join_layout.addWidget(self.join_condition_label)
 
         self.add_join_button = QPushButton("Добавить JOIN")
         self.add_join_button.clicked.connect(self.add_join)
@@ -1091,6 +1474,7 @@ class SQLFilterDialog(QDialog):
         join_layout.addWidget(self.clear_joins_button)
 
         vbox.addWidget(join_group)
+        self.refresh_join_paths()
         return tab
 
     def create_advanced_tab(self):
@@ -1296,6 +1680,7 @@ class SQLFilterDialog(QDialog):
             expr += f" AS {alias}"
 
         self._add_to_null_functions_list(expr)
+        self.filter_spec.null_functions.append(("COALESCE", formatted_values, alias))
 
         # Очищаем поля
         self.null_coalesce_values_edit.clear()
@@ -1321,6 +1706,7 @@ class SQLFilterDialog(QDialog):
             expr += f" AS {alias}"
 
         self._add_to_null_functions_list(expr)
+        self.filter_spec.null_functions.append(("NULLIF", [val1, val2], alias))
 
         # Очищаем поля
         self.null_nullif_value1_edit.clear()
@@ -1406,6 +1792,7 @@ class SQLFilterDialog(QDialog):
 
         if not condition:
             self.case_preview_edit.setPlainText("")
+            self.filter_spec.case = None
             return
 
         case_expr = "CASE\n  " + "\n  " + condition
@@ -1422,6 +1809,7 @@ class SQLFilterDialog(QDialog):
             case_expr += f" AS {alias}"
 
         self.case_preview_edit.setPlainText(case_expr)
+        self.filter_spec.case = (when, formatted_then, formatted_else if else_text else "", alias)
 
     def _format_case_value(self, value):
         """Форматирует значение для CASE выражения"""
@@ -1466,11 +1854,13 @@ class SQLFilterDialog(QDialog):
             current_text += ",\n" + expr
         else:
             current_text = expr
-        self.null_functions_list.setPlainText(current_text)
+        self._set_generated(self.null_functions_list, current_text)
 
     def clear_null_functions(self):
         """Очищает список функций NULL"""
         self.null_functions_list.clear()
+        self.filter_spec.null_functions.clear()
+        self._generated_text.pop(self.null_functions_list, None)
 
     def update_adv_subquery_columns(self, table_name):
         """Обновляет список колонок для выбранной таблицы подзапроса"""
@@ -1520,7 +1910,8 @@ class SQLFilterDialog(QDialog):
         else:
             current_text = condition
 
-        self.adv_conditions_list.setPlainText(current_text)
+        self._set_generated(self.adv_conditions_list, current_text)
+        self.filter_spec.subqueries.append((column, operator, table, self.adv_subquery_column_combo.currentText(), where))
 
     def add_function(self):
         function = self.functions_combo.currentText()
@@ -1538,7 +1929,10 @@ class SQLFilterDialog(QDialog):
             function_text = f"{function} ({column1}, {column2}) AS {alias}"
         current_text = self.added_functions_list.toPlainText()
         current_text = (current_text + "\n" if current_text else "") + function_text
-        self.added_functions_list.setPlainText(current_text)
+        self._set_generated(self.added_functions_list, current_text)
+        self.filter_spec.functions.append((
+            function, column1, self.function_string_edit.text(), self.function_column2_combo.currentText(), alias
+        ))
         self.function_alias_edit.clear()
 
     def add_where_condition(self):
@@ -1550,14 +1944,16 @@ class SQLFilterDialog(QDialog):
         condition = f"{column} {operator} {value}"
         current_text = self.where_conditions_list.toPlainText()
         current_text = (current_text + "\nAND " if current_text else "WHERE ") + condition
-        self.where_conditions_list.setPlainText(current_text)
+        self._set_generated(self.where_conditions_list, current_text)
+        self.filter_spec.where.append((column, operator, value))
         self.where_value_edit.clear()
 
     def add_group_column(self):
         column = self.group_column_combo.currentText()
         current_text = self.group_columns_list.toPlainText()
         current_text = (current_text + ", " if current_text else "GROUP BY ") + column
-        self.group_columns_list.setPlainText(current_text)
+        self._set_generated(self.group_columns_list, current_text)
+        self.filter_spec.group_by.append(column)
 
     def add_having_condition(self):
         function = self.having_function_combo.currentText()
@@ -1569,7 +1965,8 @@ class SQLFilterDialog(QDialog):
         condition = f"{function}({column}) {operator} {value}"
         current_text = self.having_conditions_list.toPlainText()
         current_text = (current_text + "\nAND " if current_text else "HAVING ") + condition
-        self.having_conditions_list.setPlainText(current_text)
+        self._set_generated(self.having_conditions_list, current_text)
+        self.filter_spec.having.append((function, column, operator, value))
         self.having_value_edit.clear()
 
     def add_order_column(self):
@@ -1578,34 +1975,81 @@ class SQLFilterDialog(QDialog):
         order_text = f"{column} {direction}"
         current_text = self.order_columns_list.toPlainText()
         current_text = (current_text + ", " if current_text else "ORDER BY ") + order_text
-        self.order_columns_list.setPlainText(current_text)
+        self._set_generated(self.order_columns_list, current_text)
+        self.filter_spec.order_by.append((column, direction))
+
+    def _joined_tables(self) -> List[str]:
+        return [self.current_table] + [join[1] for join in self.filter_spec.joins]
+
+    def refresh_join_paths(self):
+        """Заполняет список путей JOIN из графа внешних ключей снимка каталога"""
+        self.join_table_combo.clear()
+        parent = self.parent()
+        paths = []
+        if parent is not None and hasattr(parent, 'engine'):
+            try:
+                paths = join_paths(reflection_cache.catalog(parent.engine), self.current_table,
+                                   self._joined_tables())
+            except Exception as e:
+                print(f"Ошибка при чтении внешних ключей: {e}")
+        for path in paths:
+            self.join_table_combo.addItem(f"{path.target}  ({path.label})", path)
+        self.add_join_button.setEnabled(bool(paths))
+        self.update_join_condition()
+
+    def update_join_condition(self):
+        path = self.join_table_combo.currentData()
+        if path is None:
+            self.join_condition_label.setText("Нет таблиц, связанных внешними ключами")
+            return
+        steps = new_steps(path, self._joined_tables())
+        self.join_condition_label.setText(
+            "\n".join(f"{step.right_table} ON {step.condition}" for step in steps)
+        )
 
     def add_join(self):
         join_type = self.join_type_combo.currentText()
-        join_table = self.join_table_combo.currentText()
-        main_column = self.join_main_column_combo.currentText()
-        foreign_column = self.join_foreign_column_combo.currentText()
+        path = self.join_table_combo.currentData()
 
-        if not join_table or not main_column or not foreign_column:
-            QMessageBox.warning(self, "Ошибка", "Заполните все поля для JOIN")
+        if path is None:
+            QMessageBox.warning(self, "Ошибка", "Выберите путь JOIN")
             return
 
-        join_text = f"{join_type} {join_table} ON {self.current_table}.{main_column} = {join_table}.{foreign_column}"
+        # Таблицы пути, уже присоединенные раньше, не присоединяются повторно
+        lines = []
+        for step in new_steps(path, self._joined_tables()):
+            lines.append(f"{join_type} {step.right_table} ON {step.condition}")
+            self.filter_spec.joins.append(
+                (join_type, step.right_table, step.left_column, step.right_column, step.left_table)
+            )
 
         current_text = self.joins_list.toPlainText()
         if current_text:
-            current_text += "\n" + join_text
+            current_text += "\n" + "\n".join(lines)
         else:
-            current_text = join_text
+            current_text = "\n".join(lines)
 
-        self.joins_list.setPlainText(current_text)
+        self._set_generated(self.joins_list, current_text)
+        self.refresh_join_paths()
 
     def clear_joins(self):
         self.joins_list.clear()
+        self.filter_spec.joins.clear()
+        self._generated_text.pop(self.joins_list, None)
+        self.refresh_join_paths()
 
     def apply_filter(self):
         self.accept()
 
+    def explain_filter(self):
+        self.parent().explain_filter(self)
+
+    def save_matview(self):
+        self.parent().save_matview(self)
+
+    def open_matviews(self):
+        self.parent().open_matviews(self)
+
     def reset_filters(self):
         for cb in self.column_checkboxes.values():
             cb.setChecked(True)
@@ -1616,6 +2060,12 @@ class SQLFilterDialog(QDialog):
         self.order_columns_list.clear()
         if hasattr(self, "joins_list"):
             self.joins_list.clear()
+        spec = self.filter_spec
+        for part in (spec.functions, spec.where, spec.group_by, spec.having, spec.order_by, spec.joins):
+            part.clear()
+        for edit in (self.added_functions_list, self.where_conditions_list, self.group_columns_list,
+                     self.having_conditions_list, self.order_columns_list, self.joins_list):
+            self._generated_text.pop(edit, None)
         self.functions_combo.setCurrentIndex(0)
         self.function_column_combo.setCurrentIndex(0)
         self.where_column_combo.setCurrentIndex(0)
@@ -1629,7 +2079,7 @@ class SQLFilterDialog(QDialog):
         if hasattr(self, "join_type_combo"):
             self.join_type_combo.setCurrentIndex(0)
         if hasattr(self, "join_table_combo"):
-            self.join_table_combo.setCurrentIndex(0)
+            self.refresh_join_paths()
 
 
 class CustomTypesManager:
@@ -1,5 +1,4 @@
 # ===== PySide6 =====
-from PySide6.QtCore import QSortFilterProxyModel, Qt
 from PySide6.QtWidgets import (
     QLineEdit, QMessageBox,
     QComboBox, QTableView, QHeaderView
@@ -28,7 +27,18 @@ class CrewMembersTab(BaseTab):
 
         self.table = "crew_member"
 
+        crew, aircraft = self.tables["crew"], self.tables["aircraft"]
+        self.register_combo(
+            self.crew_combo, "crew",
+            crew.join(aircraft, crew.c.aircraft_id == aircraft.c.aircraft_id)
+                .select().order_by(crew.c.crew_id),
+            crew.c.crew_id,
+            lambda row: f"Экипаж {row.crew_id} (Самолет: {row.model}, ID: {row.aircraft_id})",
+            "Ошибка загрузки экипажей"
+        )
+
         self.model = SATableModel(engine, self.tables["crew_member"], self)
+        self.track_busy(self.model.runner)
         self.update_model()
 
         self.add_record_btn.clicked.connect(self.add_crew_member)
@@ -47,27 +57,13 @@ class CrewMembersTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку выполняется сервером (ORDER BY), без прокси
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
-
-        self.refresh_crew_combo()
 
         self.update_ui_for_mode()
 
@@ -82,22 +78,7 @@ class CrewMembersTab(BaseTab):
         super().update_ui_for_mode()
 
     def refresh_crew_combo(self):
-        self.crew_combo.clear()
-        try:
-            with self.engine.connect() as conn:
-                query = self.tables["crew"].join(
-                    self.tables["aircraft"],
-                    self.tables["crew"].c.aircraft_id == self.tables["aircraft"].c.aircraft_id
-                ).select().order_by(self.tables["crew"].c.crew_id)
-
-                result = conn.execute(query)
-                for row in result:
-                    self.crew_combo.addItem(
-                        f"Экипаж {row.crew_id} (Самолет: {row.model}, ID: {row.aircraft_id})",
-                        row.crew_id
-                    )
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Ошибка загрузки экипажей", str(e))
+        self.load_combo(self.crew_combo)
 
     def add_crew_member(self):
         if self.current_mode != AppMode.ADD:
@@ -124,7 +105,7 @@ class CrewMembersTab(BaseTab):
                     crew_id=crew_id,
                     job_position=job_position
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
             self.window().refresh_combos()
         except IntegrityError as e:
@@ -150,7 +131,7 @@ class CrewMembersTab(BaseTab):
                 conn.execute(delete(self.tables["crew_member"]).where(
                     self.tables["crew_member"].c.member_id == member_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))
@@ -1,5 +1,4 @@
 # ===== PySide6 =====
-from PySide6.QtCore import QSortFilterProxyModel, Qt
 from PySide6.QtWidgets import (
     QMessageBox, QComboBox, QTableView, QHeaderView
 )
@@ -29,7 +28,16 @@ class CrewTab(BaseTab):
 
         self.table = "crew"
 
+        aircraft = self.tables["aircraft"]
+        self.register_combo(
+            self.aircraft_combo, "aircraft",
+            aircraft.select().order_by(aircraft.c.model), aircraft.c.aircraft_id,
+            lambda row: f"{row.model} (ID: {row.aircraft_id}, Мест: {row.seats_amount})",
+            "Ошибка загрузки самолетов"
+        )
+
         self.model = SATableModel(engine, self.tables["crew"], self)
+        self.track_busy(self.model.runner)
         self.update_model()
 
         self.add_record_btn.clicked.connect(self.add_crew)
@@ -48,25 +56,13 @@ class CrewTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку выполняется сервером (ORDER BY), без прокси
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
 
     def add_form_rows(self):
         self.aircraft_combo = QComboBox()
@@ -74,17 +70,7 @@ class CrewTab(BaseTab):
         self.add_form_layout.addRow("Самолет:", self.aircraft_combo)
 
     def refresh_aircraft_combo(self):
-        self.aircraft_combo.clear()
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(self.tables["aircraft"].select().order_by(self.tables["aircraft"].c.model))
-                for row in result:
-                    self.aircraft_combo.addItem(
-                        f"{row.model} (ID: {row.aircraft_id}, Мест: {row.seats_amount})",
-                        row.aircraft_id
-                    )
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Ошибка загрузки самолетов", str(e))
+        self.load_combo(self.aircraft_combo)
 
     def add_crew(self):
         if self.current_mode != AppMode.ADD:
@@ -101,7 +87,7 @@ class CrewTab(BaseTab):
                 conn.execute(insert(self.tables["crew"]).values(
                     aircraft_id=aircraft_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
             self.window().refresh_combos()
         except IntegrityError as e:
@@ -141,7 +127,7 @@ class CrewTab(BaseTab):
                 conn.execute(delete(self.tables["crew"]).where(
                     self.tables["crew"].c.crew_id == crew_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))
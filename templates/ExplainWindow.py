@@ -0,0 +1,169 @@
+# ===== PySide6 =====
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QBrush, QColor
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel,
+    QPushButton, QCheckBox, QTreeWidget, QTreeWidgetItem,
+    QHeaderView, QTextEdit, QProgressBar
+)
+
+# ===== Files =====
+from db.config import PROFILE_REPORTING
+from db.execution import QueryGuard, is_cancelled
+from db.explain import run_explain, explain_sql
+from db.workers import TaskRunner
+
+
+# Полупрозрачная подсветка читается и в светлой, и в темной теме
+_SEQ_SCAN_BRUSH = QBrush(QColor(220, 50, 50, 70))
+_ESTIMATE_BRUSH = QBrush(QColor(240, 160, 0, 70))
+
+_COLUMNS = [
+    "Узел", "Таблица / индекс", "Время, мс", "Собств. время, мс",
+    "Строк (факт)", "Строк (план)", "Циклы", "Буферы hit / read",
+]
+
+
+def _ms(value) -> str:
+    return "—" if value is None else f"{value:.2f}"
+
+
+# -------------------------------
+# Окно плана запроса фильтрации
+# -------------------------------
+class ExplainWindow(QDialog):
+    def __init__(self, engine, query, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.query = query
+        self.setWindowTitle("План запроса (EXPLAIN)")
+        self.setMinimumSize(900, 500)
+
+        self.guard = QueryGuard(engine, profile=PROFILE_REPORTING)
+        self.runner = TaskRunner(self)
+
+        layout = QVBoxLayout(self)
+
+        sql_edit = QTextEdit()
+        sql_edit.setReadOnly(True)
+        sql_edit.setMaximumHeight(90)
+        sql_edit.setPlainText(explain_sql(engine, query))
+        layout.addWidget(sql_edit)
+
+        controls = QHBoxLayout()
+        self.analyze_cb = QCheckBox("ANALYZE (выполнить запрос)")
+        self.analyze_cb.setChecked(True)
+        self.run_btn = QPushButton("Обновить")
+        self.run_btn.clicked.connect(self.run)
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.clicked.connect(self.cancel)
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setTextVisible(False)
+        self.busy_bar.setMaximumHeight(4)
+        controls.addWidget(self.analyze_cb)
+        controls.addWidget(self.run_btn)
+        controls.addWidget(self.cancel_btn)
+        controls.addWidget(self.busy_bar, 1)
+        layout.addLayout(controls)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(_COLUMNS)
+        self.tree.header().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        layout.addWidget(self.tree)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.warnings_label = QLabel()
+        self.warnings_label.setWordWrap(True)
+        layout.addWidget(self.warnings_label)
+
+        self.runner.busy_changed.connect(self._set_busy)
+        self._set_busy(False)
+
+        if engine.dialect.name != 'postgresql':
+            self.summary_label.setText("EXPLAIN доступен только для PostgreSQL")
+            self.run_btn.setEnabled(False)
+            self.analyze_cb.setEnabled(False)
+        else:
+            self.run()
+
+    def _set_busy(self, busy):
+        self.busy_bar.setVisible(busy)
+        self.cancel_btn.setEnabled(busy)
+        self.run_btn.setEnabled(not busy)
+
+    def run(self):
+        self.tree.clear()
+        self.summary_label.setText("Выполняется EXPLAIN...")
+        self.warnings_label.clear()
+        self.runner.submit(
+            "explain", run_explain, self.guard, self.query, self.analyze_cb.isChecked(),
+            on_done=self._show_plan,
+            on_error=self._show_error,
+        )
+
+    def cancel(self):
+        self.guard.cancel()
+
+    def _show_error(self, e):
+        if is_cancelled(e):
+            self.summary_label.setText("EXPLAIN прерван (отмена или statement_timeout)")
+        else:
+            self.summary_label.setText(f"Ошибка EXPLAIN: {e}")
+
+    def _show_plan(self, result):
+        self.tree.clear()
+        root_item = self._add_node(self.tree, result.root)
+        self.tree.expandAll()
+        self.tree.scrollToItem(root_item)
+
+        if result.analyzed:
+            self.summary_label.setText(
+                f"Планирование: {_ms(result.planning_ms)} мс, выполнение: {_ms(result.execution_ms)} мс"
+            )
+        else:
+            self.summary_label.setText(
+                f"Только оценки планировщика (без ANALYZE), стоимость: {result.root.details.get('Total Cost', '—')}"
+            )
+
+        warnings = result.warnings
+        self.warnings_label.setText(
+            "Замечания:\n" + "\n".join(f"• {w}" for w in warnings) if warnings else "Замечаний нет"
+        )
+
+    def _add_node(self, parent, node):
+        target = node.relation or ""
+        if node.index:
+            target = f"{target} ({node.index})" if target else node.index
+        actual = "—" if node.actual_rows is None else str(int(node.actual_rows))
+        buffers = f"{node.shared_hit} / {node.shared_read}" if node.shared_hit or node.shared_read else ""
+
+        item = QTreeWidgetItem(parent, [
+            node.node_type, target, _ms(node.total_ms), _ms(node.self_ms),
+            actual, str(int(node.plan_rows)), str(node.loops), buffers,
+        ])
+        for col in (2, 3, 4, 5, 6):
+            item.setTextAlignment(col, Qt.AlignRight | Qt.AlignVCenter)
+
+        details = "\n".join(f"{k}: {v}" for k, v in node.details.items())
+        tooltip = "\n\n".join(part for part in ("\n".join(node.warnings), details) if part)
+        for col in range(len(_COLUMNS)):
+            item.setToolTip(col, tooltip)
+        if node.large_seq_scan:
+            for col in range(len(_COLUMNS)):
+                item.setBackground(col, _SEQ_SCAN_BRUSH)
+        if node.bad_estimate:
+            # Строки факт / план
+            item.setBackground(4, _ESTIMATE_BRUSH)
+            item.setBackground(5, _ESTIMATE_BRUSH)
+
+        for child in node.children:
+            self._add_node(item, child)
+        return item
+
+    def closeEvent(self, event):
+        # Незавершенный EXPLAIN ANALYZE прерывается вместе с окном
+        self.runner.cancel()
+        self.guard.cancel()
+        super().closeEvent(event)
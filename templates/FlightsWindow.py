@@ -2,7 +2,7 @@
 from datetime import date, time
 
 # ===== PySide6 =====
-from PySide6.QtCore import QDate, QTime, QSortFilterProxyModel, Qt
+from PySide6.QtCore import QDate, QTime
 from PySide6.QtWidgets import (
     QLineEdit, QMessageBox, QSpinBox,
     QDateEdit, QComboBox, QTableView,
@@ -31,7 +31,16 @@ class FlightsTab(BaseTab):
         super().__init__(engine, tables, parent)
         self.table = "flights"
 
-        self.model = SATableModel(engine, self.tables["flights"], self)
+        aircraft = self.tables["aircraft"]
+        self.register_combo(
+            self.aircraft_combo, "aircraft",
+            aircraft.select().order_by(aircraft.c.model), aircraft.c.aircraft_id,
+            lambda row: f"{row.model} (ID: {row.aircraft_id})",
+            "Ошибка загрузки самолетов"
+        )
+
+        self.model = SATableModel(engine, self.tables["flights"], self, streaming=True)
+        self.track_busy(self.model.runner)
         self.update_model()
 
         self.add_record_btn.clicked.connect(self.add_flight)
@@ -50,25 +59,13 @@ class FlightsTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку выполняется сервером (ORDER BY), без прокси
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
 
     def add_form_rows(self):
         self.aircraft_combo = QComboBox()
@@ -100,14 +97,7 @@ class FlightsTab(BaseTab):
         self.add_form_layout.addRow("Время полета:", self.flight_time_edit)
 
     def refresh_aircraft_combo(self):
-        self.aircraft_combo.clear()
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(self.tables["aircraft"].select().order_by(self.tables["aircraft"].c.model))
-                for row in result:
-                    self.aircraft_combo.addItem(f"{row.model} (ID: {row.aircraft_id})", row.aircraft_id)
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Ошибка загрузки самолетов", str(e))
+        self.load_combo(self.aircraft_combo)
 
     def _qdate_to_pydate(self, qd: QDate) -> date:
         return date(qd.year(), qd.month(), qd.day())
@@ -152,7 +142,7 @@ class FlightsTab(BaseTab):
                     arrival_airport=arrival_airport,
                     flight_time=flight_time
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
             self.window().refresh_combos()
         except IntegrityError as e:
@@ -175,7 +165,7 @@ class FlightsTab(BaseTab):
                 conn.execute(delete(self.tables["flights"]).where(
                     self.tables["flights"].c.flight_id == flight_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))
@@ -0,0 +1,141 @@
+# ===== Base =====
+from datetime import datetime
+
+# ===== PySide6 =====
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QSplitter, QMessageBox
+)
+
+# ===== Files =====
+from db.history import query_history
+
+
+_SHAPE_COLUMNS = ["Запрос", "Вкладки", "Запусков", "Ошибок", "p50, мс", "p95, мс", "Макс., мс", "Строк в ср.", "Последний"]
+_ENTRY_COLUMNS = ["Время", "Вкладка", "Тип", "Длительность, мс", "Строк", "Параметры", "Ошибка"]
+
+
+def _ms(value, empty: str = "—") -> str:
+    return empty if value is None else f"{value:.1f}"
+
+
+def _ts(value) -> str:
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _cell(value: str, right: bool = False) -> QTableWidgetItem:
+    item = QTableWidgetItem(value)
+    item.setToolTip(value)
+    if right:
+        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+    return item
+
+
+# -------------------------------
+# Окно истории запросов
+# -------------------------------
+class HistoryWindow(QDialog):
+    """Формы запросов с p50/p95 и их последние запуски; rerun(entry) повторяет запуск"""
+
+    def __init__(self, rerun, parent=None):
+        super().__init__(parent)
+        self.rerun = rerun
+        self.stats = []
+        self.entries = []
+        self.setWindowTitle("История запросов")
+        self.setMinimumSize(1000, 600)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"Файл истории: {query_history.path}"))
+
+        splitter = QSplitter(Qt.Vertical)
+        self.shapes_table = QTableWidget(0, len(_SHAPE_COLUMNS))
+        self.shapes_table.setHorizontalHeaderLabels(_SHAPE_COLUMNS)
+        self.shapes_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.shapes_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.shapes_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.shapes_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.shapes_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.shapes_table.itemSelectionChanged.connect(self.load_entries)
+        splitter.addWidget(self.shapes_table)
+
+        self.entries_table = QTableWidget(0, len(_ENTRY_COLUMNS))
+        self.entries_table.setHorizontalHeaderLabels(_ENTRY_COLUMNS)
+        self.entries_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.entries_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.entries_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.entries_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.entries_table.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.Stretch)
+        self.entries_table.doubleClicked.connect(self.rerun_selected)
+        splitter.addWidget(self.entries_table)
+        layout.addWidget(splitter)
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.clicked.connect(self.refresh)
+        self.rerun_btn = QPushButton("Повторить")
+        self.rerun_btn.clicked.connect(self.rerun_selected)
+        clear_btn = QPushButton("Очистить историю")
+        clear_btn.clicked.connect(self.clear_history)
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.close)
+        buttons.addWidget(refresh_btn)
+        buttons.addWidget(self.rerun_btn)
+        buttons.addWidget(clear_btn)
+        buttons.addStretch()
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        self.stats = query_history.shape_stats()
+        self.shapes_table.setRowCount(len(self.stats))
+        for row, s in enumerate(self.stats):
+            avg_rows = "—" if s.avg_rows is None else f"{s.avg_rows:.0f}"
+            values = [
+                (s.shape, False), (s.tabs, False), (str(s.runs), True), (str(s.errors), True),
+                (_ms(s.p50_ms), True), (_ms(s.p95_ms), True), (_ms(s.max_ms), True),
+                (avg_rows, True), (_ts(s.last_ts), False),
+            ]
+            for col, (value, right) in enumerate(values):
+                self.shapes_table.setItem(row, col, _cell(value, right))
+        if self.stats:
+            self.shapes_table.selectRow(0)
+        else:
+            self.load_entries()
+
+    def load_entries(self):
+        row = self.shapes_table.currentRow()
+        shape = self.stats[row].shape if 0 <= row < len(self.stats) else None
+        self.entries = query_history.entries(shape) if shape is not None else []
+        self.entries_table.setRowCount(len(self.entries))
+        for row, e in enumerate(self.entries):
+            values = [
+                (_ts(e.ts), False), (e.tab, False), (e.kind, False), (_ms(e.duration_ms, "кэш"), True),
+                ("—" if e.rows is None else str(e.rows), True),
+                (", ".join(map(str, e.params)), False), (e.error or "", False),
+            ]
+            for col, (value, right) in enumerate(values):
+                self.entries_table.setItem(row, col, _cell(value, right))
+        self.rerun_btn.setEnabled(bool(self.entries))
+
+    def rerun_selected(self):
+        row = self.entries_table.currentRow()
+        if not 0 <= row < len(self.entries):
+            row = 0 if self.entries else -1
+        if row < 0:
+            return
+        entry = self.entries[row]
+        if entry.sql is None:
+            QMessageBox.warning(self, "История запросов", "Этот запрос нельзя повторить: параметры не записываются литералами.")
+            return
+        self.rerun(entry)
+
+    def clear_history(self):
+        reply = QMessageBox.question(self, "История запросов", "Удалить всю историю запросов?")
+        if reply == QMessageBox.Yes:
+            query_history.clear()
+            self.refresh()
@@ -0,0 +1,174 @@
+# ===== PySide6 =====
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel,
+    QPushButton, QTableWidget, QTableWidgetItem,
+    QHeaderView, QProgressBar, QAbstractItemView
+)
+
+# ===== Files =====
+from db.advisor import usage_log, suggest_indexes, create_index
+from db.workers import TaskRunner
+
+
+_SUGGESTION_COLUMNS = ["Создать", "Таблица", "Столбец", "Оценка", "Обоснование", "SQL"]
+_USAGE_COLUMNS = ["Таблица", "Столбец", "Части запроса", "Запусков", "Среднее, мс", "Макс., мс"]
+
+
+# -------------------------------
+# Окно советов по индексам
+# -------------------------------
+class IndexAdvisorWindow(QDialog):
+    def __init__(self, engine, tables, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.tables = tables
+        self.suggestions = []
+        # Итог создания индексов показывается после обновления списка
+        self._created_message = ""
+        self.setWindowTitle("Советы по индексам")
+        self.setMinimumSize(950, 550)
+
+        self.runner = TaskRunner(self)
+
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel("Предлагаемые индексы:"))
+        self.suggestions_table = QTableWidget(0, len(_SUGGESTION_COLUMNS))
+        self.suggestions_table.setHorizontalHeaderLabels(_SUGGESTION_COLUMNS)
+        self.suggestions_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.suggestions_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.suggestions_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.suggestions_table, 2)
+
+        layout.addWidget(QLabel("Столбцы в фильтрах за сеанс:"))
+        self.usage_table = QTableWidget(0, len(_USAGE_COLUMNS))
+        self.usage_table.setHorizontalHeaderLabels(_USAGE_COLUMNS)
+        self.usage_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.usage_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        layout.addWidget(self.usage_table, 1)
+
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        buttons = QHBoxLayout()
+        self.refresh_btn = QPushButton("Обновить")
+        self.refresh_btn.clicked.connect(self.refresh)
+        self.apply_btn = QPushButton("Создать выбранные")
+        self.apply_btn.clicked.connect(self.apply_selected)
+        self.clear_btn = QPushButton("Сбросить статистику")
+        self.clear_btn.clicked.connect(self.clear_usage)
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.close)
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setTextVisible(False)
+        self.busy_bar.setMaximumHeight(4)
+        buttons.addWidget(self.refresh_btn)
+        buttons.addWidget(self.apply_btn)
+        buttons.addWidget(self.clear_btn)
+        buttons.addWidget(self.busy_bar, 1)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.runner.busy_changed.connect(self._set_busy)
+        self._set_busy(False)
+        self.refresh()
+
+    def _set_busy(self, busy):
+        self.busy_bar.setVisible(busy)
+        self.refresh_btn.setEnabled(not busy)
+        self.apply_btn.setEnabled(not busy)
+
+    # ----- Загрузка -----
+    def refresh(self):
+        usage = usage_log.snapshot()
+        self._show_usage(usage)
+        self.status_label.setText("Анализ статистики...")
+        self.runner.submit(
+            "suggest", suggest_indexes, self.engine, self.tables, usage,
+            on_done=self._show_suggestions,
+            on_error=lambda e: self.status_label.setText(f"Ошибка анализа: {e}"),
+        )
+
+    def clear_usage(self):
+        usage_log.clear()
+        self.refresh()
+
+    def _show_usage(self, usage):
+        usage = sorted(usage, key=lambda u: -u.runs)
+        self.usage_table.setRowCount(len(usage))
+        for row, item in enumerate(usage):
+            clauses = ", ".join(f"{clause} ×{n}" for clause, n in sorted(item.counts.items()))
+            avg = "—" if item.avg_ms is None else f"{item.avg_ms:.0f}"
+            peak = "—" if not item.timed_runs else f"{item.max_ms:.0f}"
+            for col, value in enumerate([item.table, item.column, clauses, str(item.runs), avg, peak]):
+                cell = QTableWidgetItem(value)
+                if col >= 3:
+                    cell.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.usage_table.setItem(row, col, cell)
+
+    def _show_suggestions(self, suggestions):
+        self.suggestions = suggestions
+        self.suggestions_table.setRowCount(len(suggestions))
+        for row, suggestion in enumerate(suggestions):
+            check = QTableWidgetItem()
+            check.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
+            check.setCheckState(Qt.Checked)
+            self.suggestions_table.setItem(row, 0, check)
+            reasons = "; ".join(suggestion.reasons)
+            values = [suggestion.table, suggestion.column, f"{suggestion.score:.0f}", reasons, suggestion.sql]
+            for col, value in enumerate(values, start=1):
+                cell = QTableWidgetItem(value)
+                cell.setToolTip(value)
+                if col == 3:
+                    cell.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.suggestions_table.setItem(row, col, cell)
+
+        if not suggestions:
+            self.status_label.setText("Предложений нет: внешние ключи и часто используемые столбцы уже проиндексированы")
+        elif self.engine.dialect.name != 'postgresql':
+            self.status_label.setText("Статистика pg_stat_user_tables доступна только в PostgreSQL — "
+                                      "советы основаны на внешних ключах и фильтрах")
+        else:
+            self.status_label.setText(f"Предложено индексов: {len(suggestions)}")
+        if self._created_message:
+            self.status_label.setText(self._created_message + "\n" + self.status_label.text())
+            self._created_message = ""
+
+    # ----- Создание -----
+    def apply_selected(self):
+        selected = [
+            suggestion for row, suggestion in enumerate(self.suggestions)
+            if self.suggestions_table.item(row, 0).checkState() == Qt.Checked
+        ]
+        if not selected:
+            return
+        # CONCURRENTLY ждет завершения транзакций, в том числе курсоров вкладок
+        tab = self.parent()
+        if hasattr(tab, "release_streams"):
+            tab.release_streams()
+        self.status_label.setText("Создание индексов (CONCURRENTLY — запись в таблицы не блокируется)...")
+        self.runner.submit(
+            "apply", self._create_indexes, selected,
+            on_done=self._on_created,
+            on_error=lambda e: self.status_label.setText(f"Ошибка: {e}"),
+        )
+
+    def _create_indexes(self, suggestions):
+        # Поток пула: индексы строятся по одному
+        return [(s.name, create_index(self.engine, s)) for s in suggestions]
+
+    def _on_created(self, results):
+        created = [name for name, ok in results if ok]
+        failed = [name for name, ok in results if not ok]
+        message = f"Создано: {', '.join(created) or '—'}"
+        if failed:
+            message += f"\nНе удалось (см. консоль): {', '.join(failed)}"
+        self._created_message = message
+        self.refresh()
+
+    def closeEvent(self, event):
+        self.runner.cancel()
+        super().closeEvent(event)
@@ -1,9 +1,11 @@
 # ===== Base =====
+import time
 from typing import Optional, Dict
 
 # ===== PySide6 =====
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QTabWidget, QHBoxLayout, QWidget, QPushButton, QVBoxLayout
+    QApplication, QMainWindow, QTabWidget, QHBoxLayout, QWidget, QPushButton, QVBoxLayout, QMessageBox
 )
 
 # ===== SQLAlchemy =====
@@ -13,10 +15,20 @@ from sqlalchemy import (
 from sqlalchemy.engine import Engine
 
 # ===== Files =====
+from db.aio import stop_async_bridge
+from db.history import KIND_FILTER
+from db.matviews import MatViewScheduler, matviews, watch_sources
+from db.notify import ChangeListener
+from db.pool import warm_pool
+from db.reflection import prefetch, reflection_cache, watch_ddl
+from db.replica import replica_router, stop_replica_routing
+from db.result_cache import affected_tables, result_cache, watch_writes
+from db.workers import DB_THREADS, TaskRunner
 from templates.AircraftWindow import AircraftTab
 from templates.CrewMemberWindow import CrewMembersTab
 from templates.CrewWindow import CrewTab
 from templates.FlightsWindow import FlightsTab
+from templates.HistoryWindow import HistoryWindow
 from templates.PassangersWindow import PassengersTab
 from templates.SetupWindow import SetupTab
 from templates.TicketsWindow import TicketsTab
@@ -27,7 +39,21 @@ from styles import switch_theme, get_current_theme
 # -------------------------------
 # Главное окно
 # -------------------------------
+# Вкладки данных в порядке показа: атрибут окна, класс, таблица, заголовок
+_DATA_TABS = [
+    ("aircraft_tab", AircraftTab, "aircraft", "Самолеты"),
+    ("flights_tab", FlightsTab, "flights", "Рейсы"),
+    ("passengers_tab", PassengersTab, "passengers", "Пассажиры"),
+    ("tickets_tab", TicketsTab, "tickets", "Билеты"),
+    ("crew_tab", CrewTab, "crew", "Экипажи"),
+    ("crew_members_tab", CrewMembersTab, "crew_member", "Члены экипажа"),
+]
+
+
 class MainWindow(QMainWindow):
+    # Ход подключения и прогрева сессии (показывается в логе SetupTab)
+    status = Signal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Airport Database Management System")
@@ -41,6 +67,13 @@ class MainWindow(QMainWindow):
         self.md: Optional[MetaData] = None
         self.tables: Optional[Dict[str, Table]] = None
         self.current_mode: AppMode = AppMode.SETUP
+        self.change_listener: Optional[ChangeListener] = None
+        self.matview_scheduler: Optional[MatViewScheduler] = None
+
+        # Фоновое чтение метаданных вкладок и прогрев пула при подключении
+        self.runner = TaskRunner(self)
+        self._warmup_started = 0.0
+        self._warmup_left = 0
 
         self.tabs = QTabWidget()
         self.tabs.setMovable(True)
@@ -63,6 +96,7 @@ class MainWindow(QMainWindow):
         self.read_btn = QPushButton("Читать данные")
         self.edit_btn = QPushButton("Редактировать данные")
         self.add_btn = QPushButton("Добавить данные")
+        self.history_btn = QPushButton("История запросов")
         self.theme_btn = QPushButton("Светлая тема")
 
         layout.addWidget(self.read_btn)
@@ -70,6 +104,7 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.add_btn)
 
         layout.addStretch()
+        layout.addWidget(self.history_btn)
         layout.addWidget(self.theme_btn)
 
         self.connect_mode_panel()
@@ -84,6 +119,7 @@ class MainWindow(QMainWindow):
         self.edit_btn.clicked.connect(lambda: self.set_mode(AppMode.EDIT))
         self.add_btn.clicked.connect(lambda: self.set_mode(AppMode.ADD))
         self.theme_btn.clicked.connect(self.toggle_theme)
+        self.history_btn.clicked.connect(self.open_history)
 
     def toggle_theme(self):
         current = get_current_theme()
@@ -114,53 +150,183 @@ class MainWindow(QMainWindow):
         self.read_btn.setEnabled(is_connected)
         self.edit_btn.setEnabled(is_connected)
         self.add_btn.setEnabled(is_connected)
+        self.history_btn.setEnabled(is_connected)
+
+    def open_history(self):
+        window = HistoryWindow(self.rerun_history_entry, self)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.show()
+
+    def rerun_history_entry(self, entry):
+        """Повторяет запрос из истории на его вкладке"""
+        tabs = [
+            self.aircraft_tab, self.flights_tab, self.passengers_tab,
+            self.tickets_tab, self.crew_tab, self.crew_members_tab
+        ]
+        tab = next((t for t in tabs if t is not None and t.table == entry.tab), None)
+        if tab is None:
+            QMessageBox.warning(self, "История запросов", f"Вкладка {entry.tab} недоступна")
+            return
+        self.tabs.setCurrentWidget(tab)
+        if entry.kind == KIND_FILTER:
+            if self.current_mode != AppMode.READ:
+                self.set_mode(AppMode.READ)
+            tab.execute_sql_query(entry.sql)
+            return
+        # Произвольный SQL может изменять данные и схему — только с подтверждением
+        reply = QMessageBox.question(self, "История запросов", f"Выполнить запрос повторно?\n\n{entry.sql}")
+        if reply == QMessageBox.Yes:
+            # Запрос может оказаться DDL — потоковые курсоры не должны его блокировать
+            tab.release_streams()
+            tab.execute_sql(entry.sql)
+
+    def _matview_failed(self, name: str, error):
+        failure = matviews.failure(self.engine, name)
+        if failure is not None and failure.retry_at is None:
+            self.status.emit(f"Представление {name} не обновлено {failure.count} раз подряд, "
+                             f"автоматическое обновление остановлено: {failure.error}")
+        else:
+            self.status.emit(f"Представление {name} не обновлено: {failure.error if failure else error}")
 
     def attach_engine(self, engine: Engine, md: MetaData, tables: Dict[str, Table]):
         self.engine = engine
         self.md = md
         self.tables = tables
+        # Кэш результатов фильтрации сбрасывается при записи в таблицы
+        watch_writes(engine, tables)
+        # Снимок каталога для диалогов фильтрации сбрасывается после DDL
+        watch_ddl(engine)
+        # Материализованные представления отчетов обновляются после записей и по расписанию
+        watch_sources(engine, tables)
+        self.matview_scheduler = MatViewScheduler(engine, parent=self)
+        self.matview_scheduler.failed.connect(self._matview_failed)
+        self.matview_scheduler.start()
         print(f"Engine attached: {engine}")
         self.update_mode_buttons_state()
         self.ensure_data_tabs()
 
     def ensure_data_tabs(self):
+        """Создает недостающие вкладки данных по мере чтения их метаданных в фоне
+
+        Структура таблиц, каталог для диалогов фильтрации и соединения пула
+        читаются и открываются в пуле потоков; вкладка появляется, как только
+        прочитана ее таблица, окно при этом не блокируется.
+        """
         if self.engine is None or self.tables is None:
             print("No engine or tables available")
             return
 
-        print("Creating data tabs...")
-
-        if self.aircraft_tab is None:
-            self.aircraft_tab = AircraftTab(self.engine, self.tables)
-            self.tabs.addTab(self.aircraft_tab, "Самолеты")
-            print("Aircraft tab created")
-
-        if self.flights_tab is None:
-            self.flights_tab = FlightsTab(self.engine, self.tables)
-            self.tabs.addTab(self.flights_tab, "Рейсы")
-            print("Flights tab created")
-
-        if self.passengers_tab is None:
-            self.passengers_tab = PassengersTab(self.engine, self.tables)
-            self.tabs.addTab(self.passengers_tab, "Пассажиры")
-            print("Passengers tab created")
-
-        if self.tickets_tab is None:
-            self.tickets_tab = TicketsTab(self.engine, self.tables)
-            self.tabs.addTab(self.tickets_tab, "Билеты")
-            print("Tickets tab created")
+        missing = [spec for spec in _DATA_TABS if getattr(self, spec[0]) is None]
+        if not missing:
+            return
+        self._warmup_started = time.monotonic()
+        self._warmup_left = len(missing)
+        self.status.emit(f"Чтение структуры таблиц: {', '.join(spec[2] for spec in missing)}...")
+        for spec in missing:
+            self.runner.submit(
+                ("tab", spec[0]), prefetch, self.engine, spec[2],
+                on_done=lambda _, spec=spec: self.add_data_tab(spec),
+                on_error=lambda e, spec=spec: self._data_tab_failed(spec, e),
+            )
+
+        engine = self.engine
+        self.runner.submit(
+            "catalog", reflection_cache.catalog, engine,
+            on_done=lambda snapshot: self.status.emit(f"Каталог схемы прочитан: {len(snapshot.tables)} таблиц."),
+            on_error=lambda e: self.status.emit(f"Каталог схемы не прочитан: {e}"),
+        )
+        # Соединения для фоновых потоков открываются заранее, пока пользователь смотрит на вкладки
+        size = engine.pool.size() if hasattr(engine.pool, "size") else 0
+        if size:
+            self.runner.submit(
+                "warm_pool", warm_pool, engine, min(size, DB_THREADS),
+                on_done=lambda n: self.status.emit(f"Пул соединений прогрет: {n} соединений."),
+                on_error=lambda e: self.status.emit(f"Прогрев пула не удался: {e}"),
+            )
+
+    def add_data_tab(self, spec):
+        attr, tab_class, table_name, title = spec
+        if self.engine is None or getattr(self, attr) is not None:
+            return
+        tab = tab_class(self.engine, self.tables)
+        setattr(self, attr, tab)
+
+        # Место вкладки — после уже созданных вкладок, идущих раньше нее
+        index = self.tabs.indexOf(self.setup_tab) + 1
+        for other_attr, _, _, _ in _DATA_TABS:
+            if other_attr == attr:
+                break
+            other = getattr(self, other_attr)
+            if other is not None:
+                index = max(index, self.tabs.indexOf(other) + 1)
+        self.tabs.insertTab(index, tab, title)
+
+        if hasattr(tab, 'set_mode'):
+            tab.set_mode(self.current_mode)
+        tab.refresh_combos()
+        print(f"{title} tab created")
+        self._data_tab_finished()
+
+    def _data_tab_failed(self, spec, error):
+        self.status.emit(f"Вкладка «{spec[3]}» не создана: {error}")
+        self._data_tab_finished()
+
+    def _data_tab_finished(self):
+        self._warmup_left -= 1
+        if self._warmup_left == 0:
+            elapsed = (time.monotonic() - self._warmup_started) * 1000
+            self.status.emit(f"Вкладки данных готовы за {elapsed:.0f} мс.")
+
+    def refresh_combos(self):
+        tabs = [
+            self.aircraft_tab, self.flights_tab, self.passengers_tab,
+            self.tickets_tab, self.crew_tab, self.crew_members_tab
+        ]
 
-        if self.crew_tab is None:
-            self.crew_tab = CrewTab(self.engine, self.tables)
-            self.tabs.addTab(self.crew_tab, "Экипажи")
-            print("Crew tab created")
+        for tab in tabs:
+            if tab:
+                tab.refresh_combos()
+
+    def start_change_listener(self) -> bool:
+        """Подписывается на уведомления об изменениях строк (LISTEN/NOTIFY)"""
+        if self.engine is None or self.change_listener is not None:
+            return False
+        listener = ChangeListener(self.engine, self)
+        if not listener.start():
+            listener.deleteLater()
+            return False
+        listener.changed.connect(self.on_db_changed)
+        self.change_listener = listener
+        return True
+
+    def stop_change_listener(self):
+        if self.change_listener is not None:
+            self.change_listener.stop()
+            self.change_listener.deleteLater()
+            self.change_listener = None
+
+    def on_db_changed(self, table_name: str, pks):
+        """Точечно обновляет модель вкладки и списки по ключам из ленты изменений"""
+        affected = affected_tables(table_name, self.tables)
+        result_cache.invalidate(self.engine, affected)
+        matviews.mark_dirty(self.engine, affected)
+        # Изменение другого клиента реплика может еще не воспроизвести.
+        # Позиция WAL читается с основного сервера — в пуле, не в GUI-потоке
+        router = replica_router()
+        if router is not None:
+            self.runner.submit(("note_write", table_name), router.note_write, affected)
 
-        if self.crew_members_tab is None:
-            self.crew_members_tab = CrewMembersTab(self.engine, self.tables)
-            self.tabs.addTab(self.crew_members_tab, "Члены экипажа")
-            print("Crew members tab created")
+        tabs = [
+            self.aircraft_tab, self.flights_tab, self.passengers_tab,
+            self.tickets_tab, self.crew_tab, self.crew_members_tab
+        ]
 
-        self.refresh_all_tabs()
+        for tab in tabs:
+            if tab is None:
+                continue
+            if tab.table == table_name and hasattr(tab, 'model'):
+                tab.model.apply_changes(pks)
+            tab.update_combo_keys(table_name, pks)
 
     def refresh_all_models(self):
         tabs = [
@@ -170,9 +336,20 @@ class MainWindow(QMainWindow):
 
         for tab in tabs:
             if tab and hasattr(tab, 'model'):
-                tab.model.refresh()
+                tab.model.refresh_async()
                 print(f"Refreshed model for {tab.__class__.__name__}")
 
+    def release_streams(self):
+        """Закрывает курсоры потокового режима перед DDL (см. SATableModel.release_stream)"""
+        tabs = [
+            self.aircraft_tab, self.flights_tab, self.passengers_tab,
+            self.tickets_tab, self.crew_tab, self.crew_members_tab
+        ]
+
+        for tab in tabs:
+            if tab and hasattr(tab, 'model'):
+                tab.model.release_stream()
+
     def refresh_all_tabs(self):
         tabs = [
             self.aircraft_tab, self.flights_tab, self.passengers_tab,
@@ -184,6 +361,15 @@ class MainWindow(QMainWindow):
                 tab.set_mode(self.current_mode)
 
     def disconnect_db(self):
+        # Метаданные, прочитанные после отключения, уже не нужны
+        self.runner.cancel()
+        self._warmup_left = 0
+        self.stop_change_listener()
+        if self.matview_scheduler is not None:
+            self.matview_scheduler.stop()
+            self.matview_scheduler.deleteLater()
+            self.matview_scheduler = None
+
         tabs_to_remove = [
             self.aircraft_tab, self.flights_tab, self.passengers_tab,
             self.tickets_tab, self.crew_tab, self.crew_members_tab
@@ -191,6 +377,9 @@ class MainWindow(QMainWindow):
 
         for tab in tabs_to_remove:
             if tab is not None:
+                if hasattr(tab, 'model'):
+                    tab.model.close()
+                tab.result_model.close()
                 idx = self.tabs.indexOf(tab)
                 if idx != -1:
                     self.tabs.removeTab(idx)
@@ -204,6 +393,11 @@ class MainWindow(QMainWindow):
         self.crew_members_tab = None
 
         if self.engine is not None:
+            reflection_cache.invalidate(self.engine)
+            result_cache.invalidate(self.engine)
+            matviews.forget(self.engine)
+            stop_async_bridge()
+            stop_replica_routing()
             self.engine.dispose()
         self.engine = None
         self.md = None
@@ -0,0 +1,140 @@
+# ===== Base =====
+import time
+
+# ===== PySide6 =====
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QMessageBox
+)
+
+# ===== Files =====
+from db.matviews import matviews
+from db.workers import TaskRunner
+
+
+_COLUMNS = ["Представление", "Таблицы", "Обновление", "Обновлено", "Состояние"]
+
+
+def _mode(view) -> str:
+    parts = []
+    if view.on_write:
+        parts.append("после изменений")
+    if view.interval:
+        parts.append(f"каждые {view.interval // 60} мин")
+    return ", ".join(parts) or "вручную"
+
+
+def _failure_state(failure, now: float) -> str:
+    if failure.retry_at is None:
+        return f"ошибка обновления ({failure.count} подряд), только вручную"
+    return f"ошибка обновления ({failure.count}), повтор через {max(0, int(failure.retry_at - now))} с"
+
+
+# -------------------------------
+# Окно материализованных представлений отчетов
+# -------------------------------
+class MatViewsWindow(QDialog):
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.views = []
+        self.setWindowTitle("Материализованные представления")
+        self.setMinimumSize(800, 350)
+
+        self.runner = TaskRunner(self)
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(_COLUMNS))
+        self.table.setHorizontalHeaderLabels(_COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        buttons = QHBoxLayout()
+        self.reload_btn = QPushButton("Перечитать")
+        self.reload_btn.clicked.connect(self.reload)
+        self.refresh_btn = QPushButton("Обновить данные")
+        self.refresh_btn.clicked.connect(self.refresh_selected)
+        self.drop_btn = QPushButton("Удалить")
+        self.drop_btn.clicked.connect(self.drop_selected)
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.close)
+        buttons.addWidget(self.reload_btn)
+        buttons.addWidget(self.refresh_btn)
+        buttons.addWidget(self.drop_btn)
+        buttons.addStretch()
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.runner.busy_changed.connect(self._set_busy)
+        self.show_views()
+        if engine.dialect.name != 'postgresql':
+            self.status_label.setText("Материализованные представления доступны только в PostgreSQL")
+            self.reload_btn.setEnabled(False)
+
+    def _set_busy(self, busy):
+        for btn in (self.refresh_btn, self.drop_btn):
+            btn.setEnabled(not busy)
+        self.reload_btn.setEnabled(not busy and self.engine.dialect.name == 'postgresql')
+
+    def show_views(self):
+        self.views = sorted(matviews.views(self.engine), key=lambda v: v.name)
+        self.table.setRowCount(len(self.views))
+        now = time.monotonic()
+        for row, view in enumerate(self.views):
+            refreshed = matviews.refreshed_at(self.engine, view.name)
+            ago = "—" if refreshed is None else f"{int(now - refreshed)} с назад"
+            state = "ожидает обновления" if matviews.is_dirty(self.engine, view.name) else "актуально"
+            failure = matviews.failure(self.engine, view.name)
+            if failure is not None:
+                state = _failure_state(failure, now)
+            for col, value in enumerate([view.name, ", ".join(sorted(view.tables)), _mode(view), ago, state]):
+                item = QTableWidgetItem(value)
+                item.setToolTip(view.source if col == 0 else value)
+                if col == len(_COLUMNS) - 1 and failure is not None:
+                    item.setToolTip(failure.error)
+                self.table.setItem(row, col, item)
+
+    def _selected(self):
+        row = self.table.currentRow()
+        return self.views[row] if 0 <= row < len(self.views) else None
+
+    def reload(self):
+        self.runner.submit("load", matviews.load, self.engine,
+                           on_done=lambda _: self.show_views(),
+                           on_error=lambda e: self.status_label.setText(f"Ошибка: {e}"))
+
+    def refresh_selected(self):
+        view = self._selected()
+        if view is None:
+            return
+        self.status_label.setText(f"Обновление {view.name}...")
+        self.runner.submit("refresh", matviews.refresh, self.engine, view.name,
+                           on_done=lambda _: self._done(f"{view.name} обновлено"),
+                           on_error=lambda e: self._done(f"Ошибка обновления {view.name}: {e}"))
+
+    def drop_selected(self):
+        view = self._selected()
+        if view is None:
+            return
+        reply = QMessageBox.question(self, "Удаление", f"Удалить представление {view.name}?")
+        if reply != QMessageBox.Yes:
+            return
+        self.runner.submit("drop", matviews.drop, self.engine, view.name,
+                           on_done=lambda _: self._done(f"{view.name} удалено"),
+                           on_error=lambda e: self._done(f"Ошибка удаления {view.name}: {e}"))
+
+    def _done(self, message):
+        self.status_label.setText(message)
+        self.show_views()
+
+    def closeEvent(self, event):
+        self.runner.cancel()
+        super().closeEvent(event)
@@ -1,5 +1,5 @@
 # ===== PySide6 =====
-from PySide6.QtCore import QSortFilterProxyModel, Qt
+from PySide6.QtCore import Qt
 from PySide6.QtWidgets import (
     QMessageBox, QCheckBox, QTableView, QHeaderView
 )
@@ -28,6 +28,7 @@ class PassengersTab(BaseTab):
         self.table = "passengers"
 
         self.model = SATableModel(engine, self.tables["passengers"], self)
+        self.track_busy(self.model.runner)
 
         self.add_record_btn.clicked.connect(self.add_passenger)
         self.clear_form_btn.clicked.connect(self.clear_form)
@@ -45,25 +46,13 @@ class PassengersTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку выполняется сервером (ORDER BY), без прокси
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
 
         self.update_ui_for_mode()
 
@@ -118,7 +107,7 @@ class PassengersTab(BaseTab):
                 conn.execute(insert(self.tables["passengers"]).values(
                     is_dependent=is_dependent
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
             self.window().refresh_combos()
         except IntegrityError as e:
@@ -141,7 +130,7 @@ class PassengersTab(BaseTab):
                 conn.execute(delete(self.tables["passengers"]).where(
                     self.tables["passengers"].c.passenger_id == passenger_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))
@@ -2,26 +2,46 @@
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QFormLayout, QLabel, QLineEdit, QPushButton, QMessageBox,
-    QComboBox, QTextEdit, QGroupBox, QSpacerItem, QSizePolicy
+    QComboBox, QTextEdit, QGroupBox, QSpacerItem, QSizePolicy, QCheckBox, QSpinBox
 )
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont  # Добавляем импорт QFont
 
-# ===== SQLAlchemy =====
-from sqlalchemy.exc import SQLAlchemyError
-
 # ===== Files =====
-from db.config import PgConfig
+from db.config import PgConfig, PROFILE_INTERACTIVE, default_profiles
 from db.session import (
     make_engine
 )
 from db.models import (
     build_metadata, insert_demo_data_sa, drop_and_create_schema_sa
 )
+from db.notify import install_change_triggers
+from db.aio import async_bridge, start_async_bridge, stop_async_bridge
+from db.replica import make_replica_engine, replica_router, start_replica_routing
+from db.pool import PRE_PING_ALWAYS, PRE_PING_IDLE, PRE_PING_NEVER, PING_IDLE_SECONDS, pool_stats
+from db.profiles import profile_settings
+from db.workers import DB_THREADS, TaskRunner
 from templates.modes import AppMode
 
 
+
+def _open_engines(cfg: PgConfig):
+    """Engine основного сервера и реплики (фоновая задача do_connect)
+
+    Ошибка основного сервера — исключение; ошибка реплики возвращается
+    третьим элементом, подключение продолжается без нее.
+    """
+    engine = make_engine(cfg)
+    replica, replica_error = None, None
+    if cfg.replica_dsn:
+        try:
+            replica = make_replica_engine(cfg)
+        except Exception as e:
+            replica_error = e
+    return engine, replica, replica_error
+
+
 # -------------------------------
 # Вкладка «Подключение и схема БД»
 # -------------------------------
@@ -43,6 +63,50 @@ class SetupTab(QWidget):
         self.pw_edit = QLineEdit("12345")
         self.pw_edit.setEchoMode(QLineEdit.Password)
         self.ssl_edit = QLineEdit("prefer")
+        self.listen_cb = QCheckBox("Автообновление (LISTEN/NOTIFY)")
+        self.timeout_edit = QSpinBox()
+        self.timeout_edit.setRange(0, 3600)
+        self.timeout_edit.setValue(30)
+        self.timeout_edit.setSuffix(" с")
+        self.timeout_edit.setSpecialValueText("без ограничения")
+        self.replica_edit = QLineEdit()
+        self.replica_edit.setPlaceholderText("postgresql://host:port/db — чтение с реплики")
+        self.async_cb = QComboBox()
+        self.async_cb.addItem("нет (пул потоков)", "")
+        self.async_cb.addItem("asyncpg", "asyncpg")
+        self.async_cb.addItem("psycopg (v3, async)", "psycopg")
+
+        # Пул соединений
+        defaults = PgConfig()
+        self.pool_size_edit = QSpinBox()
+        self.pool_size_edit.setRange(1, 100)
+        self.pool_size_edit.setValue(defaults.pool_size)
+        self.overflow_edit = QSpinBox()
+        self.overflow_edit.setRange(0, 100)
+        self.overflow_edit.setValue(defaults.max_overflow)
+        self.recycle_edit = QSpinBox()
+        self.recycle_edit.setRange(0, 86400)
+        self.recycle_edit.setValue(defaults.pool_recycle)
+        self.recycle_edit.setSuffix(" с")
+        self.recycle_edit.setSpecialValueText("не пересоздавать")
+        self.pre_ping_cb = QComboBox()
+        self.pre_ping_cb.addItem(f"после простоя > {PING_IDLE_SECONDS} с", PRE_PING_IDLE)
+        self.pre_ping_cb.addItem("при каждой выдаче", PRE_PING_ALWAYS)
+        self.pre_ping_cb.addItem("не проверять", PRE_PING_NEVER)
+        self.pool_timeout_edit = QSpinBox()
+        self.pool_timeout_edit.setRange(1, 600)
+        self.pool_timeout_edit.setValue(defaults.pool_timeout)
+        self.pool_timeout_edit.setSuffix(" с")
+
+        self.pool_stats_label = QLabel("Нет подключения")
+        self.pool_stats_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.pool_timer = QTimer(self)
+        self.pool_timer.setInterval(1000)
+        self.pool_timer.timeout.connect(self.update_pool_stats)
+
+        # Подключение и запуск асинхронного режима — в фоне
+        self.runner = TaskRunner(self)
+        self._status_connected = False
 
         # Кнопки подключения/отключения
         self.connect_btn = QPushButton("Подключиться к БД")
@@ -61,6 +125,10 @@ class SetupTab(QWidget):
         self.demo_btn.setEnabled(False)
         self.demo_btn.clicked.connect(self.add_demo)
 
+        self.triggers_btn = QPushButton("Установить триггеры NOTIFY")
+        self.triggers_btn.setEnabled(False)
+        self.triggers_btn.clicked.connect(self.install_triggers)
+
         # Основной layout
         main_layout = QVBoxLayout(self)
 
@@ -78,12 +146,29 @@ class SetupTab(QWidget):
         conn_form.addRow("User:", self.user_edit)
         conn_form.addRow("Password:", self.pw_edit)
         conn_form.addRow("sslmode:", self.ssl_edit)
+        conn_form.addRow("Тайм-аут запроса вкладок:", self.timeout_edit)
+        conn_form.addRow("Реплика:", self.replica_edit)
+        conn_form.addRow("Асинхронные запросы:", self.async_cb)
+        conn_form.addRow("", self.listen_cb)
 
         conn_box = QGroupBox("Параметры подключения (SQLAlchemy)")
         conn_box.setLayout(conn_form)
         conn_box.setMaximumWidth(600)
 
+        pool_form = QFormLayout()
+        pool_form.addRow("Размер пула:", self.pool_size_edit)
+        pool_form.addRow("Сверх пула (overflow):", self.overflow_edit)
+        pool_form.addRow("Пересоздавать через:", self.recycle_edit)
+        pool_form.addRow("Проверка соединения:", self.pre_ping_cb)
+        pool_form.addRow("Ожидание соединения:", self.pool_timeout_edit)
+        pool_form.addRow(self.pool_stats_label)
+
+        pool_box = QGroupBox("Пул соединений")
+        pool_box.setLayout(pool_form)
+        pool_box.setMaximumWidth(600)
+
         left_layout.addWidget(conn_box)
+        left_layout.addWidget(pool_box)
         left_layout.addStretch()
 
         # Центральная часть - кнопки в GroupBox с рамкой
@@ -102,6 +187,7 @@ class SetupTab(QWidget):
         buttons_layout.addWidget(self.disconnect_btn)
         buttons_layout.addWidget(self.create_btn)
         buttons_layout.addWidget(self.demo_btn)
+        buttons_layout.addWidget(self.triggers_btn)
         buttons_layout.addStretch()  # Растягивающееся пространство между кнопками
 
         # Добавляем GroupBox с кнопками в центральный layout
@@ -122,6 +208,9 @@ class SetupTab(QWidget):
             port = int(self.port_edit.text().strip())
         except ValueError:
             port = 5432
+        # Тайм-аут запроса задается для профиля таблиц вкладок, остальные профили — по умолчанию
+        profiles = default_profiles()
+        profiles[PROFILE_INTERACTIVE].statement_timeout = self.timeout_edit.value()
         return PgConfig(
             host=self.host_edit.text().strip() or "localhost",
             port=port,
@@ -130,6 +219,15 @@ class SetupTab(QWidget):
             password=self.pw_edit.text(),
             sslmode=self.ssl_edit.text().strip() or "prefer",
             driver=self.driver_cb.currentData(),
+            listen_changes=self.listen_cb.isChecked(),
+            replica_dsn=self.replica_edit.text().strip(),
+            async_driver=self.async_cb.currentData(),
+            pool_size=self.pool_size_edit.value(),
+            max_overflow=self.overflow_edit.value(),
+            pool_recycle=self.recycle_edit.value(),
+            pre_ping=self.pre_ping_cb.currentData(),
+            pool_timeout=self.pool_timeout_edit.value(),
+            profiles=profiles,
         )
 
     def do_connect(self):
@@ -139,38 +237,143 @@ class SetupTab(QWidget):
             return
 
         cfg = self.current_cfg()
-        try:
-            engine = make_engine(cfg)
-            md, tables = build_metadata()
-            main.attach_engine(engine, md, tables)
+        # Соединение и проверочный запрос — в фоне: недоступный сервер не замораживает окно
+        self.connect_btn.setEnabled(False)
+        self.log.append(f"Подключение к {cfg.host}:{cfg.port}/{cfg.dbname}...")
+        self.runner.submit(
+            "connect", _open_engines, cfg,
+            on_done=lambda engines: self._on_connected(cfg, *engines),
+            on_error=self._on_connect_failed,
+        )
+
+    def _on_connected(self, cfg: PgConfig, engine, replica, replica_error):
+        main = self.window()
+        md, tables = build_metadata()
+        if not self._status_connected:
+            main.status.connect(self.log.append)
+            self._status_connected = True
+        self.log.append(
+            f"Успешное подключение: {cfg.driver} → {cfg.host}:{cfg.port}/{cfg.dbname} (user={cfg.user})"
+        )
+        if engine.dialect.name == 'postgresql':
+            for name, profile in cfg.profiles.items():
+                settings = ", ".join(f"{k}={v}" for k, v in profile_settings(profile).items())
+                mark = " (по умолчанию)" if name == cfg.profile else ""
+                self.log.append(f"Профиль сеанса {name}{mark}: {settings}")
+        # Вкладки данных появятся по мере чтения их структуры (MainWindow.ensure_data_tabs)
+        main.attach_engine(engine, md, tables)
+        # Фоновые потоки БД и LISTEN держат по соединению; остальное — GUI-поток
+        needed = DB_THREADS + 1 + int(cfg.listen_changes)
+        if cfg.pool_size + cfg.max_overflow < needed:
             self.log.append(
-                f"Успешное подключение: {cfg.driver} → {cfg.host}:{cfg.port}/{cfg.dbname} (user={cfg.user})"
+                f"Пул ({cfg.pool_size} + {cfg.max_overflow}) меньше {needed} соединений, нужных "
+                f"{DB_THREADS} фоновым потокам и окну: запросы будут ждать свободного соединения."
             )
-            self.create_btn.setEnabled(True)
-            self.demo_btn.setEnabled(True)
-            self.connect_btn.setEnabled(False)
-            self.disconnect_btn.setEnabled(True)
-        except SQLAlchemyError as e:
-            self.log.append(f"Ошибка подключения: {e}")
-            QMessageBox.critical(self, "Ошибка подключения", str(e))
+        self.pool_timer.start()
+        self.update_pool_stats()
+        if replica is not None:
+            self.start_replica(engine, replica, main.tables)
+        elif replica_error is not None:
+            self.log.append(f"Реплика не подключена: {replica_error}. Все запросы идут на основной сервер.")
+        if cfg.async_driver:
+            self.start_async(engine, cfg)
+        if cfg.listen_changes:
+            if main.start_change_listener():
+                self.log.append(f"Автообновление включено (LISTEN/NOTIFY, драйвер {cfg.driver}).")
+            else:
+                self.log.append("Не удалось включить автообновление. См. консоль.")
+        self.create_btn.setEnabled(True)
+        self.demo_btn.setEnabled(True)
+        self.triggers_btn.setEnabled(True)
+        self.disconnect_btn.setEnabled(True)
+
+    def _on_connect_failed(self, error):
+        self.log.append(f"Ошибка подключения: {error}")
+        self.connect_btn.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка подключения", str(error))
 
     def do_disconnect(self):
         main = self.window()
+        # Мост, запускаемый после отключения, уже не нужен
+        self.runner.cancel("async")
         main.disconnect_db()
+        self.pool_timer.stop()
+        self.pool_stats_label.setText("Нет подключения")
         self.create_btn.setEnabled(False)
         self.demo_btn.setEnabled(False)
+        self.triggers_btn.setEnabled(False)
         self.connect_btn.setEnabled(True)
         self.disconnect_btn.setEnabled(False)
         self.log.append("Соединение закрыто.")
 
+    def start_replica(self, engine, replica, tables):
+        """Чтения моделей, фильтров и списков — с реплики, записи и DDL — на основной сервер"""
+        start_replica_routing(engine, replica, tables)
+        url = replica.url
+        self.log.append(f"Чтение с реплики: {url.host}:{url.port}/{url.database}.")
+
+    def start_async(self, engine, cfg: PgConfig):
+        """Обновления таблиц, списки и фильтры — через asyncio; при ошибке остается пул потоков"""
+        # Проверка соединения асинхронного драйвера ждет до connect_timeout — тоже в фоне;
+        # до ее окончания задачи идут в пул потоков
+        self.runner.submit(
+            "async", start_async_bridge, engine, cfg,
+            on_done=lambda _: self.log.append(
+                f"Асинхронный режим включен: {cfg.async_driver}, запросы вкладок выполняются "
+                f"одновременно в одном потоке asyncio."),
+            on_error=lambda e: self.log.append(
+                f"Асинхронный режим ({cfg.async_driver}) не включен: {e}. "
+                f"Запросы выполняются в пуле потоков."),
+            on_discard=self._drop_async,
+        )
+
+    def _drop_async(self, bridge):
+        # Мост запустился уже после отключения
+        if async_bridge() is bridge:
+            stop_async_bridge()
+
+    def update_pool_stats(self):
+        engine = getattr(self.window(), "engine", None)
+        stats = pool_stats(engine) if engine is not None else None
+        if stats is None:
+            self.pool_stats_label.setText("Нет данных о пуле")
+            return
+
+        bridge = async_bridge()
+        router = replica_router()
+        routing = router.snapshot() if router is not None else None
+
+        def ms(value):
+            return "—" if value is None else f"{value:.1f} мс"
+
+        self.pool_stats_label.setText(
+            f"Выдано: {stats.checked_out} (пик {stats.peak_checked_out}), свободно: {stats.checked_in}, "
+            f"сверх пула: {stats.overflow}/{stats.max_overflow} (размер {stats.size})\n"
+            f"Ожидание соединения: в среднем {ms(stats.wait_avg_ms)}, p95 {ms(stats.wait_p95_ms)}, "
+            f"макс. {ms(stats.wait_max_ms)}; тайм-аутов: {stats.timeouts}\n"
+            f"Выдач: {stats.checkouts}, новых соединений: {stats.connects}, "
+            f"разорванных: {stats.invalidated}, проверок: {stats.pings}"
+            + (f"\nАсинхронных запросов в работе: {bridge.in_flight()}" if bridge is not None else "")
+            + (f"\nЧтений с реплики: {routing.replica_reads}, с основного сервера из-за отставания: "
+               f"{routing.lagging_reads}, при недоступной реплике: {routing.failed_reads}"
+               if routing is not None else "")
+        )
+
     def reset_db(self):
         main = self.window()
         if getattr(main, "engine", None) is None:
             QMessageBox.warning(self, "Схема", "Нет подключения к БД.")
             return
+        # Открытые курсоры вкладок держат блокировки таблиц — DROP ждал бы их
+        main.release_streams()
         if drop_and_create_schema_sa(main.engine, main.md):
             self.log.append("Схема БД создана: aircraft, flights, passengers, crew, crew_member.")
+            # Триггеры удалены вместе с таблицами
+            if self.listen_cb.isChecked():
+                self.install_triggers()
             main.refresh_all_models()
+            # Вкладки таблиц, которых не было при подключении
+            main.ensure_data_tabs()
         else:
             QMessageBox.critical(self, "Схема", "Ошибка при создании схема. См. консоль/лог.")
 
@@ -184,3 +387,13 @@ class SetupTab(QWidget):
             main.refresh_all_models()
         else:
             QMessageBox.warning(self, "Демо", "Часть данных не добавлена. См. консоль.")
+
+    def install_triggers(self):
+        main = self.window()
+        if getattr(main, "engine", None) is None:
+            QMessageBox.warning(self, "Триггеры", "Нет подключения к БД.")
+            return
+        if install_change_triggers(main.engine, main.tables.keys()):
+            self.log.append("Установлены триггеры NOTIFY: " + ", ".join(main.tables.keys()) + ".")
+        else:
+            QMessageBox.critical(self, "Триггеры", "Не удалось установить триггеры. См. консоль.")
@@ -1,5 +1,4 @@
 # ===== PySide6 =====
-from PySide6.QtCore import QSortFilterProxyModel, Qt
 from PySide6.QtWidgets import (
     QLineEdit, QMessageBox,
     QComboBox, QCheckBox, QTableView, QHeaderView
@@ -14,7 +13,7 @@ from sqlalchemy import (
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 # ===== Files =====
-from db.models import SATableModel
+from db.models import SAPagedTableModel
 from templates.BaseTab import BaseTab
 from templates.modes import AppMode
 
@@ -28,7 +27,24 @@ class TicketsTab(BaseTab):
 
         self.table = "tickets"
 
-        self.model = SATableModel(engine, self.tables["tickets"], self)
+        flights = self.tables["flights"]
+        self.register_combo(
+            self.flight_combo, "flights",
+            flights.select().order_by(flights.c.flight_id), flights.c.flight_id,
+            lambda row: f"Рейс {row.flight_id}: {row.departure_airport}-{row.arrival_airport}",
+            "Ошибка загрузки рейсов"
+        )
+        passengers = self.tables["passengers"]
+        self.register_combo(
+            self.passenger_combo, "passengers",
+            passengers.select().order_by(passengers.c.passenger_id), passengers.c.passenger_id,
+            lambda row: f"Пассажир {row.passenger_id} "
+                        f"({'Зависимый' if row.is_dependent else 'Независимый'})",
+            "Ошибка загрузки пассажиров"
+        )
+
+        self.model = SAPagedTableModel(engine, self.tables["tickets"], self)
+        self.track_busy(self.model.runner)
         self.update_model()
 
         self.add_record_btn.clicked.connect(self.add_ticket)
@@ -47,28 +63,13 @@ class TicketsTab(BaseTab):
         self.read_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         apply_compact_table_view(self.read_table)
 
-        self.read_table.setModel(self.model)
-        self.read_table.setSortingEnabled(True)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(self.model)
-        self.add_table.setModel(self.proxy_model)
-        self.add_table.setSortingEnabled(True)
-
-        def on_header_clicked(self, logical_index):
-            current_order = self.proxy_model.sortOrder()
-            new_order = Qt.SortOrder.DescendingOrder if current_order == Qt.SortOrder.AscendingOrder else Qt.SortOrder.AscendingOrder
-            self.proxy_model.sort(logical_index, new_order)
+        # Сортировка по заголовку перечитывает страницы с ORDER BY на сервере
+        self.enable_server_sort(self.read_table)
+        self.enable_server_sort(self.add_table)
 
         header = self.add_table.horizontalHeader()
         header.setSectionsClickable(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
-
-        self.on_header_clicked = on_header_clicked.__get__(self)
-
-        self.refresh_flights_combo()
-        self.refresh_passengers_combo()
 
         self.update_ui_for_mode()
 
@@ -87,32 +88,10 @@ class TicketsTab(BaseTab):
         self.add_form_layout.addRow("Багаж:", self.has_baggage_checkbox)
 
     def refresh_flights_combo(self):
-        self.flight_combo.clear()
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(self.tables["flights"].select().order_by(self.tables["flights"].c.flight_id))
-                for row in result:
-                    self.flight_combo.addItem(
-                        f"Рейс {row.flight_id}: {row.departure_airport}-{row.arrival_airport}",
-                        row.flight_id
-                    )
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Ошибка загрузки рейсов", str(e))
+        self.load_combo(self.flight_combo)
 
     def refresh_passengers_combo(self):
-        self.passenger_combo.clear()
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    self.tables["passengers"].select().order_by(self.tables["passengers"].c.passenger_id))
-                for row in result:
-                    passenger_type = "Зависимый" if row.is_dependent else "Независимый"
-                    self.passenger_combo.addItem(
-                        f"Пассажир {row.passenger_id} ({passenger_type})",
-                        row.passenger_id
-                    )
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Ошибка загрузки пассажиров", str(e))
+        self.load_combo(self.passenger_combo)
 
     def add_ticket(self):
         if self.current_mode != AppMode.ADD:
@@ -148,7 +127,7 @@ class TicketsTab(BaseTab):
                     seat_number=seat_number,
                     has_baggage=has_baggage
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.clear_form()
             self.window().refresh_combos()
         except IntegrityError as e:
@@ -171,7 +150,7 @@ class TicketsTab(BaseTab):
                 conn.execute(delete(self.tables["tickets"]).where(
                     self.tables["tickets"].c.ticket_id == ticket_id
                 ))
-            self.model.refresh()
+            self.model.refresh_async(incremental=True)
             self.window().refresh_combos()
         except SQLAlchemyError as e:
             QMessageBox.critical(self, "Ошибка удаления", str(e))